@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""ONU simulator journal tool.
+
+Lists the records in an ONU simulator journal (an audit trail of the changes
+that were made), and optionally replays a checkpoint plus the journal and
+saves the result as a new checkpoint.
+
+Examples:
+
+    List the journal's records::
+
+        onujournal.py onusim.journal
+
+    Replay ``onusim.ckpt`` plus the journal into a new checkpoint (which can
+    then be used with an empty journal)::
+
+        onujournal.py onusim.journal --checkpoint onusim.ckpt \\
+            --output new.ckpt
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import sys
+
+import obbaa_onusim.checkpoint as checkpoint
+import obbaa_onusim.journal as journal
+from obbaa_onusim.database import Database, mibs
+
+# XXX want just the name part; need some utilities / rules / conventions
+prog_basename = os.path.basename(sys.argv[0])
+(prog_root, _) = os.path.splitext(prog_basename)
+logger = logging.getLogger(prog_root)
+
+
+def argparser() -> argparse.ArgumentParser:
+    formatter_class = argparse.RawDescriptionHelpFormatter
+    parser = argparse.ArgumentParser(prog=prog_root, description=__doc__,
+                                     formatter_class=formatter_class)
+    parser.add_argument("journal", type=str, help="journal file")
+    parser.add_argument("-c", "--checkpoint", type=str, default=None,
+                        help="checkpoint file to which to apply the journal")
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="checkpoint file to which to save the result "
+                             "of replaying the journal")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="don't list the journal's records")
+    parser.add_argument("-l", "--loglevel", type=int, default=0,
+                        help="logging level (0=errors+warnings, "
+                             "1=info, 2=debug); default: %(default)r")
+    return parser
+
+
+def describe(record: journal.JournalRecord) -> str:
+    time_ = datetime.datetime.fromtimestamp(record.time).isoformat(
+            sep=' ', timespec='milliseconds')
+    text = '%d %s ONU %d %s' % (record.seq, time_, record.onu_id,
+                                record.kind)
+    if record.me_class is not None:
+        mib = mibs.get(record.me_class, None)
+        text += ' %s #%d' % (mib or record.me_class, record.me_inst)
+    if record.kind == 'put':
+        text += ' %r' % (record.value,)
+    elif record.kind == 'reload':
+        text += ' (%d instances)' % len(record.value)
+    elif record.kind == 'alarm':
+        text += ' %#058x' % record.value
+    return text
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+
+    args = argparser().parse_args(argv[1:])
+
+    loglevel_map = {0: logging.WARN, 1: logging.INFO, 2: logging.DEBUG}
+    logging.basicConfig(level=loglevel_map[args.loglevel])
+
+    template = Database._template()
+    onu_ids = set()
+    for record in journal.read(args.journal, template):
+        if not args.quiet:
+            print(describe(record))
+        onu_ids.add(record.onu_id)
+
+    if args.output:
+        if args.checkpoint:
+            onu_ids |= {onu[0] for onu in checkpoint.read(args.checkpoint,
+                                                          template)}
+        if not onu_ids:
+            logger.error('no ONUs in journal or checkpoint')
+            return 1
+        database = Database(range(min(onu_ids), max(onu_ids) + 1))
+        journal.replay(database, args.journal,
+                       checkpoint_path=args.checkpoint)
+        checkpoint.save(database, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
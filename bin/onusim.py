@@ -29,6 +29,46 @@ Examples:
 
         onusim.py -l 2
 
+    Restore the ONUs' state from a checkpoint file (if it exists); the
+    ``checkpoint`` console command saves to the same file::
+
+        onusim.py --checkpoint onusim.ckpt
+
+    Also journal all changes, and replay the journal (after the checkpoint)
+    at startup::
+
+        onusim.py --checkpoint onusim.ckpt --journal onusim.journal
+
+    Mirror all the ONUs' MIB instances into a memory-mapped file that other
+    processes can read (see `SharedStoreReader`)::
+
+        onusim.py --sharedstore /dev/shm/onusim.store
+
+    Reject creates and sets of MIB instances that reference missing
+    instances (e.g. a GEM port network CTP whose T-CONT doesn't exist)::
+
+        onusim.py --checkrefs
+
+    Hibernate ONUs that have been idle for ten minutes, and keep at most 5000
+    ONUs awake (the ``hibernation`` console command reports statistics)::
+
+        onusim.py --hibernate 600 --hotmax 5000
+
+    Allow up to 1000 alarm notifications per second, and then (on the
+    console) start a storm of fleet-wide LOS alarms, one every 10 seconds on
+    average, each held for 5 seconds; ``storm stop`` stops it and clears its
+    alarms::
+
+        onusim.py --alarmrate 1000
+        storm los 0.1 5
+
+    ONUs take 60 to 90 seconds to reboot (e.g. after a ``reboot`` command);
+    then (on the console) reboot ONUs 0 through 999 at once, as after a power
+    cut (``reboot`` with no arguments reboots all the ONUs)::
+
+        onusim.py --boottime 60 --bootjitter 30
+        reboot 0 999
+
 Messages addressed to an invalid channel termination name or ONU id are ignored
 (no response will be generated). This might be a mistake.
 """
@@ -41,9 +81,19 @@ import threading
 from obbaa_onusim.actions.alarm import Alarm
 
 
+import obbaa_onusim.alarm_storm as alarm_storm
+import obbaa_onusim.checkpoint as checkpoint
 import obbaa_onusim.endpoint as endpoint
+import obbaa_onusim.journal as journal
+import obbaa_onusim.pm as pm
 import obbaa_onusim.util as util
 import obbaa_onusim.rest_api as rest_api
+from obbaa_onusim.diagnostics import TestEngine
+from obbaa_onusim.hibernation import Hibernator
+from obbaa_onusim.notifier import AlarmNotifier, AvcEngine
+from obbaa_onusim.reboot import Rebooter
+from obbaa_onusim.scheduler import Scheduler
+from obbaa_onusim.shared_store import SharedStore
 from obbaa_onusim.connection_info import ConnectionInfo
 
 # XXX want just the name part; need some utilities / rules / conventions
@@ -57,7 +107,55 @@ def argparser() -> argparse.ArgumentParser:
     # create the parser and adds common arguments
     parser = util.argparser(prog=prog_root, description=__doc__,
                             default_address='0.0.0.0')
-    # could now add additional arguments
+    parser.add_argument("-c", "--checkpoint", type=str, default=None,
+                        help="checkpoint file; if it exists, the ONUs' state "
+                             "is restored from it at startup")
+    parser.add_argument("-j", "--journal", type=str, default=None,
+                        help="journal file; if it exists, it's replayed at "
+                             "startup (after the checkpoint), and all "
+                             "changes are appended to it")
+    parser.add_argument("--fsync", type=str, default='batch',
+                        choices=journal.FSYNC_POLICIES,
+                        help="journal fsync policy; default: %(default)r")
+    parser.add_argument("-s", "--sharedstore", type=str, default=None,
+                        help="file into which to mirror the ONUs' MIB "
+                             "instances, so that other processes can read "
+                             "them")
+    parser.add_argument("--hibernate", type=float, default=None,
+                        help="idle time (in seconds) after which ONUs are "
+                             "hibernated; default: don't hibernate")
+    parser.add_argument("--hotmax", type=int, default=None,
+                        help="maximum number of awake ONUs (least recently "
+                             "used ONUs are hibernated); default: no limit")
+    parser.add_argument("--avcwindow", type=float, default=0.1,
+                        help="AVC coalescing window in seconds; default: "
+                             "%(default)r")
+    parser.add_argument("--avcrate", type=float, default=10.0,
+                        help="maximum AVCs per second per ONU; default: "
+                             "%(default)r")
+    parser.add_argument("--pmprofile", type=str, default='residential',
+                        choices=sorted(pm.profiles),
+                        help="default PM traffic profile; default: "
+                             "%(default)r")
+    parser.add_argument("--tcainterval", type=float, default=10.0,
+                        help="PM threshold crossing evaluation interval in "
+                             "seconds; default: %(default)r")
+    parser.add_argument("--alarmrate", type=float, default=100.0,
+                        help="maximum alarm notifications per second; "
+                             "default: %(default)r")
+    parser.add_argument("--boottime", type=float, default=30.0,
+                        help="time (in seconds) for which rebooting ONUs are "
+                             "offline; default: %(default)r")
+    parser.add_argument("--bootjitter", type=float, default=0.0,
+                        help="maximum random time (in seconds) added to each "
+                             "ONU's boot time; default: %(default)r")
+    parser.add_argument("--testdelay", type=float, default=1.0,
+                        help="time (in seconds) after which test results are "
+                             "sent; default: %(default)r")
+    parser.add_argument("--checkrefs", action="store_true",
+                        help="reject creates and sets that would leave "
+                             "dangling MIB instance references, and deletes "
+                             "of referenced instances")
     return parser
 
 
@@ -118,6 +216,39 @@ def main(argv=None):
                                onu_id_range=onu_id_range, dumpfd=dumpfd)
     
     logger.debug('server %r' % server)
+    server.database.check_references = args.checkrefs
+
+    journal.replay(server.database, args.journal,
+                   checkpoint_path=args.checkpoint)
+    journal_ = journal.Journal(server.database, args.journal,
+                               fsync=args.fsync) if args.journal else None
+    if args.sharedstore:
+        SharedStore(server.database, args.sharedstore)
+
+    scheduler = Scheduler()
+    scheduler.start()
+    hibernator = None
+    if args.hibernate is not None or args.hotmax is not None:
+        hibernator = Hibernator(server.database, idle_time=float('inf') if
+                                args.hibernate is None else args.hibernate,
+                                high_water=args.hotmax, scheduler=scheduler)
+
+    # AVCs and alarms are sent to the address from which the last request was
+    # received
+    destination = lambda: getattr(ConnectionInfo, 'addr', None)
+    AvcEngine(server.database, scheduler, server.send,
+              cterm_name=args.ctermname, destination=destination,
+              window=args.avcwindow, onu_rate=args.avcrate)
+    alarm_notifier = AlarmNotifier(server.send, cterm_name=args.ctermname,
+                                   destination=destination,
+                                   rate=args.alarmrate, burst=args.alarmrate)
+    pm.PmEngine(server.database, scheduler, profile=args.pmprofile,
+                tca_interval=args.tcainterval, notify=alarm_notifier.notify)
+    Rebooter(server.database, scheduler, boot_time=args.boottime,
+             jitter=args.bootjitter)
+    TestEngine(server.database, scheduler, server.send,
+               cterm_name=args.ctermname, destination=destination,
+               delay=args.testdelay)
     
     ConnectionInfo.set_connection(server)
     
@@ -158,6 +289,9 @@ def main(argv=None):
         if dumpfd:
             dumpfd.close()
 
+    # the current alarm storm (if any)
+    storm = None
+
     def run_async():
         while True:
             input("")
@@ -173,7 +307,64 @@ def main(argv=None):
                         me_class_instance = int(cmd_args[2]), \
                         bit_map = int(cmd_args[3],16).to_bytes(28,'big'), \
                         seq_number = int(cmd_args[4]))
-                        
+
+        elif cmd_args[0] == "reset":
+            # reset [first [last]]; defaults to all ONUs
+            onu_ids = None
+            if len(cmd_args) > 1:
+                first = int(cmd_args[1])
+                last = int(cmd_args[2]) if len(cmd_args) > 2 else first
+                onu_ids = range(first, last + 1)
+            server.database.reset_all(onu_ids)
+
+        elif cmd_args[0] == "reboot":
+            # reboot [first [last]]; defaults to all ONUs
+            onu_ids = None
+            if len(cmd_args) > 1:
+                first = int(cmd_args[1])
+                last = int(cmd_args[2]) if len(cmd_args) > 2 else first
+                onu_ids = range(first, last + 1)
+            server.database.reboot_all(onu_ids)
+
+        elif cmd_args[0] == "checkpoint":
+            # checkpoint [file]; defaults to the --checkpoint file
+            path = cmd_args[1] if len(cmd_args) > 1 else args.checkpoint
+            if not path:
+                logger.error('no checkpoint file specified')
+            else:
+                checkpoint.save(server.database, path, journal=journal_)
+
+        elif cmd_args[0] == "hibernation":
+            if hibernator is None:
+                logger.error('hibernation is disabled')
+            else:
+                print(hibernator.stats())
+
+        elif cmd_args[0] == "storm":
+            # storm [profile [rate [hold [first [last]]]]] or storm stop;
+            # with no arguments, shows the current storm
+            nonlocal storm
+            if len(cmd_args) > 1 and storm is not None:
+                storm.stop()
+                storm = None
+            if len(cmd_args) == 1:
+                print(storm if storm is None else '%s %s' % (
+                    storm, dict(storm.metrics)))
+            elif cmd_args[1] not in ("stop",) + alarm_storm.profiles:
+                logger.error('invalid storm profile %r' % cmd_args[1])
+            elif cmd_args[1] != "stop":
+                onu_ids = None
+                if len(cmd_args) > 4:
+                    first = int(cmd_args[4])
+                    last = int(cmd_args[5]) if len(cmd_args) > 5 else first
+                    onu_ids = range(first, last + 1)
+                storm = alarm_storm.AlarmStorm(
+                        server.database, scheduler, alarm_notifier.notify_all,
+                        profile=cmd_args[1],
+                        rate=float(cmd_args[2]) if len(cmd_args) > 2 else 10.0,
+                        hold=float(cmd_args[3]) if len(cmd_args) > 3 else 10.0,
+                        onu_ids=onu_ids)
+
         elif cmd_args[0] == "notif":
             pass
         else:
@@ -3,15 +3,9 @@ from ..message import Message
 from ..types import FieldDict
 
 class Alarm(Message):
-    def __init__(self, _no_validate: bool = False, **fields):
-        self.bitmap = bytes(fields.get('bitmap'))
-        self.seqNum = fields.get('seqNum')
-        super().__init__(_no_validate, **fields)
-
-
     def validate(self) -> FieldDict:
 
-        return {'bitmap': self.bitmap, 'seqNum': self.seqNum}
+        return {'bitmap': bytes(self.bitmap), 'seqNum': self.seqNum}
 
 
     def encode_contents(self) -> bytearray:
@@ -20,6 +14,11 @@ class Alarm(Message):
 
 
         return contents
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        # the alarm bitmap is followed by 3 reserved bytes and the sequence
+        # number
+        return {'bitmap': bytes(contents[:28]), 'seqNum': contents[31]}
     
     def process(self, server: object):
         server.database.set_alarm(self.me_class,self.me_inst, self.bitmap,
@@ -37,6 +36,11 @@ This specifies the message type and provides a link between the action's
 command and response messages.
 """
 
+# alarms are notifications, so (unlike requests) they don't request an
+# acknowledgement; re-registering makes this the default and allows them to be
+# decoded
+Alarm.register(type_mt=alarm_action.number, type_ar=False, type_ak=False)
+
         
 
 
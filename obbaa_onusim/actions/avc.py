@@ -0,0 +1,115 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The Attribute Value Change (AVC) notification is defined in G.988 A.2.7
+(extended) and A.3.7 (baseline).
+
+AVCs are autonomous ONU notifications, so they're sent with ``type_ar`` and
+``type_ak`` both false, and there's no response. They're generated by the
+`AvcEngine`.
+
+The relevant classes and instances are:
+
+* `AttributeValueChange`: AVC notification message class
+* `avc_action`: AVC action instance
+"""
+
+import logging
+
+from .. import util
+
+from ..action import Action
+from ..message import Message
+from ..types import Number, FieldDict
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+#: Maximum size of a baseline message's attribute values.
+BASELINE_VALUES_SIZE = 30
+
+
+class AttributeValueChange(Message):
+    """Attribute Value Change notification message."""
+
+    def encode_contents(self) -> bytearray:
+        extended = self.extended
+        contents = bytearray()
+
+        # attr_mask comes first
+        attr_mask = self.attr_mask
+        contents += Number(2).encode(attr_mask)
+
+        # encode the attribute values
+        mib = self._mib
+        values = self.values
+        size = 0
+        for index, index_mask in util.indices(attr_mask):
+            attr = mib.attr(index)
+            if not attr:
+                logger.error('MIB %s %d not found; supported attributes: %s'
+                             % (mib, index, mib.attr_names()))
+            elif not extended and size + attr.size > BASELINE_VALUES_SIZE:
+                # the sender should have split the AVC
+                logger.error('MIB %s %s ignored (too long for baseline '
+                             'message)' % (mib, attr))
+            elif attr.name in values:
+                contents += attr.encode(values[attr.name])
+                size += attr.size
+
+        return contents
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``attr_mask``: attribute mask; 0-65535
+            * ``values``: MIB-specific attribute names and values as specified
+              by the attribute mask
+        """
+        offset = 0
+
+        # attr_mask comes first
+        attr_mask, offset = Number(2).decode(contents, offset)
+
+        # decode the attribute values
+        mib = self._mib
+        values = {}
+        for index, index_mask in util.indices(attr_mask):
+            attr = mib.attr(index) if mib else None
+            if not attr:
+                logger.debug(
+                        'MIB %s %d not found; supported attributes: %s' % (
+                            mib, index, mib and mib.attr_names()))
+            else:
+                value, offset = attr.decode(contents, offset)
+                values[attr.name] = value
+
+        return {'attr_mask': attr_mask, 'values': values}
+
+
+avc_action = Action(17, 'attribute-value-change',
+                    'Attribute value change notification',
+                    AttributeValueChange)
+"""AVC `Action`.
+
+This specifies the message type. There's no response message.
+"""
+
+# AVCs are notifications, so (unlike requests) they don't request an
+# acknowledgement; re-registering makes this the default and allows them to be
+# decoded
+AttributeValueChange.register(type_mt=avc_action.number, type_ar=False,
+                              type_ak=False)
@@ -12,7 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""  Delete action
+"""The Delete action's messages are defined in G.988 A.2.3-4 (extended) and
+A.3.3-4 (baseline).
+
+The relevant classes and instances are:
+
+* `Delete`: Delete command message class
+* `DeleteResponse`: Delete response message class
+* `delete_action`: Delete action instance
 """
 
 
@@ -30,28 +37,28 @@ logger = logging.getLogger(__name__.replace('obbaa_', ''))
 
 
 class Delete(Message):
-    """MIB upload command message.
+    """Delete command message.
     """
 
     def process(self, server: object) -> 'DeleteResponse':
-
-        # TODO: need to implement the create handler. For now just increment the mib_data_sync
-        server.database.increment_mib_sync(self.onu_id)
+        results = server.database.delete(self.onu_id, self.me_class,
+                                         self.me_inst, extended=self.extended)
 
         response = DeleteResponse(cterm_name=self.cterm_name,
-                                     onu_id=self.onu_id,
-                                     extended=self.extended, tci=self.tci,
-                                     me_class=self.me_class,
-                                     me_inst=self.me_inst)
+                                  onu_id=self.onu_id,
+                                  extended=self.extended, tci=self.tci,
+                                  me_class=self.me_class,
+                                  me_inst=self.me_inst,
+                                  reason=results.reason)
         return response
 
 
-# XXX note that there's no 'reason' field
 class DeleteResponse(Message):
-    """mib delete message.
-     """
+    """Delete response message.
+    """
+
     def encode_contents(self) -> bytearray:
-        contents = Number(2).encode(0)
+        contents = Number(1).encode(self.reason)
         return contents
 
     def decode_contents(self, contents: bytearray) -> FieldDict:
@@ -59,10 +66,16 @@ class DeleteResponse(Message):
 
         Returns:
             Dictionary with the following items.
+
+            * ``reason``: result, reason; 0-255
         """
-        return {}
+        reason, _ = Number(1).decode(contents, 0)
+        return {'reason': reason}
 
 
 delete_action = Action(6, 'delete', 'Delete action', Delete, DeleteResponse)
+"""Delete `Action`.
 
-##Passa por aqui
+This specifies the message type and provides a link between the action's
+command and response messages.
+"""
@@ -0,0 +1,401 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The software download actions' messages are defined in G.988 A.2.24-33
+(extended) and A.3.24-33 (baseline).
+
+A download section command requests an acknowledgement (i.e. has ``type_ar``
+set) only if it's the last section of a window, so only then is there a
+response. Sections are 31 bytes in baseline messages; in extended messages,
+they're as long as the OLT chooses (all sections except the last must be the
+same length).
+
+The relevant classes and instances are:
+
+* `StartDownload`, `DownloadSection`, `EndDownload`, `ActivateImage` and
+  `CommitImage`: command message classes
+* `StartDownloadResponse`, `DownloadSectionResponse`, `EndDownloadResponse`,
+  `ActivateImageResponse` and `CommitImageResponse`: response message
+  classes
+* `start_download_action`, `download_section_action`, `end_download_action`,
+  `activate_image_action` and `commit_image_action`: action instances.
+"""
+
+import logging
+
+from typing import List, Tuple
+
+from ..action import Action
+from ..message import Message
+from ..types import Number, FieldDict
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+#: Size of a baseline message's download section.
+BASELINE_SECTION_SIZE = 31
+
+
+def _encode_insts(me_insts: List[int]) -> bytearray:
+    contents = Number(1).encode(len(me_insts))
+    for me_inst in me_insts:
+        contents += Number(2).encode(me_inst)
+    return contents
+
+
+def _decode_insts(contents: bytearray, offset: int) -> List[int]:
+    num_insts, offset = Number(1).decode(contents, offset)
+    me_insts = []
+    for _ in range(num_insts):
+        me_inst, offset = Number(2).decode(contents, offset)
+        me_insts.append(me_inst)
+    return me_insts
+
+
+def _encode_results(results: List[Tuple[int, int]]) -> bytearray:
+    contents = Number(1).encode(len(results))
+    for me_inst, result in results:
+        contents += Number(2).encode(me_inst)
+        contents += Number(1).encode(result)
+    return contents
+
+
+def _decode_results(contents: bytearray, offset: int) -> \
+        List[Tuple[int, int]]:
+    num_results, offset = Number(1).decode(contents, offset)
+    results = []
+    for _ in range(num_results):
+        me_inst, offset = Number(2).decode(contents, offset)
+        result, offset = Number(1).decode(contents, offset)
+        results.append((me_inst, result))
+    return results
+
+
+class StartDownload(Message):
+    """Start software download command message.
+    """
+
+    def validate(self) -> FieldDict:
+        # the image is downloaded to the command's instance by default
+        return {'me_insts': self.get('me_insts') or [self.me_inst]}
+
+    def encode_contents(self) -> bytearray:
+        contents = Number(1).encode(self.window_size - 1)
+        contents += Number(4).encode(self.image_size)
+        contents += _encode_insts(self.me_insts)
+        return contents
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``window_size``: number of sections per window; 1-256
+            * ``image_size``: image size in bytes
+            * ``me_insts``: software image instances to which to download
+        """
+        window_size, offset = Number(1).decode(contents, 0)
+        image_size, offset = Number(4).decode(contents, offset)
+        me_insts = _decode_insts(contents, offset)
+        return {'window_size': window_size + 1, 'image_size': image_size,
+                'me_insts': me_insts}
+
+    def process(self, server: object) -> 'StartDownloadResponse':
+        """Pass this message to the server database for processing,
+        and return the response.
+        """
+        results = server.database.start_download(
+                self.onu_id, self.me_class, self.me_inst, self.window_size,
+                self.image_size, self.me_insts, extended=self.extended)
+
+        response = StartDownloadResponse(
+                cterm_name=self.cterm_name, onu_id=self.onu_id,
+                extended=self.extended, tci=self.tci,
+                me_class=self.me_class, me_inst=self.me_inst,
+                reason=results.reason,
+                window_size=results.window_size or self.window_size,
+                results=results.inst_results)
+        return response
+
+
+class StartDownloadResponse(Message):
+    """Start software download response message.
+    """
+
+    def encode_contents(self) -> bytearray:
+        contents = Number(1).encode(self.reason)
+        contents += Number(1).encode(self.window_size - 1)
+        contents += _encode_results(self.results)
+        return contents
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``reason``: result, reason; 0-255
+            * ``window_size``: window size chosen by the ONU; 1-256
+            * ``results``: list of ``(me_inst, result)`` tuples
+        """
+        reason, offset = Number(1).decode(contents, 0)
+        window_size, offset = Number(1).decode(contents, offset)
+        results = _decode_results(contents, offset)
+        return {'reason': reason, 'window_size': window_size + 1,
+                'results': results}
+
+
+class DownloadSection(Message):
+    """Download section command message.
+    """
+
+    def encode_contents(self) -> bytearray:
+        data = self.data
+        assert self.extended or len(data) <= BASELINE_SECTION_SIZE
+        contents = Number(1).encode(self.section_num)
+        contents += data
+        return contents
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``section_num``: section number within the window; 0-255
+            * ``data``: section data (including any padding)
+        """
+        section_num, _ = Number(1).decode(contents, 0)
+        return {'section_num': section_num, 'data': contents[1:]}
+
+    def process(self, server: object) -> 'DownloadSectionResponse':
+        """Pass this message to the server database for processing,
+        and return the response (if one was requested).
+        """
+        results = server.database.download_section(
+                self.onu_id, self.me_class, self.me_inst, self.section_num,
+                self.data, ack=self.type_ar, extended=self.extended)
+
+        response = None
+        if self.type_ar:
+            response = DownloadSectionResponse(
+                    cterm_name=self.cterm_name, onu_id=self.onu_id,
+                    extended=self.extended, tci=self.tci,
+                    me_class=self.me_class, me_inst=self.me_inst,
+                    reason=results.reason, section_num=self.section_num)
+        return response
+
+
+class DownloadSectionResponse(Message):
+    """Download section response message.
+    """
+
+    def encode_contents(self) -> bytearray:
+        contents = Number(1).encode(self.reason)
+        contents += Number(1).encode(self.section_num)
+        return contents
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``reason``: result, reason; 0-255
+            * ``section_num``: the acknowledged section number; 0-255
+        """
+        reason, offset = Number(1).decode(contents, 0)
+        section_num, _ = Number(1).decode(contents, offset)
+        return {'reason': reason, 'section_num': section_num}
+
+
+class EndDownload(Message):
+    """End software download command message.
+    """
+
+    def validate(self) -> FieldDict:
+        return {'me_insts': self.get('me_insts') or [self.me_inst]}
+
+    def encode_contents(self) -> bytearray:
+        contents = Number(4).encode(self.crc)
+        contents += Number(4).encode(self.image_size)
+        contents += _encode_insts(self.me_insts)
+        return contents
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``crc``: the image's CRC-32 (see `crc32`)
+            * ``image_size``: image size in bytes
+            * ``me_insts``: software image instances
+        """
+        crc, offset = Number(4).decode(contents, 0)
+        image_size, offset = Number(4).decode(contents, offset)
+        me_insts = _decode_insts(contents, offset)
+        return {'crc': crc, 'image_size': image_size, 'me_insts': me_insts}
+
+    def process(self, server: object) -> 'EndDownloadResponse':
+        """Pass this message to the server database for processing,
+        and return the response.
+        """
+        results = server.database.end_download(
+                self.onu_id, self.me_class, self.me_inst, self.crc,
+                self.image_size, self.me_insts, extended=self.extended)
+
+        response = EndDownloadResponse(
+                cterm_name=self.cterm_name, onu_id=self.onu_id,
+                extended=self.extended, tci=self.tci,
+                me_class=self.me_class, me_inst=self.me_inst,
+                reason=results.reason, results=results.inst_results)
+        return response
+
+
+class EndDownloadResponse(Message):
+    """End software download response message.
+    """
+
+    def encode_contents(self) -> bytearray:
+        contents = Number(1).encode(self.reason)
+        contents += _encode_results(self.results)
+        return contents
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``reason``: result, reason; 0-255
+            * ``results``: list of ``(me_inst, result)`` tuples
+        """
+        reason, offset = Number(1).decode(contents, 0)
+        results = _decode_results(contents, offset)
+        return {'reason': reason, 'results': results}
+
+
+class ActivateImage(Message):
+    """Activate image command message.
+    """
+
+    def encode_contents(self) -> bytearray:
+        return Number(1).encode(self.get('flags', 0))
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``flags``: activation conditions (ignored by the simulator);
+              0-3
+        """
+        flags, _ = Number(1).decode(contents, 0)
+        return {'flags': flags & 0x03}
+
+    def process(self, server: object) -> 'ActivateImageResponse':
+        """Pass this message to the server database for processing,
+        and return the response.
+        """
+        results = server.database.activate_image(
+                self.onu_id, self.me_class, self.me_inst,
+                extended=self.extended)
+
+        response = ActivateImageResponse(
+                cterm_name=self.cterm_name, onu_id=self.onu_id,
+                extended=self.extended, tci=self.tci,
+                me_class=self.me_class, me_inst=self.me_inst,
+                reason=results.reason)
+        return response
+
+
+class ActivateImageResponse(Message):
+    """Activate image response message.
+    """
+
+    def encode_contents(self) -> bytearray:
+        return Number(1).encode(self.reason)
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``reason``: result, reason; 0-255
+        """
+        reason, _ = Number(1).decode(contents, 0)
+        return {'reason': reason}
+
+
+class CommitImage(Message):
+    """Commit image command message.
+    """
+
+    def process(self, server: object) -> 'CommitImageResponse':
+        """Pass this message to the server database for processing,
+        and return the response.
+        """
+        results = server.database.commit_image(
+                self.onu_id, self.me_class, self.me_inst,
+                extended=self.extended)
+
+        response = CommitImageResponse(
+                cterm_name=self.cterm_name, onu_id=self.onu_id,
+                extended=self.extended, tci=self.tci,
+                me_class=self.me_class, me_inst=self.me_inst,
+                reason=results.reason)
+        return response
+
+
+class CommitImageResponse(ActivateImageResponse):
+    """Commit image response message.
+    """
+    pass
+
+
+start_download_action = Action(19, 'start-download',
+                               'Start software download action',
+                               StartDownload, StartDownloadResponse)
+"""Start software download `Action`."""
+
+download_section_action = Action(20, 'download-section',
+                                 'Download section action', DownloadSection,
+                                 DownloadSectionResponse)
+"""Download section `Action`."""
+
+# only the last section of each window requests an acknowledgement;
+# re-registering makes this the default and allows the other sections to be
+# decoded
+DownloadSection.register(type_mt=download_section_action.number,
+                         type_ar=False, type_ak=False)
+
+end_download_action = Action(21, 'end-download',
+                             'End software download action', EndDownload,
+                             EndDownloadResponse)
+"""End software download `Action`."""
+
+activate_image_action = Action(22, 'activate-image', 'Activate image action',
+                               ActivateImage, ActivateImageResponse)
+"""Activate image `Action`."""
+
+commit_image_action = Action(23, 'commit-image', 'Commit image action',
+                             CommitImage, CommitImageResponse)
+"""Commit image `Action`.
+
+As with the other actions, this specifies the message type and provides a
+link between the action's command and response messages.
+"""
@@ -15,11 +15,22 @@
 """The Get action's messages are defined in G.988 A.2.7-8 (extended) and
 A.3.7-8 (baseline).
 
+The Get Next action's messages are defined in G.988 A.2.20-21 (extended) and
+A.3.20-21 (baseline). A Get of a table attribute returns the table's size (4
+bytes), and the table is then read via Get Next commands, each of which
+returns one chunk of it. Chunks are `BASELINE_CHUNK_SIZE` bytes in baseline
+messages (the last one is padded) and up to `EXTENDED_CHUNK_SIZE` bytes in
+extended messages, so reading a large table needs far fewer round trips when
+extended messages are used.
+
 The relevant classes and instances are:
 
 * `Get`: Get command message class
 * `GetResponse`: Get response message class
-* `get_action`: Get action instance.
+* `Get_Next`: Get Next command message class
+* `GetNextResponse`: Get Next response message class
+* `get_action`: Get action instance
+* `get_next_action`: Get Next action instance.
 """
 import functools
 import logging
@@ -30,6 +41,16 @@ from ..types import Bytes, Number, FieldDict
 
 logger = logging.getLogger(__name__.replace('obbaa_', ''))
 
+#: Size of a table's size in a Get response.
+TABLE_SIZE_SIZE = 4
+
+#: Size of a table chunk in a baseline Get Next response.
+BASELINE_CHUNK_SIZE = 29
+
+#: Maximum size of a table chunk in an extended Get Next response (the
+#: maximum extended contents length less the reason and attribute mask).
+EXTENDED_CHUNK_SIZE = 1966 - 3
+
 
 # XXX could add validate() to restrict attr_mask to supported attributes
 class Get(Message):
@@ -88,9 +109,13 @@ class GetResponse(Message):
             contents += Number(2).encode(self.opt_attr_mask)
             contents += Number(2).encode(self.attr_exec_mask)
 
-        # both baseline and extended messages have attribute values next
+        # both baseline and extended messages have attribute values next;
+        # table attributes' values are their sizes
         for attr, value in self.attrs:
-            contents += attr.encode(value)
+            if attr.is_table:
+                contents += Number(TABLE_SIZE_SIZE).encode(value)
+            else:
+                contents += attr.encode(value)
 
         # baseline messages have opt_attr_mask and attr_exec_mask last
         # (we assume that baseline response length restrictions have already
@@ -155,7 +180,8 @@ class GetResponse(Message):
                         and not opt_exec_mask & index_mask:
                     attr = mib.attr(index)
                     if attr and reason != 0b0011:
-                        attrs_length += attr.size
+                        attrs_length += TABLE_SIZE_SIZE if attr.is_table \
+                            else attr.size
             # XXX or just calculate the remaining space? no (at least when
             #     reason is non-zero) there could be trailing vendor info
 
@@ -180,7 +206,11 @@ class GetResponse(Message):
                 attr = mib.attr(index)
                 # XXX this also checked reason != 0b0011 but that prevented
                 #     decoding of attributes that are present in the message
-                if attr:
+                if attr and attr.is_table:
+                    value, offset = Number(TABLE_SIZE_SIZE).decode(contents,
+                                                                   offset)
+                    fields[attr.name] = value
+                elif attr:
                     value, offset = attr.decode(contents, offset)
                     fields[attr.name] = value
 
@@ -189,13 +219,12 @@ class GetResponse(Message):
 
 
 class Get_Next(Message):
-
-#Get_Next command message
+    """Get Next command message.
+    """
 
     def encode_contents(self) -> bytearray:
-
-        contents = Number(2).encode(self.seq_num)
-
+        contents = Number(2).encode(self.attr_mask)
+        contents += Number(2).encode(self.seq_num)
         return contents
 
     def decode_contents(self, contents: bytearray) -> FieldDict:
@@ -204,10 +233,12 @@ class Get_Next(Message):
         Returns:
             Dictionary with the following items.
 
-            * ``attr_mask``: attribute mask; 0-65535
+            * ``attr_mask``: attribute mask (a single table attribute);
+              0-65535
+            * ``seq_num``: command sequence number; 0-65535
         """
         offset = 0
-        attr_mask, offset = Number(2).decode(contents, offset)    
+        attr_mask, offset = Number(2).decode(contents, offset)
         seq_num, _ = Number(2).decode(contents,offset)
         return {'attr_mask': attr_mask, 'seq_num': seq_num}
 
@@ -226,11 +257,22 @@ class Get_Next(Message):
 
 
 class GetNextResponse(Message):
-    """Get_next response message.
+    """Get Next response message.
     """
 
     def encode_contents(self) -> bytearray:
         contents = bytearray()
+        contents += Number(1).encode(self.reason)
+        contents += Number(2).encode(self.attr_mask)
+
+        # the chunk is a slice of the table's bytes, and is copied straight
+        # into the message; in baseline messages it's padded
+        for _, chunk in self.attrs:
+            contents += chunk
+        if not self.extended:
+            pad_length = 3 + BASELINE_CHUNK_SIZE - len(contents)
+            assert pad_length >= 0
+            contents += Bytes(pad_length).encode()
         return contents
 
     def decode_contents(self, contents: bytearray) -> FieldDict:
@@ -241,61 +283,36 @@ class GetNextResponse(Message):
 
             * ``reason``: result, reason; 0-255
             * ``attr_mask``: attribute mask; 0-65535
-            * other: MIB-specific attributes as specified by the
-              attribute mask
+            * other: the requested table attribute's chunk (bytes; in
+              baseline messages the last chunk includes its padding)
         """
-        extended = self.extended
         offset = 0
-
-        # reason always come first
         reason, offset = Number(1).decode(contents, offset)
-
-
         attr_mask, offset = Number(2).decode(contents, offset)
 
-        # extended messages have opt_attr_mask and attr_exec_mask next
-       
-        mib = self._mib
-        attrs_offset = offset
-        attrs_length = 0
-        if not extended:
-            attrs_length = 25
-        else:
-            for index in range(1, 17):
-                index_shift = 16 - index  # 15, 14, ..., 0
-                index_mask = 1 << index_shift
-                if attr_mask & index_mask:
-                    attr = mib.attr(index)
-                    if attr and reason != 0b0011:
-                        attrs_length += attr.size
-           
-        # baseline messages have opt_attr_mask and attr_exec_mask next
-        offset += attrs_length
-    
-        offset = attrs_offset
         fields = {'reason': reason, 'attr_mask': attr_mask}
+        mib = self._mib
         for index in range(1, 17):
             index_shift = 16 - index  # 15, 14, ..., 0
             index_mask = 1 << index_shift
             if attr_mask & index_mask:
                 attr = mib.attr(index)
-                # XXX this also checked reason != 0b0011 but that prevented
-                #     decoding of attributes that are present in the message
                 if attr:
-                    value, offset = attr.decode(contents, offset)
-                    fields[attr.name] = value
+                    fields[attr.name] = bytes(contents[offset:])
+                break
 
         # return decoded fields
         return fields
 
 
 get_action = Action(9, 'get', 'Get action', Get, GetResponse)
-
-get_next_action = Action(26, 'get_next', 'Get_next action', Get_Next, GetNextResponse)
-
 """Get `Action`.
 
 
 This specifies the message type and provides a link between the action's
 command and response messages.
 """
+
+get_next_action = Action(26, 'get-next', 'Get next action', Get_Next,
+                         GetNextResponse)
+"""Get Next `Action`."""
@@ -1,11 +1,40 @@
+"""The Get all alarms and Get all alarms next actions' messages are defined
+in G.988 A.2.11-14 (extended) and A.3.11-14 (baseline).
+
+Each Get all alarms next response reports ``(me_class, me_inst, bitmap)``
+records: exactly one in a baseline message, and as many as fit (up to
+`EXTENDED_ALARM_RECORDS`) in an extended message. Responses use the
+request's format. An extended Get all alarms request to an ONU that doesn't
+support extended messages (see `Database.supports_extended`) is rejected,
+i.e. its response reports no Get all alarms next commands.
+
+The relevant classes and instances are:
+
+* `GetAllAlarms` and `GetAllAlarmsNext`: command message classes
+* `GetAllAlarmsResponse` and `GetAllAlarmsNextResponse`: response message
+  classes
+* `get_all_alarms_action` and `get_all_alarms_next_action`: action
+  instances.
+"""
 import logging
+from typing import List, Tuple
+
 from ..action import Action
+from ..alarm_store import ALARM_BITMAP_SIZE
 from ..message import Message
-from ..types import Bytes, FieldDict
-from ..types import Number, FieldDict
+from ..types import Bytes, Number, FieldDict
 
 logger = logging.getLogger(__name__.replace('obbaa_', ''))
 
+#: Size of a ``(me_class, me_inst, bitmap)`` record.
+ALARM_RECORD_SIZE = 4 + ALARM_BITMAP_SIZE
+
+#: Number of records in a baseline Get all alarms next response.
+BASELINE_ALARM_RECORDS = 1
+
+#: Maximum number of records in an extended Get all alarms next response.
+EXTENDED_ALARM_RECORDS = 1966 // ALARM_RECORD_SIZE
+
 
 class GetAllAlarms(Message):
 
@@ -33,17 +62,15 @@ class GetAllAlarms(Message):
         return {'alarm_retrieval_mode': alarm_retrieval_mode}
 
     def process(self, server: object) -> 'GetAllAlarmsResponse':
-
-        results=server.database.get_all_alarms(self.onu_id, self.me_class,
-                                      self.me_inst, extended=self.extended)
-
-        
-        response = GetAllAlarmsResponse(cterm_name=self.cterm_name,
-                                         onu_id=self.onu_id,
-                                         extended=self.extended, tci=self.tci,
-                                         me_class=self.me_class,
-                                         me_inst=self.me_inst,
-                                         num_alarms_nexts = results.num_alarms_nexts)
+        database = server.database
+        results = database.get_all_alarms(self.onu_id, self.me_class,
+                                          self.me_inst, extended=self.extended)
+
+        response = GetAllAlarmsResponse(
+                cterm_name=self.cterm_name, onu_id=self.onu_id,
+                extended=self.extended, tci=self.tci, me_class=self.me_class,
+                me_inst=self.me_inst,
+                num_alarms_nexts=results.num_alarm_nexts)
         return response
 
 
@@ -86,31 +113,33 @@ class GetAllAlarmsNext(Message):
         return {'seq_num': seq_num}
 
     def process(self, server: object) -> 'GetAllAlarmsNextResponse':
-        results = server.database.get_all_alarms_next(self.onu_id, self.me_class,
-                                              self.me_inst, self.seq_num,
-                                              extended=self.extended)
-
+        database = server.database
+        results = database.get_all_alarms_next(self.onu_id, self.me_class,
+                                               self.me_inst, self.seq_num,
+                                               extended=self.extended)
 
         response = GetAllAlarmsNextResponse(cterm_name=self.cterm_name,
-                                         onu_id=self.onu_id,
-                                         extended=self.extended, tci=self.tci,
-                                         me_class=self.me_class,
-                                         me_inst=self.me_inst,
-                                         bit_map_alarms=results.bit_map_alarms,
-                                         me_class_reported = results.me_class_reported,
-                                         me_inst_reported = results.me_inst_reported)
+                                            onu_id=self.onu_id,
+                                            extended=self.extended,
+                                            tci=self.tci,
+                                            me_class=self.me_class,
+                                            me_inst=self.me_inst,
+                                            alarms=results.alarms)
         return response
 
 class GetAllAlarmsNextResponse(Message):
-    
-    
-    def encode_contents(self) -> bytearray:
+    """Get All Alarms next response message.
+    """
 
+    def encode_contents(self) -> bytearray:
+        alarms = self.alarms
+        assert len(alarms) <= (EXTENDED_ALARM_RECORDS if self.extended else
+                               BASELINE_ALARM_RECORDS)
         contents = bytearray()
-        contents += Number(2).encode(self.me_class_reported)
-        contents += Number(2).encode(self.me_inst_reported)
-        contents += Bytes(28).encode(self.bit_map_alarms)
-        
+        for me_class, me_inst, bitmap in alarms:
+            contents += Number(2).encode(me_class)
+            contents += Number(2).encode(me_inst)
+            contents += Bytes(ALARM_BITMAP_SIZE).encode(bitmap)
         return contents
 
     def decode_contents(self, contents: bytearray) -> FieldDict:
@@ -119,32 +148,20 @@ class GetAllAlarmsNextResponse(Message):
         Returns:
             Dictionary with the following items.
 
-            * ``me_class.me_inst.bit_map_alarms`: the item name is the
-               dot-separated ME class (MIB number), ME instance,
-               and bit_map_alarms.
+            * ``alarms``: list of ``(me_class, me_inst, bitmap)`` tuples
+              (a baseline message's record is omitted if its ``me_class``
+              is 0, i.e. if there was no record)
         """
+        alarms: List[Tuple[int, int, bytes]] = []
         offset = 0
-
-        # XXX review this termination criterion
-        while offset < len(contents):
-
-            me_class_alarm, offset = Number(2).decode(contents, offset)
-            # XXX this is baseline-only; should be an error for extended
-            if me_class_alarm == 0:
-                break
-
-            # if can't find MIB, can't proceed for baseline
-            from ..mib import mibs
-            mib = mibs.get(me_class_alarm, None)
-            if mib is None:
-                raise Exception('MIB %d not found' % me_class_alarm)
-
-            me_inst_alarm, offset = Number(2).decode(contents, offset)
-
-            bit_map_alarms, offset = Number(2).decode(contents, offset)
-        
-        return {'me_class_alarm': me_class_alarm, 'me_inst_alarm': me_inst_alarm, 'bit_map_alarms': bit_map_alarms}
-    
+        while offset + ALARM_RECORD_SIZE <= len(contents):
+            me_class, offset = Number(2).decode(contents, offset)
+            me_inst, offset = Number(2).decode(contents, offset)
+            bitmap = bytes(contents[offset:offset + ALARM_BITMAP_SIZE])
+            offset += ALARM_BITMAP_SIZE
+            if me_class != 0:
+                alarms.append((me_class, me_inst, bitmap))
+        return {'alarms': alarms}
 
 
 get_all_alarms_action = Action(11, 'get-all-alarms', 'Get all alarms action', GetAllAlarms,
@@ -0,0 +1,65 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The Get current data action's messages are defined in G.988 A.2.33-34
+(extended) and A.3.33-34 (baseline).
+
+They have the same format as the `Get` action's messages, but they return
+the current (in-progress) interval's PM counter values rather than the
+previous interval's history data.
+
+The relevant classes and instances are:
+
+* `GetCurrentData`: Get current data command message class
+* `GetCurrentDataResponse`: Get current data response message class
+* `get_current_data_action`: Get current data action instance.
+"""
+
+from ..action import Action
+from .get import Get, GetResponse
+
+
+class GetCurrentData(Get):
+    """Get current data command message.
+    """
+
+    def process(self, server: object) -> 'GetCurrentDataResponse':
+        results = server.database.get_current_data(
+                self.onu_id, self.me_class, self.me_inst, self.attr_mask,
+                extended=self.extended)
+
+        response = GetCurrentDataResponse(
+                cterm_name=self.cterm_name, onu_id=self.onu_id,
+                extended=self.extended, tci=self.tci,
+                me_class=self.me_class, me_inst=self.me_inst,
+                reason=results.reason, attr_mask=results.attr_mask,
+                opt_attr_mask=results.opt_attr_mask,
+                attr_exec_mask=results.attr_exec_mask, attrs=results.attrs)
+        return response
+
+
+class GetCurrentDataResponse(GetResponse):
+    """Get current data response message.
+    """
+    pass
+
+
+get_current_data_action = Action(28, 'get-current-data',
+                                 'Get current data action', GetCurrentData,
+                                 GetCurrentDataResponse)
+"""Get current data `Action`.
+
+This specifies the message type and provides a link between the action's
+command and response messages.
+"""
@@ -0,0 +1,97 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""The reboot action's messages are defined in G.988 Annex A (A.2 for
+extended and A.3 for baseline messages).
+
+The ONU responds before rebooting. It's then offline (it neither receives
+nor sends messages) until it has booted, at which point its MIB has been
+reset (see `Rebooter`).
+
+The relevant classes and instances are:
+
+* `Reboot`: reboot command message class
+* `RebootResponse`: reboot response message class
+* `reboot_action`: reboot action instance.
+"""
+
+import logging
+
+from ..action import Action
+from ..message import Message
+from ..types import Number, FieldDict
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+
+class Reboot(Message):
+    """Reboot command message.
+    """
+
+    def encode_contents(self) -> bytearray:
+        return Number(1).encode(self.get('flags', 0))
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``flags``: reboot conditions: 0 (unconditional), 1 (if no
+              voice calls are in progress) or 2 (if no emergency calls are
+              in progress); the simulator has no calls, so it always
+              reboots
+        """
+        flags, _ = Number(1).decode(contents, 0)
+        return {'flags': flags}
+
+    def process(self, server: object) -> 'RebootResponse':
+        """Pass this message to the server database for processing,
+        and return the response.
+        """
+        results = server.database.reboot(self.onu_id, self.me_class,
+                                         self.me_inst, self.flags,
+                                         extended=self.extended)
+
+        response = RebootResponse(cterm_name=self.cterm_name,
+                                  onu_id=self.onu_id, extended=self.extended,
+                                  tci=self.tci, me_class=self.me_class,
+                                  me_inst=self.me_inst, reason=results.reason)
+        return response
+
+
+class RebootResponse(Message):
+    """Reboot response message.
+    """
+
+    def encode_contents(self) -> bytearray:
+        return Number(1).encode(self.reason)
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``reason``: result, reason; 0-255
+        """
+        reason, _ = Number(1).decode(contents, 0)
+        return {'reason': reason}
+
+
+reboot_action = Action(25, 'reboot', 'Reboot action', Reboot, RebootResponse)
+"""Reboot `Action`.
+
+This specifies the message type and provides a link between the action's
+command and response messages.
+"""
@@ -0,0 +1,122 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The Set table action's messages are defined in G.988 A.2.46-47 (extended
+only).
+
+A Set table command carries any number of rows of a single table attribute,
+and they're applied in one batch, so provisioning a table needs one message
+rather than one Set per row. What a row does depends on the table: for keyed
+tables (see `Table`) a row with a new key is added, a row with an existing key
+replaces it, and a row whose non-key bytes are all 0xff deletes it; rows of
+other tables are appended.
+
+The relevant classes and instances are:
+
+* `SetTable`: Set table command message class
+* `SetTableResponse`: Set table response message class
+* `set_table_action`: Set table action instance.
+"""
+
+import logging
+
+from typing import List
+
+from .. import util
+
+from ..action import Action
+from ..message import Message
+from ..types import Number, FieldDict
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+
+def _split_rows(mib, attr_mask: int, data: bytearray) -> List[bytes]:
+    # an unknown attribute's rows are left as a single item (the database
+    # will reject it)
+    indices = util.indices(attr_mask)
+    attr = mib.attr(indices[0][0]) if mib and len(indices) == 1 else None
+    if not attr or not attr.is_table:
+        return [bytes(data)] if data else []
+    size = attr.size
+    return [bytes(data[offset:offset + size]) for offset in
+            range(0, len(data), size)]
+
+
+class SetTable(Message):
+    """Set table command message.
+    """
+
+    def encode_contents(self) -> bytearray:
+        contents = Number(2).encode(self.attr_mask)
+        for row in self.rows:
+            contents += row
+        return contents
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``attr_mask``: attribute mask (a single table attribute);
+              0-65535
+            * ``rows``: list of table rows (bytes)
+        """
+        attr_mask, offset = Number(2).decode(contents, 0)
+        rows = _split_rows(self._mib, attr_mask, contents[offset:])
+        return {'attr_mask': attr_mask, 'rows': rows}
+
+    def process(self, server: object) -> 'SetTableResponse':
+        """Pass this message to the server database for processing,
+        and return the response.
+        """
+        results = server.database.set_table(
+                self.onu_id, self.me_class, self.me_inst, self.attr_mask,
+                self.rows, extended=self.extended)
+
+        response = SetTableResponse(
+                cterm_name=self.cterm_name, onu_id=self.onu_id,
+                extended=self.extended, tci=self.tci,
+                me_class=self.me_class, me_inst=self.me_inst,
+                reason=results.reason)
+        return response
+
+
+class SetTableResponse(Message):
+    """Set table response message.
+    """
+
+    def encode_contents(self) -> bytearray:
+        return Number(1).encode(self.reason)
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``reason``: result, reason; 0-255
+        """
+        reason, _ = Number(1).decode(contents, 0)
+        return {'reason': reason}
+
+
+set_table_action = Action(29, 'set-table', 'Set table action', SetTable,
+                          SetTableResponse)
+"""Set table `Action`.
+
+As with the other actions, this specifies the message type and provides a
+link between the action's command and response messages.
+"""
@@ -0,0 +1,114 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""The synchronize time action's messages are defined in G.988 Annex A (A.2
+for extended and A.3 for baseline messages).
+
+Synchronizing time restarts the ONU's PM intervals (see
+`PmEngine.synchronize`). The command can also specify the time of day; the
+simulator decodes it but doesn't otherwise use it.
+
+The relevant classes and instances are:
+
+* `SyncTime`: synchronize time command message class
+* `SyncTimeResponse`: synchronize time response message class
+* `sync_time_action`: synchronize time action instance.
+"""
+
+import logging
+
+from ..action import Action
+from ..message import Message
+from ..types import Number, FieldDict
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+# time of day fields (year, month, day, hour, minute and second) and their
+# sizes
+_TIME_SIZES = (2, 1, 1, 1, 1, 1)
+
+
+class SyncTime(Message):
+    """Synchronize time command message.
+    """
+
+    def encode_contents(self) -> bytearray:
+        contents = bytearray()
+        time_of_day = self.get('time_of_day') or (0,) * len(_TIME_SIZES)
+        for size, value in zip(_TIME_SIZES, time_of_day):
+            contents += Number(size).encode(value)
+        return contents
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``time_of_day``: ``(year, month, day, hour, minute, second)``
+              tuple, or ``None`` if it wasn't specified (i.e. was absent or
+              zero)
+        """
+        time_of_day = []
+        offset = 0
+        for size in _TIME_SIZES:
+            if offset + size > len(contents):
+                break
+            value, offset = Number(size).decode(contents, offset)
+            time_of_day.append(value)
+        return {'time_of_day': tuple(time_of_day) if len(time_of_day) == len(
+                _TIME_SIZES) and any(time_of_day) else None}
+
+    def process(self, server: object) -> 'SyncTimeResponse':
+        """Pass this message to the server database for processing,
+        and return the response.
+        """
+        results = server.database.sync_time(self.onu_id, self.me_class,
+                                            self.me_inst, self.time_of_day,
+                                            extended=self.extended)
+
+        response = SyncTimeResponse(cterm_name=self.cterm_name,
+                                    onu_id=self.onu_id,
+                                    extended=self.extended, tci=self.tci,
+                                    me_class=self.me_class,
+                                    me_inst=self.me_inst,
+                                    reason=results.reason)
+        return response
+
+
+class SyncTimeResponse(Message):
+    """Synchronize time response message.
+    """
+
+    def encode_contents(self) -> bytearray:
+        return Number(1).encode(self.reason)
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``reason``: result, reason; 0-255
+        """
+        reason, _ = Number(1).decode(contents, 0)
+        return {'reason': reason}
+
+
+sync_time_action = Action(24, 'sync-time', 'Synchronize time action',
+                          SyncTime, SyncTimeResponse)
+"""Synchronize time `Action`.
+
+This specifies the message type and provides a link between the action's
+command and response messages.
+"""
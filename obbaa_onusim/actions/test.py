@@ -0,0 +1,179 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""The test action's messages and the test result notification are defined in
+G.988 Annex A (A.2 for extended and A.3 for baseline messages).
+
+A test command is acknowledged immediately. The test runs in the background
+and, when it's complete, the ONU sends a test result notification with the
+test command's TCI (see `TestEngine`). Test results are autonomous
+notifications, so they're sent with ``type_ar`` and ``type_ak`` both false.
+
+Only the ONU-G and ANI-G test formats are supported:
+
+* ONU-G self-test results are a single byte (see `SELF_TEST_RESULTS`)
+* ANI-G results are optical and electrical measurements, encoded as
+  ``(type, value)`` pairs with 2-byte two's complement values (see
+  `MEASUREMENT_TYPES`)
+
+The relevant classes and instances are:
+
+* `Test`: test command message class
+* `TestResponse`: test response message class
+* `TestResult`: test result notification message class
+* `test_action`: test action instance
+* `test_result_action`: test result action instance.
+"""
+
+import logging
+
+from typing import List, Tuple
+
+from ..action import Action
+from ..message import Message
+from ..types import Number, FieldDict
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+#: Self test ``select`` value.
+SELF_TEST = 0x07
+
+#: Self test results.
+SELF_TEST_RESULTS = ('failed', 'passed', 'not-completed')
+
+#: Measurement types, keyed by name: ``(type, resolution, units)`` tuples.
+MEASUREMENT_TYPES = {
+    'power_feed_voltage': (1, 0.02, 'V'),
+    'received_optical_power': (3, 0.002, 'dBm'),
+    'mean_optical_launch_power': (5, 0.002, 'dBm'),
+    'laser_bias_current': (9, 2e-6, 'A'),
+    'temperature': (12, 1 / 256, 'C')
+}
+
+
+# ONU-G MIB class (the ONU-G MIB module imports this module)
+_ONU_G_CLASS = 256
+
+
+def _signed(value: int) -> int:
+    return value - 0x10000 if value & 0x8000 else value
+
+
+class Test(Message):
+    """Test command message.
+    """
+
+    def encode_contents(self) -> bytearray:
+        return Number(1).encode(self.select)
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``select``: test selection; `SELF_TEST` or 8-15
+              (vendor-specific)
+        """
+        select, _ = Number(1).decode(contents, 0)
+        return {'select': select & 0x0f}
+
+    def process(self, server: object) -> 'TestResponse':
+        """Pass this message to the server database for processing,
+        and return the response.
+        """
+        results = server.database.test(self.onu_id, self.me_class,
+                                       self.me_inst, self.select,
+                                       tci=self.tci, extended=self.extended)
+
+        response = TestResponse(cterm_name=self.cterm_name,
+                                onu_id=self.onu_id, extended=self.extended,
+                                tci=self.tci, me_class=self.me_class,
+                                me_inst=self.me_inst, reason=results.reason)
+        return response
+
+
+class TestResponse(Message):
+    """Test response message.
+    """
+
+    def encode_contents(self) -> bytearray:
+        return Number(1).encode(self.reason)
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with the following items.
+
+            * ``reason``: result, reason; 0-255
+        """
+        reason, _ = Number(1).decode(contents, 0)
+        return {'reason': reason}
+
+
+class TestResult(Message):
+    """Test result notification message.
+
+    Its fields are either ``self_test`` (an index into `SELF_TEST_RESULTS`)
+    or ``measurements`` (a list of ``(type, value)`` tuples, with types from
+    `MEASUREMENT_TYPES`).
+    """
+
+    def encode_contents(self) -> bytearray:
+        if self.get('self_test') is not None:
+            return Number(1).encode(self.self_test)
+        contents = bytearray()
+        for type_, value in self.measurements:
+            contents += Number(1).encode(type_)
+            contents += Number(2).encode(value & 0xffff)
+        return contents
+
+    def decode_contents(self, contents: bytearray) -> FieldDict:
+        """Decode this message's contents, i.e. its type-specific payload.
+
+        Returns:
+            Dictionary with one of the following items.
+
+            * ``self_test``: ONU-G self-test result; an index into
+              `SELF_TEST_RESULTS`
+            * ``measurements``: list of ``(type, value)`` tuples (padding,
+              i.e. type 0, is ignored)
+        """
+        if self.me_class == _ONU_G_CLASS:
+            self_test, _ = Number(1).decode(contents, 0)
+            return {'self_test': self_test & 0x03}
+        measurements: List[Tuple[int, int]] = []
+        for offset in range(0, len(contents) - 2, 3):
+            type_, _ = Number(1).decode(contents, offset)
+            if type_ != 0:
+                value, _ = Number(2).decode(contents, offset + 1)
+                measurements.append((type_, _signed(value)))
+        return {'measurements': measurements}
+
+
+test_action = Action(18, 'test', 'Test action', Test, TestResponse)
+"""Test `Action`."""
+
+test_result_action = Action(27, 'test-result', 'Test result notification',
+                            TestResult)
+"""Test result `Action`.
+
+This specifies the message type. There's no response message.
+"""
+
+# test results are notifications, so (unlike requests) they don't request an
+# acknowledgement; re-registering makes this the default and allows them to be
+# decoded
+TestResult.register(type_mt=test_result_action.number, type_ar=False,
+                    type_ak=False)
@@ -15,6 +15,10 @@
 """The MIB upload and MIB upload next actions' messages are defined in
 G.988 A.2.13-16 (extended) and A.3.13-16 (baseline).
 
+Responses use the request's format. An extended MIB upload request to an ONU
+that doesn't support extended messages (see `Database.supports_extended`) is
+rejected, i.e. its response reports no MIB upload next commands.
+
 The relevant classes and instances are:
 
 * `MibUpload` and `MibUploadNext`: MIB upload and MIB upload next command
@@ -43,8 +47,9 @@ class MibUpload(Message):
     """
 
     def process(self, server: object) -> 'MibUploadResponse':
-        results = server.database.upload(self.onu_id, self.me_class,
-                                         self.me_inst, extended=self.extended)
+        database = server.database
+        results = database.upload(self.onu_id, self.me_class, self.me_inst,
+                                  extended=self.extended)
 
         response = MibUploadResponse(cterm_name=self.cterm_name,
                                      onu_id=self.onu_id,
@@ -97,9 +102,10 @@ class MibUploadNext(Message):
         return {'seq_num': seq_num}
 
     def process(self, server: object) -> 'MibUploadNextResponse':
-        results = server.database.upload_next(self.onu_id, self.me_class,
-                                              self.me_inst, self.seq_num,
-                                              extended=self.extended)
+        database = server.database
+        results = database.upload_next(self.onu_id, self.me_class,
+                                       self.me_inst, self.seq_num,
+                                       extended=self.extended)
 
         response = MibUploadNextResponse(cterm_name=self.cterm_name,
                                          onu_id=self.onu_id,
@@ -0,0 +1,184 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Alarm state store.
+
+Alarm state is held per ``(onu_id, me_class, me_inst)`` as a single integer
+bitmap using the G.988 alarm bitmap layout: alarm number 0 is the most
+significant bit of a 28-byte (224-bit) field, so encoding a bitmap for an
+`Alarm <alarm_action>` or `get all alarms next
+<get_all_alarms_next_action>` message is just
+``bitmap.to_bytes(ALARM_BITMAP_SIZE, 'big')``.
+
+Only instances with at least one active alarm are stored. The store also
+counts, for each ``(me_class, alarm_number)``, how many instances on each ONU
+have that alarm active, so fleet-wide questions such as "how many ONUs have
+LAN-LOS?" don't need a scan.
+
+Example::
+
+    store = AlarmStore()
+    store.raise_alarm(onu_id, 11, 1, 0)   # PPTP Ethernet UNI #1 LAN-LOS
+    store.alarmed(onu_id)                 # [(11, 1)]
+    store.count_onus(11, 0)               # 1
+"""
+
+import logging
+import threading
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+Key = Tuple[int, int]
+
+#: Alarm bitmap size in bytes.
+ALARM_BITMAP_SIZE = 28
+
+#: Alarm bitmap size in bits.
+ALARM_BITMAP_BITS = 8 * ALARM_BITMAP_SIZE
+
+
+def alarm_mask(number: int) -> int:
+    """Return the bitmap mask for an alarm number (0-223)."""
+    assert 0 <= number < ALARM_BITMAP_BITS
+    return 1 << (ALARM_BITMAP_BITS - 1 - number)
+
+
+def alarm_numbers(bitmap: int) -> List[int]:
+    """Return the (sorted) alarm numbers that are set in a bitmap."""
+    numbers = []
+    while bitmap:
+        low = bitmap & -bitmap
+        numbers.append(ALARM_BITMAP_BITS - low.bit_length())
+        bitmap ^= low
+    return sorted(numbers)
+
+
+class AlarmStore:
+    """Per-ONU, per-instance alarm bitmaps.
+
+    The store is thread-safe.
+    """
+
+    def __init__(self):
+        self._bitmaps: Dict[int, Dict[Key, int]] = {}
+        self._counts: Dict[Tuple[int, int], Dict[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, onu_id: int, me_class: int, me_inst: int) -> int:
+        """Return an instance's alarm bitmap (0 if no alarms are active)."""
+        return self._bitmaps.get(onu_id, {}).get((me_class, me_inst), 0)
+
+    def set(self, onu_id: int, me_class: int, me_inst: int,
+            bitmap: int) -> int:
+        """Set an instance's alarm bitmap.
+
+        Returns:
+            The previous bitmap.
+        """
+        with self._lock:
+            return self._set(onu_id, (me_class, me_inst), lambda _: bitmap)
+
+    def raise_alarm(self, onu_id: int, me_class: int, me_inst: int,
+                    number: int) -> bool:
+        """Raise an alarm.
+
+        Returns:
+            Whether the alarm state changed.
+        """
+        mask = alarm_mask(number)
+        with self._lock:
+            old = self._set(onu_id, (me_class, me_inst), lambda b: b | mask)
+        return not old & mask
+
+    def clear_alarm(self, onu_id: int, me_class: int, me_inst: int,
+                    number: int) -> bool:
+        """Clear an alarm.
+
+        Returns:
+            Whether the alarm state changed.
+        """
+        mask = alarm_mask(number)
+        with self._lock:
+            old = self._set(onu_id, (me_class, me_inst), lambda b: b & ~mask)
+        return bool(old & mask)
+
+    def _set(self, onu_id: int, key: Key, update) -> int:
+        bitmaps = self._bitmaps.setdefault(onu_id, {})
+        old = bitmaps.get(key, 0)
+        new = update(old)
+        if new:
+            bitmaps[key] = new
+        elif old:
+            del bitmaps[key]
+        if not bitmaps:
+            del self._bitmaps[onu_id]
+        if new != old:
+            self._count(onu_id, key[0], old, new)
+        return old
+
+    def discard(self, onu_id: int, me_class: int, me_inst: int) -> None:
+        """Clear all of an instance's alarms, e.g. when it's deleted."""
+        self.set(onu_id, me_class, me_inst, 0)
+
+    def discard_onu(self, onu_id: int, *,
+                    keep: Optional[Iterable[Key]] = None) -> None:
+        """Clear all of an ONU's alarms, except optionally for some
+        instances.
+
+        Args:
+            onu_id: ONU id.
+            keep: instances whose alarms should be kept.
+        """
+        keep = set(keep or ())
+        for key in list(self._bitmaps.get(onu_id, {}).keys()):
+            if key not in keep:
+                self.set(onu_id, key[0], key[1], 0)
+
+    def alarmed(self, onu_id: int) -> List[Key]:
+        """Return a sorted list of an ONU's instances with active alarms."""
+        return sorted(self._bitmaps.get(onu_id, {}).keys())
+
+    def count_onus(self, me_class: int, number: int) -> int:
+        """Return the number of ONUs on which at least one instance of a
+        MIB class has an alarm active."""
+        return len(self._counts.get((me_class, number), {}))
+
+    def onus(self, me_class: int, number: int) -> List[int]:
+        """Return a sorted list of the ONUs on which at least one instance
+        of a MIB class has an alarm active."""
+        return sorted(self._counts.get((me_class, number), {}).keys())
+
+    def _count(self, onu_id: int, me_class: int, old: int, new: int) -> None:
+        raised, cleared = new & ~old, old & ~new
+        for number in alarm_numbers(raised):
+            onus = self._counts.setdefault((me_class, number), {})
+            onus[onu_id] = onus.get(onu_id, 0) + 1
+        for number in alarm_numbers(cleared):
+            onus = self._counts[(me_class, number)]
+            onus[onu_id] -= 1
+            if not onus[onu_id]:
+                del onus[onu_id]
+                if not onus:
+                    del self._counts[(me_class, number)]
+
+    def __len__(self) -> int:
+        return sum(len(bitmaps) for bitmaps in self._bitmaps.values())
+
+    def __str__(self):
+        return '%s(onus=%d, instances=%d)' % (
+            self.__class__.__name__, len(self._bitmaps), len(self))
+
+    __repr__ = __str__
@@ -0,0 +1,264 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Alarm storm generation.
+
+An `AlarmStorm` raises and clears alarms on many ONUs, in order to exercise
+the controller under alarm floods. Alarm events arrive as a Poisson process
+with a configurable rate, and what each event does depends on the profile:
+
+* ``poisson``: one alarm (chosen at random from the candidate alarms) is
+  raised on one ONU (chosen at random)
+* ``burst``: ``burst_size`` such alarms are raised at once
+* ``los``: the LOS alarm is raised at once on a contiguous range of ONUs
+  (``fraction`` of them), as happens when a fiber is cut, and cleared on all
+  of them at once
+
+Each raised alarm is cleared again after an exponentially distributed hold
+time with mean ``hold`` seconds. Alarms that are already active aren't
+raised again.
+
+The storm doesn't use a timer per alarm. A single periodic `Scheduler` task
+runs `AlarmStorm.step`, which processes all the arrivals and clears that are
+due, updates the database's alarm state, and sends one notification per
+changed instance (with its final alarm bitmap) as a single batch, e.g. via
+`AlarmNotifier.notify_all`.
+
+Example::
+
+    storm = AlarmStorm(database, scheduler, alarm_notifier.notify_all,
+                       profile='los', rate=0.1, hold=20.0, fraction=0.5)
+    ...
+    storm.stop()
+"""
+
+import collections
+import heapq
+import logging
+import random
+import threading
+import time
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .alarm_store import ALARM_BITMAP_SIZE, alarm_mask
+from .database import Database
+from .mib import mibs
+from .mibs.pptp_eth_uni import pptp_eth_uni_mib
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+#: Storm profiles.
+profiles = ('poisson', 'burst', 'los')
+
+#: Default LOS alarm: MIB class, MIB instance and alarm number (LAN-LOS on
+#: the first Ethernet UNI).
+LOS_ALARM = (pptp_eth_uni_mib.number, 1, 0)
+
+# an alarm: MIB class, MIB instance and alarm number
+AlarmId = Tuple[int, int, int]
+
+
+def candidate_alarms(database: Database) -> List[AlarmId]:
+    """Return all the alarms that are declared by the MIBs of the instances
+    that are created when ONUs are reset.
+
+    Args:
+        database: the `Database`.
+
+    Returns:
+        List of ``(me_class, me_inst, number)`` tuples.
+    """
+    candidates = []
+    for me_class, me_inst in database._template().keys():
+        mib = mibs.get(me_class, None)
+        if mib:
+            candidates += [(me_class, me_inst, alarm.number) for alarm in
+                           mib._alarms]
+    return candidates
+
+
+class AlarmStorm:
+    """Alarm storm class.
+    """
+
+    def __init__(self, database: Database, scheduler,
+                 notify: Callable[[List[Tuple[int, int, int, int]]], Any], *,
+                 profile: str = 'poisson', rate: float = 10.0,
+                 hold: float = 10.0, onu_ids: Iterable[int] = None,
+                 alarms: Iterable[AlarmId] = None,
+                 los_alarm: AlarmId = LOS_ALARM, burst_size: int = 100,
+                 fraction: float = 0.5, step: float = 0.1,
+                 seed: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """Alarm storm constructor; the storm starts immediately.
+
+        Args:
+            database: the `Database`, whose alarm state is updated.
+
+            scheduler: the `Scheduler` that runs `step`.
+
+            notify: function that's called with a list of ``(onu_id,
+                me_class, me_inst, bitmap)`` tuples to send a batch of alarm
+                notifications, e.g. `AlarmNotifier.notify_all`.
+
+            profile: storm profile; one of `profiles`.
+
+            rate: mean event rate (events per second).
+
+            hold: mean time (in seconds) for which raised alarms stay active.
+
+            onu_ids: ONU ids; defaults to all ONU ids.
+
+            alarms: candidate ``(me_class, me_inst, number)`` alarms for the
+                ``poisson`` and ``burst`` profiles; defaults to
+                `candidate_alarms`.
+
+            los_alarm: the alarm to raise for the ``los`` profile.
+
+            burst_size: number of alarms per event for the ``burst`` profile.
+
+            fraction: fraction of the ONUs affected by each event for the
+                ``los`` profile.
+
+            step: interval (in seconds) at which `step` is run, i.e. the
+                batching interval.
+
+            seed: random number generator seed, for reproducible storms.
+
+            clock: clock function; defaults to ``time.monotonic``.
+        """
+        assert profile in profiles, 'invalid profile %r' % profile
+        assert rate > 0, 'invalid rate %r' % rate
+        self._database = database
+        self._notify = notify
+        self._profile = profile
+        self._rate = rate
+        self._hold = hold
+        self._onu_ids = sorted(database.onu_ids if onu_ids is None else
+                               onu_ids)
+        self._alarms = list(candidate_alarms(database) if alarms is None else
+                            alarms)
+        self._los_alarm = los_alarm
+        self._burst_size = burst_size
+        self._fraction = fraction
+        self._random = random.Random(seed)
+        self._clock = clock
+        assert self._onu_ids, 'no ONUs'
+        assert self._alarms or profile == 'los', 'no candidate alarms'
+
+        # pending clears: (time, counter, onu_id, me_class, me_inst, mask)
+        self._clears: List[Tuple[float, int, int, int, int, int]] = []
+        self._counter = 0
+        self._next_arrival = clock() + self._random.expovariate(rate)
+        self._lock = threading.Lock()
+
+        #: Counters: ``events``, ``raised``, ``cleared`` and
+        #: ``notifications``.
+        self.metrics = collections.Counter()
+
+        self._scheduler = scheduler
+        self._task = scheduler.call_every(step, self.step)
+        logger.info('started %s' % self)
+
+    def step(self) -> int:
+        """Process the events and clears that are due, and notify the changed
+        instances.
+
+        Returns:
+            Number of notifications.
+        """
+        now = self._clock()
+        changed: Dict[Tuple[int, int, int], int] = {}
+        with self._lock:
+            while self._next_arrival <= now:
+                self._event(self._next_arrival, changed)
+                self._next_arrival += self._random.expovariate(self._rate)
+            while self._clears and self._clears[0][0] <= now:
+                _, _, onu_id, me_class, me_inst, mask = \
+                    heapq.heappop(self._clears)
+                self._update(onu_id, me_class, me_inst, mask, False, changed)
+        return self._flush(changed)
+
+    def stop(self) -> int:
+        """Stop the storm, clearing all the alarms that it has raised.
+
+        Returns:
+            Number of notifications.
+        """
+        self._scheduler.cancel(self._task)
+        changed: Dict[Tuple[int, int, int], int] = {}
+        with self._lock:
+            clears, self._clears = self._clears, []
+            for _, _, onu_id, me_class, me_inst, mask in clears:
+                self._update(onu_id, me_class, me_inst, mask, False, changed)
+        logger.info('stopped %s' % self)
+        return self._flush(changed)
+
+    def _event(self, now: float, changed: Dict) -> None:
+        self.metrics['events'] += 1
+        choice = self._random.choice
+        if self._profile == 'los':
+            count = max(1, round(self._fraction * len(self._onu_ids)))
+            first = self._random.randrange(len(self._onu_ids) - count + 1)
+            me_class, me_inst, number = self._los_alarm
+            until = now + self._random.expovariate(1.0 / self._hold)
+            for onu_id in self._onu_ids[first:first + count]:
+                self._raise(onu_id, me_class, me_inst, alarm_mask(number),
+                            until, changed)
+        else:
+            count = self._burst_size if self._profile == 'burst' else 1
+            for _ in range(count):
+                me_class, me_inst, number = choice(self._alarms)
+                until = now + self._random.expovariate(1.0 / self._hold)
+                self._raise(choice(self._onu_ids), me_class, me_inst,
+                            alarm_mask(number), until, changed)
+
+    def _raise(self, onu_id: int, me_class: int, me_inst: int, mask: int,
+               until: float, changed: Dict) -> None:
+        if self._update(onu_id, me_class, me_inst, mask, True, changed):
+            self._counter += 1
+            heapq.heappush(self._clears, (until, self._counter, onu_id,
+                                          me_class, me_inst, mask))
+
+    def _update(self, onu_id: int, me_class: int, me_inst: int, mask: int,
+                active: bool, changed: Dict) -> bool:
+        database = self._database
+        with database.locks(onu_id):
+            old = database.alarms.get(onu_id, me_class, me_inst)
+            new = old | mask if active else old & ~mask
+            if new == old:
+                return False
+            database.set_alarm(me_class, me_inst, new.to_bytes(
+                    ALARM_BITMAP_SIZE, 'big'), onu_id)
+            # the instance might not exist, or might not support the alarm
+            if database.alarms.get(onu_id, me_class, me_inst) == old:
+                return False
+        changed[(onu_id, me_class, me_inst)] = new
+        self.metrics['raised' if active else 'cleared'] += 1
+        return True
+
+    def _flush(self, changed: Dict[Tuple[int, int, int], int]) -> int:
+        if changed:
+            self.metrics['notifications'] += len(changed)
+            self._notify([key + (bitmap,) for key, bitmap in
+                          changed.items()])
+        return len(changed)
+
+    def __str__(self):
+        return '%s(profile=%r, rate=%r, hold=%r, onus=%d, active=%d)' % (
+            self.__class__.__name__, self._profile, self._rate, self._hold,
+            len(self._onu_ids), len(self._clears))
+
+    __repr__ = __str__
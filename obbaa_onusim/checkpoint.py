@@ -0,0 +1,449 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Database checkpoints.
+
+A checkpoint is a compact binary file containing the state of all the ONUs in
+a `Database`, i.e. their MIB instances (including ``mib_data_sync``) and
+their alarm state. Loading a checkpoint restores this state without
+re-applying the specs or re-provisioning, so the simulator can be restarted
+"warm".
+
+Example::
+
+    checkpoint.save(server.database, 'onusim.ckpt')
+    ...
+    checkpoint.load(server.database, 'onusim.ckpt')
+
+File format (all integers are unsigned LEB128 varints unless noted):
+
+* Header: ``MAGIC``, then the format version as a 2-byte big-endian integer.
+
+* One ``ONU`` record per ONU: onu id, journal sequence number (see below),
+  number of instances, then for each instance its class and instance number
+  and either ``TEMPLATE`` (the instance is unchanged from the compiled specs)
+  or ``VALUES`` followed by the number of attributes and their ``(name,
+  value)`` pairs. Then the number of alarmed instances and, for each of them,
+  its class, instance number and alarm bitmap.
+
+* An ``END`` record containing the CRC-32 of everything that precedes it
+  (4-byte big-endian integer).
+
+Attribute values are tagged (see `_encode_value`). Callable values (e.g.
+``sys_up_time``) can't be saved, so they're stored as ``FROM_TEMPLATE`` and
+re-read from the compiled specs on load.
+
+The file is written and read in a streaming fashion, one ONU at a time, and is
+written to a temporary file that's renamed on success, so a crash during
+`save` leaves the previous checkpoint intact.
+
+If a `Journal` is specified when saving, each ONU's record includes the
+journal sequence number of the last change included in the ONU's snapshot,
+so that `replay <journal.replay>` knows which journal records to apply.
+"""
+
+import logging
+import os
+import struct
+import zlib
+
+from typing import Any, BinaryIO, Dict, List, Tuple
+
+from .pmap import PMap
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+MAGIC = b'ONUSIMCK'
+
+#: Checkpoint format version.
+VERSION = 1
+
+# record tags
+_ONU = 0x01
+_END = 0xff
+
+# instance kinds
+_TEMPLATE = 0
+_VALUES = 1
+
+# value tags
+_NONE = 0
+_FALSE = 1
+_TRUE = 2
+_INT = 3
+_BYTES = 4
+_STR = 5
+_TUPLE = 6
+_LIST = 7
+_FLOAT = 8
+_FROM_TEMPLATE = 9
+
+_BUFFER_SIZE = 65536
+
+
+class _Writer:
+    def __init__(self, fd: BinaryIO):
+        self._fd = fd
+        self._buf = bytearray()
+        self.crc = 0
+
+    def bytes(self, data: bytes) -> None:
+        self._buf += data
+        if len(self._buf) >= _BUFFER_SIZE:
+            self.flush()
+
+    def uint(self, value: int) -> None:
+        assert value >= 0
+        buf = self._buf
+        while value > 0x7f:
+            buf.append((value & 0x7f) | 0x80)
+            value >>= 7
+        buf.append(value)
+        if len(buf) >= _BUFFER_SIZE:
+            self.flush()
+
+    def int(self, value: int) -> None:
+        # zigzag encoding
+        self.uint(value << 1 if value >= 0 else ((-value) << 1) - 1)
+
+    def blob(self, data: bytes) -> None:
+        self.uint(len(data))
+        self.bytes(data)
+
+    def flush(self) -> None:
+        self.crc = zlib.crc32(self._buf, self.crc)
+        self._fd.write(self._buf)
+        self._buf = bytearray()
+
+
+class _Reader:
+    def __init__(self, fd: BinaryIO):
+        self._fd = fd
+        self._buf = b''
+        self._pos = 0
+        self._consumed = 0
+        self.crc = 0
+
+    def _fill(self, size: int) -> None:
+        # the CRC covers the bytes that have been consumed
+        self.crc = zlib.crc32(self._buf[:self._pos], self.crc)
+        self._consumed += self._pos
+        self._buf = self._buf[self._pos:] + self._fd.read(
+                max(size, _BUFFER_SIZE))
+        self._pos = 0
+        if len(self._buf) < size:
+            raise ValueError('checkpoint is truncated')
+
+    def bytes(self, size: int) -> bytes:
+        if self._pos + size > len(self._buf):
+            self._fill(size)
+        data = self._buf[self._pos:self._pos + size]
+        self._pos += size
+        return data
+
+    def byte(self) -> int:
+        if self._pos >= len(self._buf):
+            self._fill(1)
+        value = self._buf[self._pos]
+        self._pos += 1
+        return value
+
+    def uint(self) -> int:
+        value = shift = 0
+        while True:
+            byte = self.byte()
+            value |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                return value
+            shift += 7
+
+    def int(self) -> int:
+        value = self.uint()
+        return -((value + 1) >> 1) if value & 1 else value >> 1
+
+    def blob(self) -> bytes:
+        return self.bytes(self.uint())
+
+    def consumed_crc(self) -> int:
+        return zlib.crc32(self._buf[:self._pos], self.crc)
+
+    def tell(self) -> int:
+        return self._consumed + self._pos
+
+    def at_end(self) -> bool:
+        if self._pos < len(self._buf):
+            return False
+        try:
+            self._fill(1)
+            return False
+        except ValueError:
+            return True
+
+
+def _encode_value(writer: _Writer, value: Any) -> None:
+    if value is None:
+        writer.uint(_NONE)
+    elif value is False or value is True:
+        writer.uint(_TRUE if value else _FALSE)
+    elif isinstance(value, int):
+        writer.uint(_INT)
+        writer.int(value)
+    elif isinstance(value, (bytes, bytearray)):
+        writer.uint(_BYTES)
+        writer.blob(value)
+    elif isinstance(value, str):
+        writer.uint(_STR)
+        writer.blob(value.encode('utf-8'))
+    elif isinstance(value, (tuple, list)):
+        writer.uint(_TUPLE if isinstance(value, tuple) else _LIST)
+        writer.uint(len(value))
+        for item in value:
+            _encode_value(writer, item)
+    elif isinstance(value, float):
+        writer.uint(_FLOAT)
+        writer.bytes(struct.pack('>d', value))
+    elif callable(value):
+        writer.uint(_FROM_TEMPLATE)
+    else:
+        raise TypeError('unsupported checkpoint value %r' % (value,))
+
+
+class _FromTemplate:
+    # placeholder for a value that should be taken from the template
+    pass
+
+
+_from_template = _FromTemplate()
+
+
+def _decode_value(reader: _Reader) -> Any:
+    tag = reader.uint()
+    if tag == _NONE:
+        return None
+    elif tag in {_FALSE, _TRUE}:
+        return tag == _TRUE
+    elif tag == _INT:
+        return reader.int()
+    elif tag == _BYTES:
+        return reader.blob()
+    elif tag == _STR:
+        return reader.blob().decode('utf-8')
+    elif tag in {_TUPLE, _LIST}:
+        items = [_decode_value(reader) for _ in range(reader.uint())]
+        return tuple(items) if tag == _TUPLE else items
+    elif tag == _FLOAT:
+        return struct.unpack('>d', reader.bytes(8))[0]
+    elif tag == _FROM_TEMPLATE:
+        return _from_template
+    else:
+        raise ValueError('invalid checkpoint value tag %d' % tag)
+
+
+def _resolve(value: Any, template_value: Any) -> Any:
+    # replace _from_template placeholders with the template's values
+    if value is _from_template:
+        if template_value is None:
+            raise ValueError('checkpoint value not in template')
+        return template_value
+    elif isinstance(value, (tuple, list)) and any(
+            isinstance(v, (_FromTemplate, tuple, list)) for v in value):
+        template_value = template_value or ()
+        items = [_resolve(v, template_value[i] if i < len(template_value)
+                          else None) for i, v in enumerate(value)]
+        return tuple(items) if isinstance(value, tuple) else items
+    return value
+
+
+def _write_instance(writer: _Writer, me_class: int, me_inst: int,
+                    instance: dict, template: PMap) -> None:
+    writer.uint(me_class)
+    writer.uint(me_inst)
+    if instance is template.get((me_class, me_inst), None):
+        writer.uint(_TEMPLATE)
+    else:
+        writer.uint(_VALUES)
+        writer.uint(len(instance))
+        for name, value in instance.items():
+            writer.blob(name.encode('utf-8'))
+            _encode_value(writer, value)
+
+
+def _read_instance(reader: _Reader, template: PMap) -> \
+        Tuple[Tuple[int, int], dict]:
+    key = (reader.uint(), reader.uint())
+    template_instance = template.get(key, None)
+    kind = reader.uint()
+    if kind == _TEMPLATE:
+        if template_instance is None:
+            raise ValueError('checkpoint instance %r not in template' % (
+                key,))
+        return key, template_instance
+    elif kind != _VALUES:
+        raise ValueError('invalid checkpoint instance kind %d' % kind)
+    instance = {}
+    for _ in range(reader.uint()):
+        name = reader.blob().decode('utf-8')
+        value = _decode_value(reader)
+        instance[name] = _resolve(value, (template_instance or {}).get(
+                name, None))
+    return key, instance
+
+
+def save(database, path: str, *, journal=None) -> int:
+    """Save a database checkpoint.
+
+    Each ONU is snapshotted (with its lock held) just before it's written, so
+    the checkpoint is consistent per ONU but not across ONUs. Hibernating
+    ONUs aren't woken up (see `Hibernator.records`).
+
+    Args:
+        database: the `Database`.
+        path: checkpoint file path.
+        journal: the `Journal` (if any) that's recording database changes.
+
+    Returns:
+        Number of ONUs saved.
+    """
+    template = database._template()
+    temp_path = '%s.tmp' % path
+    count = 0
+    with open(temp_path, 'wb') as fd:
+        writer = _Writer(fd)
+        writer.bytes(MAGIC)
+        writer.bytes(VERSION.to_bytes(2, 'big'))
+        hibernator = database._hibernator
+        for onu_id in database.onu_ids:
+            # ONUs are read without being accessed (which would wake up
+            # hibernating ONUs, and keep awake ONUs from becoming idle);
+            # hibernating ONUs' records are written as they are
+            with database.locks(onu_id):
+                seq = journal.seq if journal else 0
+                records = hibernator.records(onu_id) if hibernator is not \
+                    None else None
+                instances = database._instances[onu_id] if records is \
+                    None else None
+                alarmed = [(key, database.alarms.get(onu_id, *key)) for key
+                           in database.alarms.alarmed(onu_id)]
+            writer.uint(_ONU)
+            writer.uint(onu_id)
+            writer.uint(seq)
+            if records is not None:
+                writer.bytes(records)
+            else:
+                writer.uint(len(instances))
+                for (me_class, me_inst), instance in instances.items():
+                    _write_instance(writer, me_class, me_inst, instance,
+                                    template)
+            writer.uint(len(alarmed))
+            for (me_class, me_inst), bitmap in alarmed:
+                writer.uint(me_class)
+                writer.uint(me_inst)
+                writer.uint(bitmap)
+            count += 1
+        writer.uint(_END)
+        writer.flush()
+        fd.write(writer.crc.to_bytes(4, 'big'))
+        fd.flush()
+        os.fsync(fd.fileno())
+    os.replace(temp_path, path)
+    logger.info('saved %d ONUs to checkpoint %s' % (count, path))
+    return count
+
+
+#: Checkpoint ONU: ``(onu_id, seq, instances, alarms)``, where ``seq`` is the
+#: journal sequence number and ``alarms`` maps ``(me_class, me_inst)`` to
+#: alarm bitmap.
+CheckpointOnu = Tuple[int, int, PMap, Dict[Tuple[int, int], int]]
+
+
+def read(path: str, template: PMap) -> List[CheckpointOnu]:
+    """Read a checkpoint (without applying it).
+
+    Args:
+        path: checkpoint file path.
+        template: compiled MIB instance template.
+
+    Returns:
+        List of `CheckpointOnu` tuples.
+
+    Raises:
+        ValueError: The file isn't a valid checkpoint.
+    """
+    onus = []
+    with open(path, 'rb') as fd:
+        reader = _Reader(fd)
+        if reader.bytes(len(MAGIC)) != MAGIC:
+            raise ValueError('%s is not a checkpoint' % path)
+        version = int.from_bytes(reader.bytes(2), 'big')
+        if version != VERSION:
+            raise ValueError('%s has unsupported checkpoint version %d' % (
+                path, version))
+        while True:
+            tag = reader.uint()
+            if tag == _END:
+                break
+            elif tag != _ONU:
+                raise ValueError('invalid checkpoint record tag %d' % tag)
+            onu_id = reader.uint()
+            seq = reader.uint()
+            items = [_read_instance(reader, template) for _ in
+                     range(reader.uint())]
+            alarms = {}
+            for _ in range(reader.uint()):
+                # the key must be read before the bitmap (in an assignment,
+                # the value is evaluated first)
+                key = (reader.uint(), reader.uint())
+                alarms[key] = reader.uint()
+            onus.append((onu_id, seq, PMap(items), alarms))
+        crc = reader.consumed_crc()
+        if int.from_bytes(reader.bytes(4), 'big') != crc:
+            raise ValueError('%s checkpoint CRC mismatch' % path)
+    return onus
+
+
+def load(database, path: str, *, strict: bool = False) -> Dict[int, int]:
+    """Load a database checkpoint.
+
+    The checkpoint is read and verified before anything is changed.
+
+    Args:
+        database: the `Database`.
+        path: checkpoint file path.
+        strict: whether it's an error for the checkpoint to contain ONU ids
+            that aren't in the database (otherwise they're ignored).
+
+    Returns:
+        Journal sequence number of each loaded ONU, keyed by ONU id.
+
+    Raises:
+        ValueError: The file isn't a valid checkpoint, or (if ``strict``) it
+            contains unknown ONU ids.
+    """
+    onus = read(path, database._template())
+    known = set(database.onu_ids)
+    unknown = [onu_id for onu_id, _, _, _ in onus if onu_id not in known]
+    if unknown:
+        message = 'checkpoint %s ONU ids %s are not in the database' % (
+            path, ', '.join(str(onu_id) for onu_id in unknown[:10]))
+        if strict:
+            raise ValueError(message)
+        logger.warning(message)
+
+    seqs = {}
+    for onu_id, seq, instances, alarms in onus:
+        if onu_id in known:
+            database.rollback(onu_id, instances, alarms=alarms)
+            seqs[onu_id] = seq
+    logger.info('loaded %d ONUs from checkpoint %s' % (len(seqs), path))
+    return seqs
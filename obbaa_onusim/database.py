@@ -17,16 +17,42 @@
 This will currently only really work on the server side, but it makes sense
 also to have a client-side database, populated via `get <get_action>` and
 `MIB upload <mib_upload_action>` actions.
+
+Each ONU's instances are held in a persistent map (`PMap`) and instances are
+never modified in place, so taking a snapshot (see `Database.snapshot`) is
+just a matter of keeping a reference to the current map. MIB uploads latch a
+snapshot in this way, and later changes don't disturb it.
 """
 
 from gettext import install
+import functools
+import inspect
 import logging
+import threading
 import time
 import math
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from . import util
 
+from .actions.delete import delete_action
+from .actions.get import BASELINE_CHUNK_SIZE, EXTENDED_CHUNK_SIZE, \
+    TABLE_SIZE_SIZE
+from .actions.reboot import reboot_action
+from .actions.sync_time import sync_time_action
+from .actions.test import SELF_TEST, test_action
+from .actions.get_all_alarms import BASELINE_ALARM_RECORDS, \
+    EXTENDED_ALARM_RECORDS
+from .alarm_store import ALARM_BITMAP_SIZE, AlarmStore, alarm_mask
+from .download import DownloadManager
+from .image_store import ImageStore
+from .instance_index import InstanceIndex
+from .locking import KeyedLocks
+from .pmap import PMap
+from .references import Key, ReferenceIndex, Referrer, instance_refs
+from .service_graph import Path, ServiceGraph
+from .session import SessionManager
+from .table_store import TableStore
 from .mib import Attr, MIB, M, RW, RWC
 from .mibs.onu_g import onu_g_mib
 from .mibs.onu2_g import onu2_g_mib
@@ -47,7 +73,9 @@ from .mibs.priority_queue import priority_queue_mib
 from .mibs.onu_remote_debug import onu_remote_debug_mib
 from .mibs.eth_frame_downstream_pm import eth_frame_downstream_pm_mib
 from .mibs.eth_frame_upstream_pm import eth_frame_upstream_pm_mib
-from .types import AttrDataValues, Table
+from .mibs.threshold_data_1 import threshold_data_1_mib
+from .mibs.threshold_data_2 import threshold_data_2_mib
+from .types import AttrDataValues
 
 logger = logging.getLogger(__name__.replace('obbaa_', ''))
 
@@ -58,8 +86,6 @@ Snapshot = Tuple[bool, int, list]
 # note the startup time
 startup_time = time.time()
 
-mibs_with_alarms = 0* [(int,int)]
-
 # this determines whether the server supports extended messages
 # XXX this currently only affects the omcc_version attribute
 extended_supported = True
@@ -210,6 +236,10 @@ specs = (
     )),
     (eth_frame_upstream_pm_mib, (
     )),
+    (threshold_data_1_mib, (
+    )),
+    (threshold_data_2_mib, (
+    )),
 
 )
 
@@ -247,14 +277,19 @@ class Results:
         #: Number of upload-nexts (used by `Database.upload`).
         self.num_upload_nexts: int = 0
 
-        #: Number of alarms next 
+        #: Number of get-all-alarms-nexts (used by `Database.get_all_alarms`).
         self.num_alarm_nexts: int = 0
 
-        self.bit_map_alarms: bytes = b'0'
+        #: ``(me_class, me_inst, bitmap)`` tuples (used by
+        #: `Database.get_all_alarms_next`).
+        self.alarms: List[Tuple[int, int, bytes]] = []
 
-        self.me_class_reported: int = 0
+        #: Window size chosen by the ONU (used by `Database.start_download`).
+        self.window_size: int = 0
 
-        self.me_inst_reported: int = 0
+        #: Per-instance ``(me_inst, result)`` tuples (used by
+        #: `Database.start_download` and `Database.end_download`).
+        self.inst_results: List[Tuple[int, int]] = []
 
         #: Next message body (used by `Database.upload_next`).
         self.body: List[int, List[Snapshot]] = [0, []]
@@ -262,7 +297,8 @@ class Results:
     def __str__(self):
         return '%s(reason=%#03x, attr_mask=%#06x, ' \
                'opt_attr_mask=%#06x, attr_exec_mask=%#06x, ' \
-               'attrs=%r, num_upload_nexts=%d, body=%r)' % (
+               'attrs=%r, num_upload_nexts=%d, num_alarm_nexts=%d, ' \
+               'body=%r)' % (
                    self.__class__.__name__, self.reason, self.attr_mask,
                    self.opt_attr_mask, self.attr_exec_mask, self.attrs,
                    self.num_upload_nexts,self.num_alarm_nexts, self.body)
@@ -270,6 +306,132 @@ class Results:
     __repr__ = __str__
 
 
+def _onu_locked(func):
+    """Decorator that runs a `Database` method with its ONU's lock held.
+
+    The method must have an ``onu_id`` argument. If the ONU is hibernating
+    (see `Hibernator`), it's woken up first.
+
+    Invalid ONU ids (e.g. from malformed messages) have no state to protect,
+    so the method is run without a lock; otherwise each of them would add an
+    entry to the lock table.
+    """
+    position = list(inspect.signature(func).parameters).index('onu_id')
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        onu_id = kwargs['onu_id'] if 'onu_id' in kwargs else \
+            args[position - 1]
+        if onu_id not in self._instances:
+            return func(self, *args, **kwargs)
+        with self._locks(onu_id):
+            if self._hibernator is not None:
+                self._hibernator.touch(onu_id)
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
+class DatabaseListener:
+    """Database listener base class.
+
+    Listeners (see `Database.add_listener`) are notified of every change to
+    an ONU's MIB instances and alarm state. They're called with the ONU's lock
+    held, so they should be quick (e.g. queue the change for later
+    processing). Instances and snapshots are immutable, so they can safely be
+    queued.
+
+    The methods do nothing; override the ones that are needed.
+    """
+
+    def instance_changed(self, onu_id: int, me_class: int, me_inst: int,
+                         instance: Optional[Instance]) -> None:
+        """An instance has been created or updated (or, if ``instance`` is
+        ``None``, deleted)."""
+        pass
+
+    def onu_reloaded(self, onu_id: int, instances: PMap) -> None:
+        """All of an ONU's instances have been replaced, e.g. by a MIB reset
+        (its alarm changes are notified separately)."""
+        pass
+
+    def alarm_changed(self, onu_id: int, me_class: int, me_inst: int,
+                      bitmap: int) -> None:
+        """An instance's alarm bitmap has changed (it's 0 if no alarms are
+        active)."""
+        pass
+
+    def attributes_changed(self, onu_id: int, me_class: int, me_inst: int,
+                           attr_mask: int) -> None:
+        """Attributes that generate Attribute Value Change (AVC)
+        notifications have been changed (see `Database.set`); this is
+        notified after `instance_changed`."""
+        pass
+
+    def onu_woken(self, onu_id: int) -> None:
+        """A hibernating ONU has been woken up (see `Hibernator`); its
+        instances haven't changed."""
+        pass
+
+
+class _ImageReferences(DatabaseListener):
+    """Counts the `ImageStore` references from software image instances'
+    ``image_hash`` attributes.
+    """
+
+    def __init__(self, images: ImageStore):
+        self._images = images
+        self._me_class = software_image_mib.number
+        # image hashes, keyed by ONU id and software image instance
+        self._refs: Dict[int, Dict[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def instance_changed(self, onu_id: int, me_class: int, me_inst: int,
+                         instance: Optional[Instance]) -> None:
+        if me_class == self._me_class:
+            self._set(onu_id, me_inst, instance)
+
+    def onu_reloaded(self, onu_id: int, instances: PMap) -> None:
+        with self._lock:
+            refs = self._refs.pop(onu_id, {})
+        for digest in refs.values():
+            self._images.release(digest)
+        # the template's images have no hashes
+        if instances is not Database._template():
+            for (me_class, me_inst), instance in instances.items():
+                if me_class == self._me_class:
+                    self._set(onu_id, me_inst, instance)
+
+    def _set(self, onu_id: int, me_inst: int,
+             instance: Optional[Instance]) -> None:
+        digest = instance and instance.get('image_hash', (None,))[0] or None
+        with self._lock:
+            refs = self._refs.setdefault(onu_id, {})
+            old = refs.pop(me_inst, None)
+            if digest:
+                refs[me_inst] = digest
+        if digest:
+            self._images.acquire(digest)
+        if old:
+            self._images.release(old)
+
+
+class _IndexTracker(DatabaseListener):
+    """Keeps a `ReferenceIndex` or `ServiceGraph` up to date.
+    """
+
+    def __init__(self, index):
+        self._index = index
+
+    def instance_changed(self, onu_id: int, me_class: int, me_inst: int,
+                         instance: Optional[Instance]) -> None:
+        self._index.update(onu_id, me_class, me_inst, instance)
+
+    def onu_reloaded(self, onu_id: int, instances: PMap) -> None:
+        # the template has no references, so it has no service graph edges
+        self._index.reload(onu_id, () if instances is
+                           Database._template() else instances.items())
+
+
 # XXX should extract common logic, e.g. finding the instance and common results
 # XXX should consider whether any of these logic can be in messages; maybe not,
 #     because only this module should know about instances
@@ -277,28 +439,282 @@ class Database:
     """MIB database class.
     """
 
-    def __init__(self, onu_id_range: range):
+    def __init__(self, onu_id_range: range, *,
+                 session_timeout: float = 60.0, max_sessions: int = 10000,
+                 image_dir: Optional[str] = None,
+                 check_references: bool = False):
         """MIB database constructor.
 
         Args:
-            onu_id_range: ONU {'me_inst': (0,), 'mib_data_sync': (0,)}
-id range, e.g. ``range(10)`` means ONU ids 0, 1,
+            onu_id_range: ONU id range, e.g. ``range(10)`` means ONU ids 0, 1,
                 ...9. An identical database is instantiated for each of these
                 ONU ids.
+
+            session_timeout: inactivity timeout (in seconds) of the snapshots
+                taken by `upload`, `get` (of table attributes) and
+                `get_all_alarms`.
+
+            max_sessions: maximum number of such snapshots (across all ONUs).
+
+            image_dir: directory in which to store downloaded software images
+                (see `ImageStore`); if ``None``, they're stored in memory.
+
+            check_references: initial value of `check_references`.
         """
-        self._instances: Dict[int, Dict[Tuple[int, int], Instance]] = {}
-        self._snapshots: Dict[int, Snapshot] = {}
+        self._instances: Dict[int, PMap] = {}
+        self._indexes: Dict[int, InstanceIndex] = {}
+        self._alarms = AlarmStore()
+        self._sessions = SessionManager(timeout=session_timeout,
+                                        max_sessions=max_sessions)
+        self._images = ImageStore(image_dir)
+        self._downloads = DownloadManager(self._images)
+        self._tables = TableStore()
+        self._locks = KeyedLocks()
+        self._references = ReferenceIndex()
+        self._service_graph = ServiceGraph()
+        self._listeners: List[DatabaseListener] = [
+            _ImageReferences(self._images),
+            _IndexTracker(self._references),
+            _IndexTracker(self._service_graph)]
+
+        #: Whether to check references (see `Ref`): if so, creates and sets
+        #: that would leave dangling references fail, and so do deletes of
+        #: referenced instances (unless they're cascaded).
+        self.check_references = check_references
+        self._hibernator = None
+        self._pm = None
+        self._rebooter = None
+        self._tester = None
+        self._template()
         self._instantiate(onu_id_range)
 
     def _instantiate(self, onu_id_range: range) -> None:
         self._instances = {}
-        self._snapshots = {}
+        self._indexes = {}
         for onu_id in onu_id_range:
             self._reload(onu_id)
 
     def _reload(self, onu_id: int) -> None:
-        self._instances[onu_id] = self.__reload()
-        self._snapshots[onu_id] = (False, 0, [])
+        # the template is immutable, so it can be shared
+        self._instances[onu_id] = self._template()
+        self._indexes[onu_id] = self._template_index().copy()
+        self._discard_alarms(onu_id)
+        self._sessions.discard(onu_id)
+        self._downloads.discard(onu_id)
+        self._tables.discard_onu(onu_id)
+        self._notify('onu_reloaded', onu_id, self._instances[onu_id])
+
+    def add_listener(self, listener: DatabaseListener) -> None:
+        """Add a listener that will be notified of changes."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: DatabaseListener) -> None:
+        """Remove a listener (it's OK if it isn't present)."""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, method: str, *args) -> None:
+        # a failing listener mustn't break the database operation
+        for listener in self._listeners:
+            try:
+                getattr(listener, method)(*args)
+            except Exception as e:
+                logger.error('listener %r %s failed: %s: %s' % (
+                    listener, method, e.__class__.__name__, e))
+
+    def reset_all(self, onu_ids: Iterable[int] = None) -> int:
+        """Reset the MIBs of multiple ONUs, e.g. all of them.
+
+        This has the same effect as a `MIB reset <mib_reset_action>` for each
+        ONU, but without the per-message overhead.
+
+        Args:
+            onu_ids: ONU ids; defaults to all ONU ids.
+
+        Returns:
+            Number of ONUs that were reset (unknown ONU ids are ignored).
+        """
+        onu_ids = list(self._instances.keys()) if onu_ids is None else \
+            [onu_id for onu_id in onu_ids if onu_id in self._instances]
+        for onu_id in onu_ids:
+            with self._locks(onu_id):
+                if self._hibernator is not None:
+                    self._hibernator.touch(onu_id)
+                self._reload(onu_id)
+        logger.info('reset %d ONU MIBs' % len(onu_ids))
+        return len(onu_ids)
+
+    def reboot_all(self, onu_ids: Iterable[int] = None,
+                   boot_time: Optional[float] = None) -> int:
+        """Reboot multiple ONUs, e.g. all of them.
+
+        This has the same effect as a `reboot <reboot_action>` for each ONU,
+        e.g. to simulate a mass reboot after a power cut. If there's no
+        `Rebooter`, the ONUs' MIBs are reset at once.
+
+        Args:
+            onu_ids: ONU ids; defaults to all ONU ids.
+            boot_time: boot time in seconds; defaults to the rebooter's.
+
+        Returns:
+            Number of ONUs that were rebooted (unknown ONU ids are ignored).
+        """
+        onu_ids = self.onu_ids if onu_ids is None else onu_ids
+        if self._rebooter is None:
+            return self.reset_all(onu_ids)
+        return self._rebooter.reboot(onu_ids, boot_time)
+
+    def is_online(self, onu_id: int) -> bool:
+        """Whether an ONU is online, i.e. isn't rebooting."""
+        return self._rebooter is None or not self._rebooter.is_offline(
+                onu_id)
+
+    @property
+    def onu_ids(self) -> List[int]:
+        """Sorted list of ONU ids."""
+        return sorted(self._instances.keys())
+
+    @_onu_locked
+    def snapshot(self, onu_id: int) -> Optional[PMap]:
+        """Return a snapshot of an ONU's MIB instances.
+
+        This is cheap (it doesn't copy anything) and the snapshot isn't
+        affected by subsequent changes, so it can be read without holding the
+        ONU's lock. It mustn't be modified.
+
+        Args:
+            onu_id: ONU id.
+
+        Returns:
+            Map from ``(me_class, me_inst)`` to instance (a dictionary mapping
+            attribute names to values), or ``None`` if the ONU id is invalid.
+        """
+        return self._instances.get(onu_id, None)
+
+    @_onu_locked
+    def rollback(self, onu_id: int, snapshot: PMap, *,
+                 alarms: Optional[Dict[Tuple[int, int], int]] = None) -> None:
+        """Restore an ONU's MIB instances from a snapshot.
+
+        The ``mib_data_sync`` value is restored too.
+
+        Args:
+            onu_id: ONU id.
+            snapshot: snapshot previously returned by `snapshot`.
+            alarms: alarm bitmaps, keyed by ``(me_class, me_inst)``, that
+                replace the ONU's alarm state; if not specified, alarms of
+                instances that aren't in the snapshot are cleared.
+        """
+        assert onu_id in self._instances, 'invalid ONU id %r' % onu_id
+        self._instances[onu_id] = snapshot
+        self._indexes[onu_id] = InstanceIndex(snapshot.keys())
+        if alarms is None:
+            self._discard_alarms(onu_id, keep=snapshot.keys())
+        else:
+            self._discard_alarms(onu_id, keep=alarms.keys())
+            for (me_class, me_inst), bitmap in alarms.items():
+                self._set_alarm(onu_id, me_class, me_inst, bitmap)
+        self._notify('onu_reloaded', onu_id, snapshot)
+        logger.info('ONU %d rolled back' % onu_id)
+
+    @_onu_locked
+    def restore_instance(self, onu_id: int, me_class: int, me_inst: int,
+                         instance: Optional[Instance]) -> None:
+        """Create, replace or (if ``instance`` is ``None``) delete an
+        instance without any checks or side-effects (such as incrementing
+        ``mib_data_sync``).
+
+        This is intended for restoring state, e.g. replaying a journal.
+        """
+        if instance is None:
+            self._remove(onu_id, me_class, me_inst)
+        else:
+            self._put(onu_id, me_class, me_inst, instance)
+            self._indexes[onu_id].add(me_class, me_inst)
+
+    @_onu_locked
+    def restore_alarm(self, onu_id: int, me_class: int, me_inst: int,
+                      bitmap: int) -> None:
+        """Set an instance's alarm bitmap without any checks.
+
+        This is intended for restoring state, e.g. replaying a journal.
+        """
+        self._set_alarm(onu_id, me_class, me_inst, bitmap)
+
+    # these are used by the Hibernator (with the ONU's lock held); they
+    # don't notify changes, because the ONU's state doesn't change, but
+    # listeners are notified when an ONU is woken up
+    def _detach(self, onu_id: int) -> PMap:
+        instances = self._instances[onu_id]
+        self._instances[onu_id] = None
+        del self._indexes[onu_id]
+        self._sessions.discard(onu_id)
+        return instances
+
+    def _attach(self, onu_id: int, instances: PMap) -> None:
+        self._instances[onu_id] = instances
+        self._indexes[onu_id] = self._template_index().copy() if \
+            instances is self._template() else InstanceIndex(instances.keys())
+        self._tables.discard_onu(onu_id)
+        self._notify('onu_woken', onu_id)
+
+    def _put(self, onu_id: int, me_class: int, me_inst: int,
+             instance: Instance) -> None:
+        # instances are never modified in place; they're always replaced
+        self._instances[onu_id] = self._instances[onu_id].set(
+                (me_class, me_inst), instance)
+        self._notify('instance_changed', onu_id, me_class, me_inst, instance)
+
+    def _remove(self, onu_id: int, me_class: int, me_inst: int) -> None:
+        self._instances[onu_id] = self._instances[onu_id].delete(
+                (me_class, me_inst))
+        self._indexes[onu_id].remove(me_class, me_inst)
+        self._tables.discard(onu_id, me_class, me_inst)
+        self._set_alarm(onu_id, me_class, me_inst, 0)
+        self._notify('instance_changed', onu_id, me_class, me_inst, None)
+
+    def _set_alarm(self, onu_id: int, me_class: int, me_inst: int,
+                   bitmap: int) -> None:
+        if self._alarms.set(onu_id, me_class, me_inst, bitmap) != bitmap:
+            self._notify('alarm_changed', onu_id, me_class, me_inst, bitmap)
+
+    def _discard_alarms(self, onu_id: int, *,
+                        keep: Iterable[Tuple[int, int]] = ()) -> None:
+        keep = set(keep)
+        for me_class, me_inst in self._alarms.alarmed(onu_id):
+            if (me_class, me_inst) not in keep:
+                self._set_alarm(onu_id, me_class, me_inst, 0)
+
+    @property
+    def alarms(self) -> AlarmStore:
+        """Alarm store (alarm state of all ONUs)."""
+        return self._alarms
+
+    @property
+    def sessions(self) -> SessionManager:
+        """Session manager (holds the snapshots used by "next" sequences).
+        """
+        return self._sessions
+
+    @property
+    def images(self) -> ImageStore:
+        """Image store (holds the downloaded software images)."""
+        return self._images
+
+    @property
+    def downloads(self) -> DownloadManager:
+        """Download manager (holds the software image download sessions).
+        """
+        return self._downloads
+
+    @property
+    def locks(self) -> KeyedLocks:
+        """Per-ONU locks (see `KeyedLocks.metrics` for lock statistics).
+
+        All the public methods that take an ``onu_id`` hold that ONU's lock.
+        Hold it explicitly to make a sequence of calls atomic.
+        """
+        return self._locks
 
     @classmethod
     def _mib(cls, me_class: int) -> MIB:
@@ -331,11 +747,45 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
         return mib, instance, reason
 
     def _instance_names(self, onu_id: int, me_class: int) -> str:
-        instances = self._instances.get(onu_id, {})
-        return ', '.join([str(i) for n, i in
-                          sorted(instances.keys(), key=lambda k: k[0]) if
-                          n == me_class])
+        return ', '.join(str(i) for i in self.instances(onu_id, me_class))
+
+    @_onu_locked
+    def instances(self, onu_id: int, me_class: int) -> List[int]:
+        """Return a sorted list of an ONU's instances of a MIB class.
+
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class.
+
+        Returns:
+            List of MIB instances (empty if there are none, or if the ONU id
+            is invalid).
+        """
+        index = self._indexes.get(onu_id, None)
+        return index.instances(me_class) if index else []
+
+    @_onu_locked
+    def supports_extended(self, onu_id: int) -> bool:
+        """Whether an ONU supports extended messages.
 
+        This is determined by its ONU2-G ``omcc_version`` (G.988 9.1.2):
+        0xb0 and above indicate support for both baseline and extended
+        messages. Extended MIB upload and get all alarms requests to ONUs
+        that don't support them are rejected.
+
+        Returns:
+            Whether the ONU supports extended messages (``False`` if the ONU
+            id is invalid).
+        """
+        instances = self._instances.get(onu_id, None)
+        if instances is None:
+            return False
+        instance = instances.get((onu2_g_mib.number, 0), None)
+        value = instance.get('omcc_version', None) if instance else None
+        value = value[0] if isinstance(value, tuple) else value
+        return isinstance(value, int) and value >= 0xb0
+
+    @_onu_locked
     def increment_mib_sync(self, onu_id):
         _, instance, _ = self._instance(onu_id, onu_data_mib.number, 0)
         mib,_,_= self._instance(onu_id,onu_data_mib.number,0)
@@ -348,10 +798,12 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
         mib_data_sync = instance['mib_data_sync'][0]
         # values skip 0, i.e. 1 -> 2, ..., 254 -> 255, 255 -> 1, ...
         mib_data_sync = 1 if mib_data_sync >= 255 else mib_data_sync + 1
-        instance['mib_data_sync'] = (mib_data_sync,)
+        instance = dict(instance, mib_data_sync=(mib_data_sync,))
+        self._put(onu_id, onu_data_mib.number, 0, instance)
         logger.info('updated: MIB %s = %r' % (onu_data_mib, instance))
 
 
+    @_onu_locked
     def create(self, onu_id, me_class, me_inst, values, *, extended=False) -> Results:
         
         """create the specified entities.
@@ -406,8 +858,17 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
                 new_instance[attr_name] = values[attr_name]
             else:
                 new_instance[attr_name] = 0 ## 0 ou default
+
+        if self.check_references:
+            dangling = self._dangling_refs(onu_id, me_class, new_instance)
+            if dangling:
+                logger.error('MIB %s #%d references missing instances: %s' % (
+                    mib, me_inst, self._format_refs(dangling)))
+                results.reason = 0b0011
+                return results
         
-        self._instances[onu_id][(me_class,me_inst)] = new_instance
+        self._put(onu_id, me_class, me_inst, new_instance)
+        self._indexes[onu_id].add(me_class, me_inst)
 
 
         logger.info('test_instance: MIB %s = %r' % (mib,new_instance))
@@ -419,8 +880,9 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
 
         return results
 
+    @_onu_locked
     def set(self, onu_id, me_class, me_inst, attr_mask, values, *,
-            extended=False, check_access=True) -> Results:
+            extended=False, check_access=True, avc=False) -> Results:
         """Set the specified attribute values.
 
         Args:
@@ -430,6 +892,10 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
             attr_mask: attributes to set.
             values: values to which attributes will be set.
             extended: whether an extended message has been requested.
+            check_access: whether to check that the attributes are writable.
+            avc: whether this is an autonomous change (i.e. not requested by
+                the OLT), in which case listeners are notified of changes to
+                attributes that generate AVC notifications.
 
         Returns:
             Results object, including `reason` and `opt_attr_mask`.
@@ -438,11 +904,12 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
                      'attr_mask=%#06x values=%r, extended=%r' % (
                          onu_id, me_class, me_inst, attr_mask, values,
                          extended))
-        updated = False
+        changes = {}
+        changed_mask = 0x0000
         results = Results()
         mib, instance, results.reason = self._instance(onu_id, me_class,
                                                        me_inst)
-            
+
 
         if mib and instance:
             for index, index_mask in util.indices(attr_mask):
@@ -469,27 +936,162 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
                     value = values[name]
                     # XXX there should be utilities for going to and from
                     #     tuples
-                      #if the attribute data is a tuple of TableEntries (assuming all tuple members have the same type)
                     value = value if isinstance(value, tuple) else (
                         value,) if value is not None else None
 
-                    if isinstance(attr._data[0],Table):
-                        if isinstance(instance[name],tuple):
-                            new_value = list(instance[name])
-                            [new_value.append(v) for v in value]
-                            value = tuple(new_value)
-                    
+                    # a table value is a row to add, replace or delete
+                    if attr.is_table:
+                        rows = self._tables.rows(onu_id, me_class, me_inst,
+                                                 attr, instance[name])
+                        row = attr._data[0].join(value)
+                        if len(row) != attr.size:
+                            logger.error('MIB %s #%d %s row must be %d '
+                                         'bytes' % (mib, me_inst, attr,
+                                                    attr.size))
+                            results.reason = 0b0011
+                            continue
+                        rows.apply(row)
+                        value = rows.snapshot()
+
                     if instance[name] != value:
-                        instance[name] = value
-                        updated = True
-                        logger.info(
-                            'MIB %s #%d %s = %r' % (mib, me_inst, attr, value))
-
-        # if the MIB instance was updated, increment the MIB data sync counter
-        if updated:
-            self.increment_mib_sync(onu_id)
+                        changes[name] = value
+                        changed_mask |= index_mask
+                        logger.info('MIB %s #%d %s = %s' % (
+                            mib, me_inst, attr, '%d rows' % len(rows) if
+                            attr.is_table else repr(value)))
+
+        # attributes that would leave dangling references fail
+        if changes and self.check_references and mib._refs:
+            dangling = self._dangling_refs(onu_id, me_class, {
+                **instance, **changes}, changes)
+            if dangling:
+                logger.error('MIB %s #%d references missing instances: %s' % (
+                    mib, me_inst, self._format_refs(dangling)))
+            for ref in mib._refs:
+                if ref._name not in dangling:
+                    continue
+                # the pointer and its selector (if either changed) fail
+                for name in (ref._name, ref._selector):
+                    if name in changes:
+                        mask = mib.attr(name).mask
+                        del changes[name]
+                        changed_mask &= ~mask
+                        results.reason = 0b1001
+                        results.attr_exec_mask |= mask
+
+        # if the MIB instance was updated, replace it and (unless it's an
+        # autonomous change, which is reported via AVCs) increment the MIB
+        # data sync counter
+        if changes:
+            self._put(onu_id, me_class, me_inst, {**instance, **changes})
+            if not avc:
+                self.increment_mib_sync(onu_id)
+            changed_mask &= self._avc_mask(mib) if avc else 0x0000
+            if changed_mask:
+                self._notify('attributes_changed', onu_id, me_class, me_inst,
+                             changed_mask)
         return results
             
+    @_onu_locked
+    def set_table(self, onu_id: int, me_class: int, me_inst: int,
+                  attr_mask: int, rows: List[bytes], *,
+                  extended: bool = False) -> Results:
+        """Add, replace or delete rows of a table attribute.
+
+        All the rows are applied in one batch (see `TableRows.apply`), and
+        the MIB data sync counter is incremented once (if the table changed).
+
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class.
+            me_inst: MIB instance.
+            attr_mask: table attribute to set (exactly one attribute).
+            rows: table rows (each of which is the table's element size).
+            extended: whether an extended message has been requested (set
+                table is only supported for extended messages).
+
+        Returns:
+            Results object, including `reason`.
+        """
+        logger.debug('set_table onu_id=%d, me_class=%d, me_inst=%d, '
+                     'attr_mask=%#06x, rows=%d, extended=%r' % (
+                         onu_id, me_class, me_inst, attr_mask, len(rows),
+                         extended))
+        results = Results()
+        if not extended:
+            logger.error('set table is only supported for extended messages')
+            results.reason = 0b0010
+            return results
+
+        mib, instance, results.reason = self._instance(onu_id, me_class,
+                                                       me_inst)
+        if not mib or not instance:
+            return results
+
+        indices = util.indices(attr_mask)
+        attr = mib.attr(indices[0][0]) if len(indices) == 1 else None
+        if not attr or not attr.is_table or attr.name not in instance:
+            logger.error('MIB %s #%d %#06x is not a single table attribute'
+                         % (mib, me_inst, attr_mask))
+            results.reason = 0b0011
+        elif attr.access not in {RW, RWC}:
+            logger.error('MIB %s #%d %s is not writable' % (mib, me_inst,
+                                                            attr))
+            results.reason = 0b0011
+        elif {len(row) for row in rows} - {attr.size}:
+            logger.error('MIB %s #%d %s rows must be %d bytes' % (
+                mib, me_inst, attr, attr.size))
+            results.reason = 0b0011
+        else:
+            table = self._tables.rows(onu_id, me_class, me_inst, attr,
+                                      instance[attr.name])
+            num_rows = len(table)
+            changed = False
+            for row in rows:
+                changed |= table.apply(row)
+            logger.info('MIB %s #%d %s: %d rows -> %d rows' % (
+                mib, me_inst, attr, num_rows, len(table)))
+            if changed:
+                self._put(onu_id, me_class, me_inst, {
+                    **instance, attr.name: table.snapshot()})
+                self.increment_mib_sync(onu_id)
+        return results
+
+    @_onu_locked
+    def get_current_data(self, onu_id: int, me_class: int, me_inst: int,
+                         attr_mask: int, *, extended: bool = False) -> Results:
+        """Get the specified attributes' current-interval values.
+
+        This is only supported for the PM history data MIBs maintained by the
+        `PmEngine` (if there is one). Other attributes' values are the same
+        as for `get`.
+
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class.
+            me_inst: MIB instance.
+            attr_mask: requested attributes.
+            extended: whether an extended message has been requested.
+
+        Returns:
+            Results object, as for `get`.
+        """
+        if self._pm is None or me_class not in self._pm.me_classes:
+            logger.error('get current data not supported for MIB %d' %
+                         me_class)
+            results = Results()
+            results.reason = 0b0010
+            return results
+
+        results = self.get(onu_id, me_class, me_inst, attr_mask,
+                           extended=extended)
+        current = self._pm.current(onu_id, me_class, me_inst)
+        if current:
+            results.attrs = [(attr, current.get(attr.name, value)) for
+                             attr, value in results.attrs]
+        return results
+
+    @_onu_locked
     def get(self, onu_id: int, me_class: int, me_inst: int, attr_mask: int, *,
             extended: bool = False) -> Results:
         """Get the specified attribute values.
@@ -514,6 +1116,7 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
         
         if mib and instance:
             size = 0
+            table_index = None
             for index, index_mask in util.indices(attr_mask):
                 attr = mib.attr(index)
 
@@ -532,38 +1135,39 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
                     logger.debug('MIB %s #%d %s ignored (not implemented)' % (
                         mib, me_inst, attr))
 
-                inst_size = len(instance[attr.name]) if isinstance(attr._data[0],Table) else mib.attr(attr.name).size
+                # a table's size is returned, and its bytes are latched
+                # for get_next; baseline table requests can't include other
+                # attributes, and only one table can be requested at once
+                is_table = attr.is_table
+                attr_size = TABLE_SIZE_SIZE if is_table else attr.size
+                if is_table and (table_index is not None or (
+                        not extended and attr_mask != index_mask)):
+                    logger.error('MIB %s #%d %s must be requested on its '
+                                 'own' % (mib, me_inst, attr))
+                    results.reason = 0b0011
 
-                if not extended and size > 0 and isinstance(attr._data[0],Table):  #attributes already found and table
-                      
-                      logger.debug('MIB %s #%d %s = %r' % (mib, me_inst, attr,
-                                                         value))
-                      
-                      logger.error('Parameters given exceed expected size. Parameter error!')
-                      results.reason = 0b0011
+                elif not extended and size > 0 and size + attr_size > 25:
+                    logger.error('MIB %s #%d %s exceeds the maximum size' % (
+                        mib, me_inst, attr))
+                    results.reason = 0b0011
 
-                elif not extended and size > 0 and size + inst_size > 25:   #attributes exceed max size
-                      logger.debug('MIB %s #%d %s = %r' % (mib, me_inst, attr,
-                                                         value))
-                     
-                      logger.error('Parameters given exceed expected size. Parameter error!')
-                      results.reason = 0b0011
-
-
-                elif not extended and size == 0 and isinstance(attr._data[0],Table):  #found table
-                    if attr_mask != index_mask:    #table and other attributes
-                      logger.debug('MIB %s #%d %s' % (mib, me_inst, attr))
-                     
-                      logger.error('Parameters given exceed expected size. Parameter error!')
-                      results.reason = 0b0011
-                    else:                           #only table
-                        value = attr.resolve(instance[attr.name])
-                        logger.debug('MIB %s #%d %s = %r' % (mib, me_inst, attr,
-                                                         value))
-                        results.attr_mask |= index_mask
-                        results.attrs += [(attr, inst_size)]
-                        self._snapshots[me_class] = value
-                        self.max_seq_num = math.ceil(inst_size/29)-1
+                elif is_table:
+                    table_index = index
+                    table = attr._data[0].join(
+                        attr.resolve(instance[attr.name]))
+                    chunk_size = EXTENDED_CHUNK_SIZE if extended else \
+                        BASELINE_CHUNK_SIZE
+                    logger.debug('MIB %s #%d %s = %d bytes' % (
+                        mib, me_inst, attr, len(table)))
+                    results.attr_mask |= index_mask
+                    results.attrs += [(attr, len(table))]
+                    self._sessions.open(
+                            onu_id, 'get', me_class, me_inst,
+                            (index, memoryview(table), chunk_size),
+                            extended=extended,
+                            max_seq_num=math.ceil(
+                                    len(table) / chunk_size) - 1)
+                    size += attr_size
 
                 else:
                     value = attr.resolve(instance[attr.name])
@@ -571,57 +1175,69 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
                                                          value))
                     results.attr_mask |= index_mask
                     results.attrs += [(attr, value)]
-                    size += attr.size
-                    
+                    size += attr_size
+
         return results
 
-    def get_next(self, onu_id: int, me_class: int, me_inst: int, attr_mask: int, seq_num: int, *,
-            extended: bool = False) -> Results:
-        """Get the specified attribute values.
+    @_onu_locked
+    def get_next(self, onu_id: int, me_class: int, me_inst: int,
+                 attr_mask: int, seq_num: int, *,
+                 extended: bool = False) -> Results:
+        """Get the next chunk of a table attribute that was previously
+        latched via `Database.get`.
 
         Args:
             onu_id: ONU id.
             me_class: MIB class.
             me_inst: MIB instance.
-            attr_mask: requested attributes.
-            extended: whether an extended message has been requested.
+            attr_mask: requested (table) attribute.
+            seq_num: sequence number, i.e. chunk number.
+            extended: whether an extended message has been requested (if so,
+                the earlier `Database.get` operation MUST have also
+                requested extended messages).
 
         Returns:
-            Results object, including `reason`, `attr_mask` and `attrs`.
+            Results object, including `reason`, `attr_mask` and `attrs`; the
+            attribute value is a ``memoryview`` slice of the latched table.
         """
-        logger.debug('get onu_id=%d, me_class=%d, me_inst=%d, '
-                     'attr_mask=%#06x, extended=%r' % (
-                         onu_id, me_class, me_inst, attr_mask, extended))
+        logger.debug('get_next onu_id=%d, me_class=%d, me_inst=%d, '
+                     'attr_mask=%#06x, seq_num=%d, extended=%r' % (
+                         onu_id, me_class, me_inst, attr_mask, seq_num,
+                         extended))
         results = Results()
         mib, instance, results.reason = self._instance(onu_id, me_class,
                                                         me_inst)
-        
-        if me_class not in self._snapshots.keys():
-            logger.error("Get next with no get")
-            results.reason = 0b100
+        if not mib or not instance:
             return results
 
-        if seq_num > self.max_seq_num:
-            logger.error("Exceeded max number of get nexts")
-            results.reason = 0b0011
+        session = self._sessions.get(onu_id, 'get', me_class, me_inst)
+        if session is None:
+            logger.error('get_next with no get (or the get has timed out)')
+            results.reason = 0b0100
             return results
 
-        index, index_mask = util.indices(attr_mask)[0]
+        index, table, chunk_size = session.data
         attr = mib.attr(index)
-        table = self._snapshots[me_class]
-        results.attr_mask |= index_mask
-
-        if seq_num < self.max_seq_num:
-            value = [instance[attr.name][29*seq_num+idx] for idx in range(29)]
+        if attr_mask != attr.mask:
+            logger.error('get_next of %#06x but get was of %s' % (
+                attr_mask, attr))
+            results.reason = 0b0011
+        elif extended != session.extended:
+            def eb(e): return e and 'extended' or 'baseline'
+            logger.error("table latched for %s, so can't get using %s "
+                         "message" % (eb(session.extended), eb(extended)))
+            results.reason = 0b0011
+        elif seq_num not in range(session.max_seq_num + 1):
+            logger.error('invalid seq_num %d; should be in range 0:%d' % (
+                seq_num, session.max_seq_num))
+            results.reason = 0b0011
         else:
-            value = [0 for idx in range(29)]
-            for idx in range(len(instance[attr.name]) % 29):
-                value[idx] = instance[attr.name][29*self.max_seq_num+idx] 
-        results.attrs += [(attr, value)]
-
+            offset = chunk_size * seq_num
+            results.attr_mask |= attr.mask
+            results.attrs += [(attr, table[offset:offset + chunk_size])]
         return results
 
-
+    @_onu_locked
     def set_alarm(self, me_class: int, me_inst: int, bitmap: bytes,
      onu_id: int, *, extended: bool = False):
     
@@ -631,22 +1247,19 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
         logger.debug("onu_id: %d" % onu_id)
         logger.debug("extended: %r" %extended)
 
-        mib, _, _ = self._instance(onu_id, me_class, me_inst)
+        mib, instance, _ = self._instance(onu_id, me_class, me_inst)
 
         if not mib:
             logger.error("MIB not exist.")
             return None
-       
-        for byte_idx in range(len(mib._alarms)):
-            byte = bitmap[byte_idx]
-            for bit_idx in range(8):
-                tot_idx = 8*byte_idx+bit_idx
-                if tot_idx > len(mib._alarms)-1:
-                    break
-                state = bool(byte & (0x80 >> bit_idx))
-                mib._alarms[tot_idx].set_state(state)
-        
 
+        if instance:
+            # only the MIB's defined alarms are retained
+            value = int.from_bytes(bitmap, 'big') & self._alarm_mask(mib)
+            self._set_alarm(onu_id, me_class, me_inst, value)
+
+
+    @_onu_locked
     def get_all_alarms(self, onu_id, me_class, me_inst, *, extended=False) -> Results:
         """Prepare for get alarms.
 
@@ -665,7 +1278,7 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
                 also request extended messages).
 
         Returns:
-            Results object, including `reason` and `num_alarms_nexts`.
+            Results object, including `reason` and `num_alarm_nexts`.
         """
         logger.debug('upload onu_id=%d, me_class=%d, me_inst=%d, extended=%r'
                      % (onu_id, me_class, me_inst, extended))
@@ -677,30 +1290,40 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
                 logger.error('MIB %s invalid; must be %s' % (
                     mib, onu_data_mib))
                 results.reason = 0b0100
+            elif extended and not self.supports_extended(onu_id):
+                logger.error("ONU %d doesn't support extended messages" %
+                             onu_id)
+                results.reason = 0b0010
             else:
 
                 # XXX some MIBs and attributes should potentially be excluded
-                global mibs_with_alarms
-                mibs_with_alarms.clear()
-                for key, instance in sorted(self._instances[onu_id].items(),
-                                            key=lambda i_: i_[0]):
-                                 
-                    me_class, me_inst = key
-                    mib = self._mib(me_class)
-                    if len(mib._alarms) > 0:
-                        for alarm in mib._alarms:
-                            if alarm.get_state() is True:
-                                mibs_with_alarms.append((me_class,me_inst))
-                                logger.info('me_class %r me_inst %r' % (me_class, me_inst))
-                                break
-            
-                results.num_alarms_nexts = len(mibs_with_alarms)
-                
+                # extended responses contain as many instances as fit
+                # the alarm status is latched (as G.988 requires), so changes
+                # that the OLT receives as alarm notifications aren't also
+                # reported by get all alarms next
+                mibs_with_alarms = []
+                for key in self._alarms.alarmed(onu_id):
+                    bitmap = self._alarms.get(onu_id, *key)
+                    mibs_with_alarms.append(key + (bitmap.to_bytes(
+                            ALARM_BITMAP_SIZE, 'big'),))
+                logger.info('alarmed instances %r' % [
+                    record[:2] for record in mibs_with_alarms])
+                per_next = EXTENDED_ALARM_RECORDS if extended else \
+                    BASELINE_ALARM_RECORDS
+                num_nexts = math.ceil(len(mibs_with_alarms) / per_next)
+                self._sessions.open(onu_id, 'get-all-alarms', me_class,
+                                    me_inst, (mibs_with_alarms, per_next),
+                                    extended=extended,
+                                    max_seq_num=num_nexts - 1)
+                results.num_alarm_nexts = num_nexts
 
         return results
 
-    def get_all_alarms_next(self, onu_id, me_class, me_inst,seq_num, *, extended=False) -> Results:
-        """Get_all_alarms 
+    @_onu_locked
+    def get_all_alarms_next(self, onu_id, me_class, me_inst, seq_num, *,
+                            extended=False) -> Results:
+        """Get the next part of the alarm snapshot that was previously taken
+        via `Database.get_all_alarms`.
 
         Args:
             onu_id: ONU id.
@@ -709,8 +1332,16 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
 
             me_inst: MIB instance (MUST be the ONU Data MIB instance, i.e. 0).
 
+            seq_num: sequence number.
+
+            extended: whether an extended message has been requested (if so,
+                the earlier `Database.get_all_alarms` operation MUST have
+                also requested extended messages).
+
         Returns:
-            Results object, including `reason` and `bit_map_alarms`.
+            Results object, including `reason` and `alarms` (one instance
+            for baseline messages, and up to `EXTENDED_ALARM_RECORDS` for
+            extended messages).
         """
         logger.debug('get_all_alarms_next onu_id=%d, me_class=%d, me_inst=%d, '
                      'seq_num=%r, extended=%r' % (
@@ -726,21 +1357,251 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
                     mib, onu_data_mib))
                 results.reason = 0b0100
             else:
-                me_class_reported = mibs_with_alarms[seq_num][0]
-                me_inst_reported = mibs_with_alarms[seq_num][1]
-                mib_reported,_,_ = self._instance(onu_id, me_class_reported, me_inst_reported)
-                results.me_class_reported = me_class_reported
-                results.me_inst_reported = me_inst_reported
-                bitmap = 0
-                shift = 27*8+7
-                for alarm in mib_reported._alarms:
-                    bitmap |= (alarm.get_state_as_int() << shift)
-                    shift -= 1
-                results.bit_map_alarms = bitmap.to_bytes(28,'big')
+                session = self._sessions.get(onu_id, 'get-all-alarms',
+                                             me_class, me_inst)
+                if session is None:
+                    logger.warning('alarm snapshot was never taken or has '
+                                   'timed out')
+                    return results
+                if extended != session.extended:
+                    def eb(e): return e and 'extended' or 'baseline'
+                    logger.error("alarm snapshot taken for %s, so can't get "
+                                 "using %s message" % (
+                                     eb(session.extended), eb(extended)))
+                    return results
+                if seq_num not in range(session.max_seq_num + 1):
+                    logger.error('invalid seq_num %d; should be in range '
+                                 '0:%d' % (seq_num, session.max_seq_num))
+                    return results
+                mibs_with_alarms, per_next = session.data
+                first = seq_num * per_next
+                results.alarms = mibs_with_alarms[first:first + per_next]
+
+        return results
+
+
+    def _image(self, onu_id: int, me_class: int, me_inst: int) -> \
+            Tuple[Optional[Instance], int]:
+        # software download actions are only valid for software images
+        if me_class != software_image_mib.number:
+            logger.error('MIB %d invalid for software download; must be %s'
+                         % (me_class, software_image_mib))
+            return None, 0b0100
+        _, instance, reason = self._instance(onu_id, me_class, me_inst)
+        return instance, reason
+
+    def _update_image(self, onu_id: int, me_inst: int, **values) -> None:
+        # software image attributes are changed by the ONU as a side-effect
+        # of the download actions, so the MIB data sync counter isn't
+        # incremented
+        _, instance, _ = self._instance(onu_id, software_image_mib.number,
+                                        me_inst)
+        if instance:
+            changes = {name: (value,) for name, value in values.items() if
+                       instance[name] != (value,)}
+            if changes:
+                self._put(onu_id, software_image_mib.number, me_inst,
+                          {**instance, **changes})
+                logger.info('MIB %s #%d updated: %r' % (
+                    software_image_mib, me_inst, changes))
+
+    @staticmethod
+    def _other_image(me_inst: int) -> int:
+        # the low byte of a software image instance distinguishes the two
+        # images of the same ONU or circuit pack
+        return me_inst ^ 0x0001
+
+    @_onu_locked
+    def start_download(self, onu_id: int, me_class: int, me_inst: int,
+                       window_size: int, image_size: int,
+                       me_insts: List[int] = None, *,
+                       extended: bool = False) -> Results:
+        """Start a software image download.
 
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class (must be the software image MIB class).
+            me_inst: MIB instance.
+            window_size: requested window size (sections per window).
+            image_size: image size in bytes.
+            me_insts: instances to which to download; defaults to
+                ``[me_inst]``.
+            extended: whether an extended message has been requested.
+
+        Returns:
+            Results object, including `reason`, `window_size` and
+            `inst_results`.
+        """
+        results = Results()
+        instance, results.reason = self._image(onu_id, me_class, me_inst)
+        if not instance:
+            return results
+
+        # an active image can't be overwritten
+        me_insts = me_insts or [me_inst]
+        for inst in me_insts:
+            _, target, reason = self._instance(onu_id, me_class, inst)
+            if target and target['is_active'] == (True,):
+                logger.error('MIB %s #%d is active; it can\'t be '
+                             'overwritten' % (software_image_mib, inst))
+                reason = 0b0011
+            results.inst_results.append((inst, reason))
+        if image_size == 0 or any(r for _, r in results.inst_results):
+            results.reason = 0b0011
+            return results
+
+        session = self._downloads.start(onu_id, me_inst, me_insts,
+                                        window_size=window_size,
+                                        image_size=image_size)
+        if session is None:
+            results.reason = 0b0110
+            return results
+
+        # the images are invalid (and their old content is discarded) until
+        # the download has been completed
+        results.window_size = session.window_size
+        for inst in me_insts:
+            self._update_image(onu_id, inst, is_valid=False,
+                               is_committed=False, image_hash=b'')
+        return results
+
+    @_onu_locked
+    def download_section(self, onu_id: int, me_class: int, me_inst: int,
+                         section_num: int, data: bytes, *, ack: bool,
+                         extended: bool = False) -> Results:
+        """Store a software image download section.
+
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class (must be the software image MIB class).
+            me_inst: MIB instance.
+            section_num: section number within the window.
+            data: section data.
+            ack: whether an acknowledgement was requested (i.e. whether this
+                is the last section of a window).
+            extended: whether an extended message has been requested.
+
+        Returns:
+            Results object, including `reason` (see
+            `DownloadManager.section`).
+        """
+        # this is called for every section, so the instance is only looked
+        # up (to determine the reason) if there's no download in progress
+        results = Results()
+        session = self._downloads.get(onu_id, me_inst) if me_class == \
+            software_image_mib._number else None
+        if session is not None:
+            results.reason = self._downloads.section(session, section_num,
+                                                     data, ack=ack)
+        else:
+            instance, results.reason = self._image(onu_id, me_class, me_inst)
+            if instance:
+                logger.error('ONU %d MIB %s #%d download was never started '
+                             'or has timed out' % (onu_id, software_image_mib,
+                                                   me_inst))
+                results.reason = 0b0011
+        return results
+
+    @_onu_locked
+    def end_download(self, onu_id: int, me_class: int, me_inst: int,
+                     crc: int, image_size: int, me_insts: List[int] = None,
+                     *, extended: bool = False) -> Results:
+        """End a software image download.
+
+        If the image is complete and its CRC is correct, the images become
+        valid (but not committed or active), and their ``image_hash`` and
+        ``version`` are derived from the image's MD5 hash.
+
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class (must be the software image MIB class).
+            me_inst: MIB instance.
+            crc: image CRC (see `crc32`).
+            image_size: image size in bytes.
+            me_insts: instances; ignored (the instances were specified when
+                the download was started).
+            extended: whether an extended message has been requested.
+
+        Returns:
+            Results object, including `reason` and `inst_results`.
+        """
+        results = Results()
+        instance, results.reason = self._image(onu_id, me_class, me_inst)
+        if not instance:
+            return results
+
+        session = self._downloads.get(onu_id, me_inst)
+        if session is None:
+            logger.error('ONU %d MIB %s #%d download was never started or '
+                         'has timed out' % (onu_id, software_image_mib,
+                                            me_inst))
+            results.reason = 0b0011
+            return results
+
+        image_hash = session.md5.digest()
+        results.reason = self._downloads.end(session, crc, image_size)
+        for inst in session.me_insts:
+            if results.reason == 0b0000:
+                self._update_image(onu_id, inst, is_valid=True,
+                                   image_hash=image_hash,
+                                   version=image_hash.hex()[:14])
+            results.inst_results.append((inst, results.reason))
+
+        # the instances now hold references to the stored image
+        if results.reason == 0b0000:
+            self._images.release(image_hash)
         return results
 
+    @_onu_locked
+    def activate_image(self, onu_id: int, me_class: int, me_inst: int, *,
+                       extended: bool = False) -> Results:
+        """Activate a software image, deactivating the other image.
 
+        The ONU isn't rebooted.
+
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class (must be the software image MIB class).
+            me_inst: MIB instance.
+            extended: whether an extended message has been requested.
+
+        Returns:
+            Results object, including `reason`.
+        """
+        return self._select_image(onu_id, me_class, me_inst, 'is_active')
+
+    @_onu_locked
+    def commit_image(self, onu_id: int, me_class: int, me_inst: int, *,
+                     extended: bool = False) -> Results:
+        """Commit a software image, uncommitting the other image.
+
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class (must be the software image MIB class).
+            me_inst: MIB instance.
+            extended: whether an extended message has been requested.
+
+        Returns:
+            Results object, including `reason`.
+        """
+        return self._select_image(onu_id, me_class, me_inst, 'is_committed')
+
+    def _select_image(self, onu_id: int, me_class: int, me_inst: int,
+                      name: str) -> Results:
+        results = Results()
+        instance, results.reason = self._image(onu_id, me_class, me_inst)
+        if instance:
+            if instance['is_valid'] != (True,):
+                logger.error('MIB %s #%d is invalid; %s can\'t be set' % (
+                    software_image_mib, me_inst, name))
+                results.reason = 0b0011
+            else:
+                self._update_image(onu_id, self._other_image(me_inst),
+                                   **{name: False})
+                self._update_image(onu_id, me_inst, **{name: True})
+        return results
+
+    @_onu_locked
     def upload(self, onu_id, me_class, me_inst, *, extended=False) -> Results:
         """Prepare for uploading MIBs.
 
@@ -771,60 +1632,24 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
                 logger.error('MIB %s invalid for upload; must be %s' % (
                     mib, onu_data_mib))
                 results.reason = 0b0100
+            elif extended and not self.supports_extended(onu_id):
+                logger.error("ONU %d doesn't support extended messages" %
+                             onu_id)
+                results.reason = 0b0010
             else:
                 # XXX some MIBs and attributes should potentially be excluded
-                max_contents_length = 1966 if extended else 32
-                chunk_header_length = 8 if extended else 6
-                bodies = []
-                body = [0, []]
-                for key, instance in sorted(self._instances[onu_id].items(),
-                                            key=lambda i_: i_[0]):
-                    logger.info('key %r instance %r' % (key, instance))
-                    me_class, me_inst = key
-                    mib = self._mib(me_class)
-                    assert mib is not None
-                    chunk = [chunk_header_length, [], me_class, me_inst]
-                    for attr in (a for a in mib.attrs if
-                                 a.number > 0 and a.name in instance):
-                        if body[0] + chunk[0] + attr.size > \
-                                max_contents_length:
-                            if chunk[0] > chunk_header_length:
-                                body[0] += chunk[0]
-                                body[1] += [chunk]
-                            bodies += [body]
-                            body = [0, []]
-                            chunk = [chunk_header_length, [], me_class,
-                                     me_inst]
-                        chunk[0] += attr.size
-                        # noinspection PyUnresolvedReferences
-                        value = attr.resolve(instance[attr.name])
-                        # shallow copy (tuple) values
-                        # XXX this assumes it's already a tuple
-                        chunk[1] += [(attr, value[:])]
-                    if chunk[1]:
-                        body[0] += chunk[0]
-                        body[1] += [chunk]
-                if body:
-                    bodies += [body]
-
-                # report
-                for i, body in enumerate(bodies):
-                    logger.info('body %d (%d)' % (i, body[0]))
-                    for j, chunk in enumerate(body[1]):
-                        logger.info('  chunk %d (%d) %s #%d' % (
-                            j, chunk[0], self._mib(chunk[2]), chunk[3]))
-                        for attr_value in chunk[1]:
-                            attr, value = attr_value
-                            logger.info('    attr %s %r (%d)' % (
-                                attr, value, attr.size))
-
-                # latch (OK to do after sampling because we're single-threaded)
+                # latch the current version; only the layout is calculated
+                # now (the values are fetched by upload_next)
                 # XXX do we latch unconditionally? I think so
-                latch_time = int(time.time())
-                self._snapshots[onu_id] = (extended, latch_time, bodies)
-                results.num_upload_nexts = len(bodies)
+                version = self._instances[onu_id]
+                layout = self._upload_layout(version, extended)
+                self._sessions.open(onu_id, 'mib-upload', me_class, me_inst,
+                                    (version, layout), extended=extended,
+                                    max_seq_num=len(layout) - 1)
+                results.num_upload_nexts = len(layout)
         return results
 
+    @_onu_locked
     def upload_next(self, onu_id, me_class, me_inst, seq_num, *,
                     extended=False) -> Results:
         """Upload the next part of a snapshot that was previously saved via
@@ -856,49 +1681,206 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
                     mib, onu_data_mib))
                 results.reason = 0b0100
             else:
-                now = int(time.time())
-                snapshot_extended, latch_time, bodies = self._snapshots[onu_id]
-                if now - latch_time > 60:
+                session = self._sessions.get(onu_id, 'mib-upload', me_class,
+                                             me_inst)
+                if session is None:
                     logger.warning('snapshot was never taken or has timed out')
                     results.reason = 0b0001
-                elif extended != snapshot_extended:
+                elif extended != session.extended:
                     def eb(e): return e and 'extended' or 'baseline'
                     logger.error("snapshot calculated for %s, so can't get "
                                  "using %s message" % (
-                                     eb(snapshot_extended), eb(extended)))
-                elif seq_num not in range(len(bodies)):
+                                     eb(session.extended), eb(extended)))
+                elif seq_num not in range(session.max_seq_num + 1):
                     logger.error('invalid seq_num %d; should be in range '
-                                 '0:%d' % (seq_num, len(bodies) - 1))
+                                 '0:%d' % (seq_num, session.max_seq_num))
                     results.reason = 0b0001
                 else:
-                    results.body = bodies[seq_num]
+                    version, layout = session.data
+                    results.body = self._upload_body(version, layout[seq_num])
         return results
 
-    def delete(self, onu_id, me_class, me_inst, *, extended=False) -> Results:
-        """Delete the specified mib
-        Arguments:
-            onu_id
-            mib_class
-            mib_instance
-            Message -> extended
-        """
-        logger.debug('delete onu_id=%d, mib_class=%d, mib_instance=%d, '
-                                   'message=%r' % (
-                                              onu_id, me_class, me_inst, extended))
-        res=Results()
-        mib, instance, res.reason = self._instance(onu_id, me_class,me_inst)
+    def _upload_layout(self, version: PMap, extended: bool) -> list:
+        # returns a list of bodies, each of which is [size, chunks], where
+        # each chunk is [size, attrs, me_class, me_inst]
+        max_contents_length = 1966 if extended else 32
+        chunk_header_length = 8 if extended else 6
+        bodies = []
+        body = [0, []]
+        for key, instance in sorted(version.items(), key=lambda i_: i_[0]):
+            me_class, me_inst = key
+            mib = self._mib(me_class)
+            assert mib is not None
+            chunk = [chunk_header_length, [], me_class, me_inst]
+            # table attributes aren't uploaded (they're read via get_next)
+            for attr in (a for a in mib.attrs if
+                         a.number > 0 and a.name in instance and
+                         not a.is_table):
+                if body[0] + chunk[0] + attr.size > max_contents_length:
+                    if chunk[0] > chunk_header_length:
+                        body[0] += chunk[0]
+                        body[1] += [chunk]
+                    bodies += [body]
+                    body = [0, []]
+                    chunk = [chunk_header_length, [], me_class, me_inst]
+                chunk[0] += attr.size
+                chunk[1] += [attr]
+            if chunk[1]:
+                body[0] += chunk[0]
+                body[1] += [chunk]
+        if body:
+            bodies += [body]
+        logger.info('upload layout: %d bodies' % len(bodies))
+        return bodies
+
+    @staticmethod
+    def _upload_body(version: PMap, body: list) -> list:
+        # fill in a layout body's values from the latched version
+        size, chunks = body
+        filled = []
+        for chunk_size, attrs, me_class, me_inst in chunks:
+            instance = version[(me_class, me_inst)]
+            # noinspection PyUnresolvedReferences
+            values = [(attr, attr.resolve(instance[attr.name])) for attr in
+                      attrs]
+            filled += [[chunk_size, values, me_class, me_inst]]
+        return [size, filled]
+
+    @_onu_locked
+    def delete(self, onu_id, me_class, me_inst, *, extended=False,
+               cascade=False) -> Results:
+        """Delete the specified MIB instance.
+
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class.
+            me_inst: MIB instance.
+            extended: whether an extended message has been requested.
+            cascade: whether also to delete the (deletable) instances that
+                reference it, directly or indirectly (see `Ref`).
 
+        Returns:
+            Results object, including `reason`.
+        """
+        logger.debug('delete onu_id=%d, me_class=%d, me_inst=%d, '
+                     'extended=%r, cascade=%r' % (onu_id, me_class, me_inst,
+                                                  extended, cascade))
+        results = Results()
+        mib, instance, results.reason = self._instance(onu_id, me_class,
+                                                       me_inst)
         if mib and instance:
-            if mib != mibs.get(me_class, None):
-                logger.error('mib %s is not valid for delete, must be %s' % (
-                    mib, mibs.get(me_class, None)))
-                ##error result
-                res.reason = 0b0100
+            if delete_action not in mib.actions:
+                logger.error('MIB %s #%d can\'t be deleted' % (mib, me_inst))
+                results.reason = 0b0010
+            elif cascade:
+                keys = self._cascade(onu_id, (me_class, me_inst))
+                for key in reversed(keys):
+                    self._remove(onu_id, *key)
+                logger.info('deleted: MIB %s #%d and %d referrers' % (
+                    mib, me_inst, len(keys) - 1))
+                self.increment_mib_sync(onu_id)
+            elif self.check_references and self._references.referrers(
+                    onu_id, me_class, me_inst):
+                logger.error('MIB %s #%d is referenced by %s' % (
+                    mib, me_inst, self._format_referrers(
+                        self._references.referrers(onu_id, me_class,
+                                                   me_inst))))
+                results.reason = 0b0011
             else:
-                self._reload(onu_id)
+                self._remove(onu_id, me_class, me_inst)
+                logger.info('deleted: MIB %s #%d' % (mib, me_inst))
+                self.increment_mib_sync(onu_id)
+        return results
+
+    def _cascade(self, onu_id: int, key: Key) -> List[Key]:
+        # returns the instance and its deletable (direct and indirect)
+        # referrers, with each instance before its referrers
+        keys = [key]
+        seen = {key}
+        for target in keys:
+            for me_class, me_inst, _ in self._references.referrers(onu_id,
+                                                                   *target):
+                referrer = (me_class, me_inst)
+                if referrer not in seen and delete_action in \
+                        self._mib(me_class).actions:
+                    seen.add(referrer)
+                    keys.append(referrer)
+        return keys
+
+    @_onu_locked
+    def references(self, onu_id: int, me_class: int, me_inst: int) -> \
+            Dict[str, Key]:
+        """Return the references made by an instance (see `Ref`).
 
-        return res
+        Returns:
+            Referenced ``(me_class, me_inst)`` keys (which needn't exist),
+            keyed by attribute name.
+        """
+        return self._references.references(onu_id, me_class, me_inst)
+
+    @_onu_locked
+    def referrers(self, onu_id: int, me_class: int, me_inst: int) -> \
+            List[Referrer]:
+        """Return the references to an instance (see `Ref`).
+
+        Returns:
+            Sorted list of referencing ``(me_class, me_inst, attr_name)``
+            tuples.
+        """
+        return self._references.referrers(onu_id, me_class, me_inst)
+
+    @_onu_locked
+    def dangling(self, onu_id: int) -> List[Tuple[int, int, str, Key]]:
+        """Return an ONU's dangling references, i.e. references to
+        instances that don't exist.
+
+        Returns:
+            Sorted list of ``(me_class, me_inst, attr_name, target)`` tuples,
+            where ``target`` is the missing ``(me_class, me_inst)``; empty
+            if the ONU id is invalid.
+        """
+        index = self._indexes.get(onu_id, None)
+        return self._references.dangling(onu_id, index) if index is not \
+            None else []
 
+    @_onu_locked
+    def service_paths(self, onu_id: int) -> List[Path]:
+        """Return an ONU's service paths (see `ServiceGraph.paths`).
+
+        Returns:
+            Sorted list of paths, each a tuple of ``(me_class, me_inst)``
+            keys from a UNI towards the PON; empty if the ONU id is
+            invalid.
+        """
+        index = self._indexes.get(onu_id, None)
+        return self._service_graph.paths(onu_id, index) if index is not \
+            None else []
+
+    def _dangling_refs(self, onu_id: int, me_class: int, instance: Instance,
+                       names: Iterable[str] = None) -> Dict[str, Key]:
+        # returns an instance's dangling references, keyed by attribute name;
+        # if names are specified, only references whose attributes or
+        # selectors are in names are checked
+        index = self._indexes[onu_id]
+        refs = instance_refs(me_class, instance)
+        if names is not None:
+            names = set(names)
+            refs = {ref._name: refs[ref._name] for ref in
+                    self._mib(me_class)._refs if ref._name in refs and (
+                        ref._name in names or ref._selector in names)}
+        return {name: target for name, target in refs.items() if
+                target not in index}
+
+    @staticmethod
+    def _format_refs(refs: Dict[str, Key]) -> str:
+        return ', '.join('%s -> %d #%d' % ((name,) + target) for name, target
+                         in sorted(refs.items()))
+
+    @staticmethod
+    def _format_referrers(referrers: List[Referrer]) -> str:
+        return ', '.join('%d #%d %s' % referrer for referrer in referrers)
+
+    @_onu_locked
     def reset(self, onu_id, me_class, me_inst, *, extended=False) -> Results:
         """Reset the specified MIB instance.
 
@@ -925,9 +1907,165 @@ id range, e.g. ``range(10)`` means ONU ids 0, 1,
                 self._reload(onu_id)
         return results
 
+    @_onu_locked
+    def reboot(self, onu_id: int, me_class: int, me_inst: int,
+               flags: int = 0, *, extended: bool = False) -> Results:
+        """Reboot the ONU.
+
+        The ONU goes offline, and its MIB is reset when it has booted (see
+        `Rebooter`). If there's no rebooter, its MIB is reset at once.
+
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class (must support the reboot action, e.g. ONU-G).
+            me_inst: MIB instance.
+            flags: reboot conditions; 0-2 (there are no voice calls, so all
+                of these reboot the ONU).
+            extended: whether an extended message has been requested.
+
+        Returns:
+            Results object, including `reason`.
+        """
+        logger.debug('reboot onu_id=%d, me_class=%d, me_inst=%d, flags=%d, '
+                     'extended=%r' % (onu_id, me_class, me_inst, flags,
+                                      extended))
+        results = Results()
+        mib, instance, results.reason = self._instance(onu_id, me_class,
+                                                       me_inst)
+        if mib and instance:
+            if reboot_action not in mib.actions:
+                logger.error('MIB %s #%d can\'t be rebooted' % (mib, me_inst))
+                results.reason = 0b0010
+            elif flags > 2:
+                logger.error('invalid reboot flags %d' % flags)
+                results.reason = 0b0011
+            elif self._rebooter is not None:
+                self._rebooter.reboot([onu_id])
+            else:
+                self._reload(onu_id)
+        return results
+
+    @_onu_locked
+    def sync_time(self, onu_id: int, me_class: int, me_inst: int,
+                  time_of_day: Optional[Tuple[int, ...]] = None, *,
+                  extended: bool = False) -> Results:
+        """Synchronize the ONU's time, i.e. restart its PM intervals (see
+        `PmEngine.synchronize`).
+
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class (must support the synchronize time action,
+                e.g. ONU-G).
+            me_inst: MIB instance.
+            time_of_day: ``(year, month, day, hour, minute, second)`` tuple,
+                or ``None``; it's logged but not otherwise used.
+            extended: whether an extended message has been requested.
+
+        Returns:
+            Results object, including `reason`.
+        """
+        logger.debug('sync_time onu_id=%d, me_class=%d, me_inst=%d, '
+                     'time_of_day=%r, extended=%r' % (
+                         onu_id, me_class, me_inst, time_of_day, extended))
+        results = Results()
+        mib, instance, results.reason = self._instance(onu_id, me_class,
+                                                       me_inst)
+        if mib and instance:
+            if sync_time_action not in mib.actions:
+                logger.error('MIB %s #%d can\'t synchronize time' % (
+                    mib, me_inst))
+                results.reason = 0b0010
+            elif self._pm is not None:
+                self._pm.synchronize(onu_id)
+        return results
+
+    @_onu_locked
+    def test(self, onu_id: int, me_class: int, me_inst: int, select: int, *,
+             tci: int = 0, extended: bool = False) -> Results:
+        """Start a test; its result is sent later (see `TestEngine`).
+
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class (must support the test action, e.g. ONU-G or
+                ANI-G).
+            me_inst: MIB instance.
+            select: test selection; only the self test is supported.
+            tci: the test command's TCI (the test result is sent with it).
+            extended: whether an extended message has been requested.
+
+        Returns:
+            Results object, including `reason`.
+        """
+        logger.debug('test onu_id=%d, me_class=%d, me_inst=%d, select=%d, '
+                     'tci=%d, extended=%r' % (onu_id, me_class, me_inst,
+                                              select, tci, extended))
+        results = Results()
+        mib, instance, results.reason = self._instance(onu_id, me_class,
+                                                       me_inst)
+        if mib and instance:
+            if test_action not in mib.actions or self._tester is None:
+                logger.error('MIB %s #%d can\'t be tested' % (mib, me_inst))
+                results.reason = 0b0010
+            elif select != SELF_TEST:
+                logger.error('MIB %s #%d test %d isn\'t supported' % (
+                    mib, me_inst, select))
+                results.reason = 0b0010
+            elif not self._tester.start(onu_id, me_class, me_inst, tci=tci,
+                                        extended=extended):
+                results.reason = 0b0110
+        return results
+
+    # per-MIB mask of the defined alarms
+    __alarm_masks: Dict[int, int] = {}
+
+    @classmethod
+    def _alarm_mask(cls, mib: MIB) -> int:
+        mask = cls.__alarm_masks.get(mib.number, None)
+        if mask is None:
+            mask = 0
+            for alarm in mib._alarms:
+                mask |= alarm_mask(alarm.number)
+            cls.__alarm_masks[mib.number] = mask
+        return mask
+
+    # per-MIB mask of the attributes that generate AVCs
+    __avc_masks: Dict[int, int] = {}
+
+    @classmethod
+    def _avc_mask(cls, mib: MIB) -> int:
+        mask = cls.__avc_masks.get(mib.number, None)
+        if mask is None:
+            mask = 0x0000
+            for change in mib._changes:
+                attr = mib.attr(change.number)
+                if attr:
+                    mask |= attr.mask
+            cls.__avc_masks[mib.number] = mask
+        return mask
+
+    # MIB instance template (compiled from the specs on first use)
+    __template: Optional[PMap] = None
+
+    __template_index: Optional[InstanceIndex] = None
+
     @classmethod
-    def __reload(cls) -> Dict[Tuple[int, int], Instance]:
-        """Reload all MIB instances from the specs.
+    def _template(cls) -> PMap:
+        if cls.__template is None:
+            cls.__template = PMap(cls.__compile())
+            cls.__template_index = InstanceIndex(cls.__template.keys())
+        return cls.__template
+
+    @classmethod
+    def _template_index(cls) -> InstanceIndex:
+        cls._template()
+        return cls.__template_index
+
+    @classmethod
+    def __compile(cls) -> Dict[Tuple[int, int], Instance]:
+        """Compile all MIB instances from the specs.
+
+        This validates the specs, so it's done only once. The returned
+        instances mustn't be modified.
         """
         insts = {}
         for mib, insts_spec in specs:
@@ -0,0 +1,230 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test (diagnostics) simulation.
+
+The `TestEngine` runs the tests that are started by `test <test_action>`
+commands (via `Database.test`). The command is acknowledged at once; the test
+completes after a configurable delay, and its result is then sent as a `test
+result <test_result_action>` notification with the command's TCI:
+
+* ONU-G: the self test always passes
+* ANI-G: optical levels are taken from the instance's
+  ``optical_signal_level`` and ``transmit_optical_level`` attributes (or
+  typical values if they're zero), with a little random noise, and the
+  supply voltage, laser bias current and temperature are typical values
+
+Tests are run by one-shot `Scheduler` timers, whose timer wheel makes starting
+(and cancelling) a test O(1), so many thousands of tests can be outstanding.
+Each instance can run only one test at a time (further tests are refused as
+busy), and there's an overall limit too. An ONU's outstanding tests are
+cancelled when its MIB is reset (e.g. when it reboots).
+
+Example::
+
+    engine = TestEngine(database, scheduler, endpoint.send,
+                        cterm_name='cterm', destination=lambda: address,
+                        delay=2.0)
+    database.test(onu_id, 263, 1, SELF_TEST, tci=tci)
+"""
+
+import collections
+import logging
+import random
+import threading
+
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from .actions.test import MEASUREMENT_TYPES, SELF_TEST_RESULTS, TestResult, \
+    _signed
+from .database import Database, DatabaseListener
+from .message import Message
+from .mibs.onu_g import onu_g_mib
+from .pmap import PMap
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+#: Typical ANI-G measurements, in their units (see `MEASUREMENT_TYPES`).
+TYPICAL_MEASUREMENTS = {
+    'power_feed_voltage': 3.3,
+    'received_optical_power': -20.0,
+    'mean_optical_launch_power': 2.0,
+    'laser_bias_current': 10e-3,
+    'temperature': 45.0
+}
+
+# ANI-G measurements that are taken from attributes (which have the same
+# resolution), keyed by attribute name
+_ATTR_MEASUREMENTS = {
+    'optical_signal_level': 'received_optical_power',
+    'transmit_optical_level': 'mean_optical_launch_power'
+}
+
+# optical level noise in dB
+_NOISE = 0.1
+
+
+class TestEngine(DatabaseListener):
+    """Test engine class.
+    """
+
+    def __init__(self, database: Database, scheduler,
+                 send: Callable[[Message, Any], None], *, cterm_name: str,
+                 destination: Callable[[], Optional[Hashable]] = None,
+                 delay: float = 1.0, max_tests: int = 100000,
+                 seed: Optional[int] = None):
+        """Test engine constructor.
+
+        Args:
+            database: the `Database`; the engine attaches itself to it, so
+                it runs the tests started by `Database.test`.
+
+            scheduler: the `Scheduler` that completes the tests.
+
+            send: function that sends a message to a destination, e.g.
+                `Endpoint.send`.
+
+            cterm_name: channel termination name for the messages.
+
+            destination: function that returns the current destination, as
+                for `AvcEngine`.
+
+            delay: time (in seconds) that each test takes.
+
+            max_tests: maximum number of outstanding tests (across all ONUs).
+
+            seed: random number generator seed, for reproducible results.
+        """
+        assert database._tester is None, 'database already has a test engine'
+        self._database = database
+        self._scheduler = scheduler
+        self._send = send
+        self._cterm_name = cterm_name
+        self._destination = destination
+        self._delay = delay
+        self._max_tests = max_tests
+        self._random = random.Random(seed)
+
+        # outstanding tests' timers, keyed by ONU id and then by
+        # (me_class, me_inst)
+        self._tests: Dict[int, Dict[Tuple[int, int], Any]] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+        #: Counters: ``started``, ``busy`` (tests refused), ``cancelled``,
+        #: ``sent`` and ``dropped``.
+        self.metrics = collections.Counter()
+
+        database.add_listener(self)
+        database._tester = self
+
+    def close(self) -> None:
+        """Stop running tests; outstanding tests are cancelled."""
+        with self._lock:
+            tests, self._tests, self._count = self._tests, {}, 0
+        for timers in tests.values():
+            for timer in timers.values():
+                self._scheduler.cancel(timer)
+        self._database.remove_listener(self)
+        self._database._tester = None
+
+    def start(self, onu_id: int, me_class: int, me_inst: int, *,
+              tci: int = 0, extended: bool = False) -> bool:
+        """Start a test.
+
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class (ONU-G or ANI-G).
+            me_inst: MIB instance.
+            tci: TCI with which to send the test result.
+            extended: whether to send an extended test result.
+
+        Returns:
+            Whether the test was started (if not, the instance is already
+            being tested or there are too many outstanding tests).
+        """
+        key = (me_class, me_inst)
+        with self._lock:
+            tests = self._tests.setdefault(onu_id, {})
+            if key in tests or self._count >= self._max_tests:
+                self.metrics['busy'] += 1
+                return False
+            tests[key] = self._scheduler.call_later(
+                    self._delay, self._complete, onu_id, me_class, me_inst,
+                    tci, extended)
+            self._count += 1
+            self.metrics['started'] += 1
+        return True
+
+    def _complete(self, onu_id: int, me_class: int, me_inst: int, tci: int,
+                  extended: bool) -> None:
+        with self._lock:
+            tests = self._tests.get(onu_id, {})
+            if tests.pop((me_class, me_inst), None) is None:
+                return
+            self._count -= 1
+
+        snapshot = self._database.snapshot(onu_id)
+        instance = snapshot and snapshot.get((me_class, me_inst), None)
+        if instance is None:
+            return
+        if me_class == onu_g_mib.number:
+            results = {'self_test': SELF_TEST_RESULTS.index('passed')}
+        else:
+            results = {'measurements': self._measurements(instance)}
+        message = TestResult(cterm_name=self._cterm_name, onu_id=onu_id,
+                             extended=extended, tci=tci, me_class=me_class,
+                             me_inst=me_inst, **results)
+        destination = self._destination() if self._destination else None
+        if self._destination and destination is None:
+            self.metrics['dropped'] += 1
+            return
+        logger.info('sending test result %r' % message)
+        try:
+            if destination is None:
+                self._send(message)
+            else:
+                self._send(message, destination)
+        except OSError as e:
+            logger.error('failed to send test result %r: %s' % (message, e))
+            self.metrics['dropped'] += 1
+            return
+        self.metrics['sent'] += 1
+
+    def _measurements(self, instance) -> List[Tuple[int, int]]:
+        values = dict(TYPICAL_MEASUREMENTS)
+        for attr_name, name in _ATTR_MEASUREMENTS.items():
+            value = instance.get(attr_name, (0,))
+            value = value[0] if isinstance(value, tuple) else value
+            if value:
+                values[name] = _signed(value) * MEASUREMENT_TYPES[name][1]
+            values[name] += self._random.uniform(-_NOISE, _NOISE)
+        return [(type_, round(values[name] / resolution)) for
+                name, (type_, resolution, _) in MEASUREMENT_TYPES.items()]
+
+    def onu_reloaded(self, onu_id: int, instances: PMap) -> None:
+        with self._lock:
+            tests = self._tests.pop(onu_id, {})
+            self._count -= len(tests)
+        for timer in tests.values():
+            self._scheduler.cancel(timer)
+        self.metrics['cancelled'] += len(tests)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __str__(self):
+        return '%s(delay=%r, tests=%d)' % (self.__class__.__name__,
+                                           self._delay, self._count)
+
+    __repr__ = __str__
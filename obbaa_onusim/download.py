@@ -0,0 +1,472 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Software image download sessions.
+
+A software image download (G.988 I.3) consists of a `start download
+<start_download_action>` command, a sequence of windows of `download section
+<download_section_action>` commands, and an `end download
+<end_download_action>` command. The OLT requests an acknowledgement for the
+last section of each window; the window is acknowledged only if all its
+sections have been received, otherwise the OLT has to send the whole window
+again.
+
+Each download is held in a `DownloadSession`, keyed by ``(onu_id,
+me_inst)``, that's managed by a `DownloadManager`. Sections are copied
+straight into place in the session's window buffer. When a window has been
+completed, its data is added to the image's CRC and MD5 hash, so nothing has
+to be done at the end of the download except compare the CRC.
+
+Completed windows are then added to a staging buffer that's memory-mapped
+(anonymous memory by default, or a temporary file). Staging buffers are
+shared: they're indexed by the MD5 hash of each of their prefixes (at window
+boundaries), so as soon as a download's prefix matches another download's,
+the two downloads share the same staging buffer, and a download only gets
+its own buffer (a copy of the shared prefix) if its content diverges. When
+many ONUs download the same image, there's therefore only one copy of it,
+and when the download completes, it's added to the `ImageStore` (without
+being copied).
+
+The CRC is the CRC-32 of ITU-T I.363.5 (as used by AAL5 and bzip2), i.e.
+`crc32`. This isn't the same as ``zlib.crc32`` but is calculated via it.
+
+The `Database` owns a `DownloadManager` and uses it to implement its
+download methods, e.g. `Database.download_section`.
+
+Example::
+
+    downloads = DownloadManager(ImageStore(), max_sessions=1000)
+    session = downloads.start(onu_id, me_inst, window_size=32,
+                              image_size=len(image), section_size=31)
+    reason = downloads.section(session, section_num, data, ack=True)
+    reason = downloads.end(session, crc32(image), len(image))
+    ...
+    downloads.images.release(digest)
+"""
+
+import collections
+import hashlib
+import logging
+import mmap
+import tempfile
+import threading
+import time
+import zlib
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .image_store import ImageStore
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+# byte values with their bits reversed
+_REVERSED = bytes(int('{:08b}'.format(i)[::-1], 2) for i in range(256))
+
+
+def _reverse32(value: int) -> int:
+    return int('{:032b}'.format(value)[::-1], 2)
+
+
+def crc32(data: bytes, crc: int = 0) -> int:
+    """Calculate the ITU-T I.363.5 CRC-32 of some data.
+
+    This is the unreflected version of the ``zlib.crc32`` CRC, so it can be
+    calculated by reflecting the data and the result.
+
+    Args:
+        data: the data.
+        crc: CRC of any preceding data (for incremental calculation).
+
+    Returns:
+        The CRC.
+    """
+    return _reverse32(zlib.crc32(bytes(data).translate(_REVERSED),
+                                 _reverse32(crc)))
+
+
+class _Staging:
+    # a (possibly shared) staging buffer; it's only ever appended to, so
+    # downloads that share its prefix aren't disturbed
+
+    __slots__ = ('buffer', 'length', 'refs', 'prefixes', 'stored', '_file')
+
+    def __init__(self, size: int, staging_dir: Optional[str]):
+        # anonymous memory unless there's a staging directory (the
+        # temporary file is deleted when it's closed)
+        self._file = None
+        if staging_dir is None:
+            self.buffer = mmap.mmap(-1, size)
+        else:
+            self._file = tempfile.TemporaryFile(dir=staging_dir)
+            self._file.truncate(size)
+            self.buffer = mmap.mmap(self._file.fileno(), size)
+        self.length = 0
+        self.refs = 0
+        self.prefixes: List[Tuple[int, int, bytes]] = []
+        self.stored = False
+
+    def close(self) -> None:
+        # the buffer is still in use if it was added to the image store
+        if not self.stored:
+            self.buffer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+class DownloadSession:
+    """Download session class (created by `DownloadManager.start`).
+    """
+
+    __slots__ = ('key', 'me_insts', 'window_size', 'image_size',
+                 'section_size', 'window', 'received', 'crc', 'md5',
+                 'last', '_buffer', '_staging')
+
+    def __init__(self, key: Tuple[int, int], me_insts: List[int], *,
+                 window_size: int, image_size: int,
+                 section_size: Optional[int], now: float):
+        #: Session key, i.e. ``(onu_id, me_inst)``.
+        self.key = key
+
+        #: Software image instances to which the image will be written.
+        self.me_insts = me_insts
+
+        #: Number of sections per window.
+        self.window_size = window_size
+
+        #: Image size in bytes.
+        self.image_size = image_size
+
+        #: Section size in bytes (the last section might be shorter); if
+        #: ``None``, it's the size of the first section.
+        self.section_size = section_size
+
+        #: Current window number.
+        self.window = 0
+
+        #: Bitmap of the current window's received sections.
+        self.received = 0
+
+        #: CRC and MD5 hash of the completed windows.
+        self.crc = 0
+        self.md5 = hashlib.md5()
+
+        #: Time of the last activity (per the manager's clock).
+        self.last = now
+
+        # the current window's sections (allocated by the first section)
+        self._buffer: Optional[bytearray] = None
+
+        # the staging buffer (allocated by the first window)
+        self._staging: Optional[_Staging] = None
+
+    @property
+    def offset(self) -> int:
+        """Offset of the current window, i.e. the number of bytes that have
+        been received and acknowledged."""
+        return min(self.window * self.window_size * self.section_size,
+                   self.image_size) if self.window else 0
+
+    def __str__(self):
+        return '%s(key=%r, window_size=%d, image_size=%d, offset=%d)' % (
+            self.__class__.__name__, self.key, self.window_size,
+            self.image_size, self.offset)
+
+    __repr__ = __str__
+
+
+class DownloadManager:
+    """Download manager class.
+    """
+
+    def __init__(self, images: ImageStore, *, max_sessions: int = 1000,
+                 max_window_size: int = 256, timeout: float = 300.0,
+                 staging_dir: Optional[str] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """Download manager constructor.
+
+        Args:
+            images: the `ImageStore` to which completed images are added.
+
+            max_sessions: maximum number of concurrent downloads (across all
+                ONUs); sessions that have timed out are discarded to make
+                room for new ones.
+
+            max_window_size: maximum window size; the OLT's requested window
+                size is reduced to this if necessary.
+
+            timeout: inactivity timeout in seconds.
+
+            staging_dir: directory for the staging files; if ``None``,
+                anonymous memory is used.
+
+            clock: clock function; defaults to ``time.monotonic``.
+        """
+        assert 1 <= max_window_size <= 256
+        self._images = images
+        self._max_sessions = max_sessions
+        self._max_window_size = max_window_size
+        self._timeout = timeout
+        self._staging_dir = staging_dir
+        self._clock = clock
+        self._sessions: Dict[Tuple[int, int], DownloadSession] = {}
+        # staging buffers, keyed by (image_size, length, MD5 hash) of each
+        # of their prefixes
+        self._prefixes: Dict[Tuple[int, int, bytes], _Staging] = {}
+        self._lock = threading.Lock()
+
+        #: Counters: ``started``, ``completed``, ``failed``, ``expired``,
+        #: ``sections``, ``windows``, ``retransmissions`` (windows that
+        #: had missing sections), ``staged`` (staging buffers that were
+        #: allocated) and ``shared`` (windows that were already staged).
+        self.metrics = collections.Counter()
+
+    @property
+    def images(self) -> ImageStore:
+        """Image store."""
+        return self._images
+
+    def start(self, onu_id: int, me_inst: int, me_insts: List[int] = None,
+              *, window_size: int, image_size: int,
+              section_size: Optional[int] = None) -> \
+            Optional[DownloadSession]:
+        """Start a download, replacing any existing download with the same
+        key.
+
+        Args:
+            onu_id: ONU id.
+            me_inst: software image instance (the command's instance).
+            me_insts: software image instances to which the image will be
+                written; defaults to ``[me_inst]``.
+            window_size: requested window size.
+            image_size: image size in bytes.
+            section_size: section size in bytes; if ``None``, it's the size
+                of the first section.
+
+        Returns:
+            The new session (whose window size might be smaller than was
+            requested), or ``None`` if there are too many downloads.
+        """
+        assert image_size > 0
+        key = (onu_id, me_inst)
+        now = self._clock()
+        with self._lock:
+            old = self._sessions.get(key, None)
+            if old is not None:
+                self._discard(old)
+            if len(self._sessions) >= self._max_sessions:
+                self._expire(now)
+            if len(self._sessions) >= self._max_sessions:
+                logger.error('too many downloads; ONU %d image %d rejected'
+                             % (onu_id, me_inst))
+                return None
+            session = self._sessions[key] = DownloadSession(
+                    key, me_insts or [me_inst],
+                    window_size=min(window_size, self._max_window_size),
+                    image_size=image_size, section_size=section_size,
+                    now=now)
+            self.metrics['started'] += 1
+        logger.info('started %s' % session)
+        return session
+
+    def get(self, onu_id: int, me_inst: int) -> Optional[DownloadSession]:
+        """Get a download session.
+
+        Returns:
+            The session, or ``None`` if there's no such download (or it has
+            timed out).
+        """
+        now = self._clock()
+        with self._lock:
+            session = self._sessions.get((onu_id, me_inst), None)
+            if session is not None and now - session.last > self._timeout:
+                self._discard(session)
+                self.metrics['expired'] += 1
+                session = None
+            if session is not None:
+                session.last = now
+        return session
+
+    def section(self, session: DownloadSession, section_num: int,
+                data: bytes, *, ack: bool) -> int:
+        """Store a download section.
+
+        Args:
+            session: the download session.
+            section_num: section number within the current window.
+            data: section data (padding beyond the image size is ignored).
+            ack: whether an acknowledgement was requested, i.e. whether this
+                is the last section of the window.
+
+        Returns:
+            Result (reason) code: ``0b0000`` (success), ``0b0001`` (sections
+            are missing, so the window has to be sent again) or ``0b0011``
+            (invalid section).
+        """
+        self.metrics['sections'] += 1
+        if session.section_size is None:
+            session.section_size = len(data)
+        start = section_num * session.section_size
+        if section_num >= session.window_size or session.offset + start >= \
+                session.image_size or len(data) > session.section_size:
+            logger.error('%s: invalid section %d (%d bytes)' % (
+                session, section_num, len(data)))
+            return 0b0011
+
+        # copy the data into place in the window buffer
+        if session._buffer is None:
+            session._buffer = bytearray(session.window_size *
+                                        session.section_size)
+        end = min(start + len(data), session.image_size - session.offset)
+        session._buffer[start:end] = memoryview(data)[:end - start]
+        session.received |= 1 << section_num
+        if not ack:
+            return 0b0000
+
+        # at the end of the window, check that all sections were received
+        # (only the image's last window can be short)
+        if section_num != session.window_size - 1 and \
+                session.offset + end != session.image_size:
+            logger.error('%s: window %d ended early at section %d' % (
+                session, session.window, section_num))
+            session.received = 0
+            return 0b0011
+        if session.received != (1 << (section_num + 1)) - 1:
+            logger.warning('%s: window %d sections missing (received %#x)'
+                           % (session, session.window, session.received))
+            session.received = 0
+            self.metrics['retransmissions'] += 1
+            return 0b0001
+        self._stage(session, memoryview(session._buffer)[:end])
+        session.window += 1
+        session.received = 0
+        self.metrics['windows'] += 1
+        return 0b0000
+
+    def _stage(self, session: DownloadSession, window: memoryview) -> None:
+        # add the window to the CRC and hash, and to the staging buffer
+        session.crc = crc32(window, session.crc)
+        session.md5.update(window)
+        offset = session.offset
+        length = offset + len(window)
+        prefix = (session.image_size, length, session.md5.digest())
+        with self._lock:
+            staging = self._prefixes.get(prefix, None)
+            if staging is not None:
+                # another download has already staged this prefix
+                if staging is not session._staging:
+                    self._attach(session, staging)
+                self.metrics['shared'] += 1
+                return
+
+            # if there's no staging buffer yet, or the content has diverged
+            # from that of the staging buffer, create a new one
+            staging = session._staging
+            if staging is None or staging.length != offset:
+                staging = _Staging(session.image_size, self._staging_dir)
+                if session._staging is not None:
+                    staging.buffer[:offset] = \
+                        session._staging.buffer[:offset]
+                self._attach(session, staging)
+                self.metrics['staged'] += 1
+            staging.buffer[offset:length] = window
+            staging.length = length
+            staging.prefixes.append(prefix)
+            self._prefixes[prefix] = staging
+
+    def _attach(self, session: DownloadSession,
+                staging: Optional[_Staging]) -> None:
+        old = session._staging
+        session._staging = staging
+        if staging is not None:
+            staging.refs += 1
+        if old is not None:
+            old.refs -= 1
+            if old.refs == 0:
+                for prefix in old.prefixes:
+                    if self._prefixes.get(prefix, None) is old:
+                        del self._prefixes[prefix]
+                old.close()
+
+    def end(self, session: DownloadSession, crc: int,
+            image_size: int) -> int:
+        """End a download, closing its session.
+
+        If the download succeeded, the image is added to the image store,
+        and the caller must release the reference that this acquires (once
+        the software image instances have been updated).
+
+        Args:
+            session: the download session.
+            crc: the image's CRC, as calculated by the OLT.
+            image_size: image size in bytes.
+
+        Returns:
+            Result (reason) code: ``0b0000`` (success) or ``0b0001`` (the
+            image is incomplete or its CRC or size is incorrect).
+        """
+        valid = image_size == session.image_size and session.offset == \
+            image_size and crc == session.crc
+        if not valid:
+            logger.error('%s: download failed (CRC %#010x, expected %#010x)'
+                         % (session, crc, session.crc))
+        else:
+            staging = session._staging
+            staging.stored = True
+            self._images.add(session.md5.digest(), staging.buffer)
+        self.metrics['completed' if valid else 'failed'] += 1
+        with self._lock:
+            self._discard(session)
+        return 0b0000 if valid else 0b0001
+
+    def discard(self, onu_id: int) -> None:
+        """Discard all of an ONU's downloads (e.g. when it's reset)."""
+        with self._lock:
+            for session in [s for k, s in self._sessions.items() if
+                            k[0] == onu_id]:
+                self._discard(session)
+
+    def _discard(self, session: DownloadSession) -> None:
+        if self._sessions.get(session.key, None) is session:
+            del self._sessions[session.key]
+        self._attach(session, None)
+        session._buffer = None
+
+    def _expire(self, now: float) -> None:
+        for session in [s for s in self._sessions.values() if
+                        now - s.last > self._timeout]:
+            self._discard(session)
+            self.metrics['expired'] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Return download statistics.
+
+        Returns:
+            Dictionary with ``sessions``, ``staging_buffers`` and
+            ``staging_bytes`` items.
+        """
+        with self._lock:
+            stagings = {id(s): s for s in self._prefixes.values()}
+            return {'sessions': len(self._sessions),
+                    'staging_buffers': len(stagings),
+                    'staging_bytes': sum(s.length for s in
+                                         stagings.values())}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __str__(self):
+        return '%s(sessions=%d, max_sessions=%d)' % (
+            self.__class__.__name__, len(self._sessions), self._max_sessions)
+
+    __repr__ = __str__
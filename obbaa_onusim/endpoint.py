@@ -134,6 +134,9 @@ class Endpoint:
             Messages that don't have an expected ``cterm_name`` or
             ``onu_id`` will be ignored and no response will be sent. This is
             probably wrong.
+
+            Messages for ONUs that are offline (see `Rebooter`) are also
+            ignored.
         """
         # XXX this assumes TR-451!
         if message.cterm_name != self._cterm_name:
@@ -146,6 +149,10 @@ class Endpoint:
                                        self._onu_id_range.start,
                                        self._onu_id_range.stop - 1))
             response = None
+        elif not self._database.is_online(message.onu_id):
+            logger.debug('ONU id %d is offline (rebooting); message ignored'
+                         % message.onu_id)
+            response = None
         else:
             response = message.process(self)
         return response
@@ -158,6 +165,13 @@ class Endpoint:
             address: Address to send the message to. Defaults to the server
                 address.
         """
+        # offline ONUs don't send notifications (responses are sent, because
+        # a reboot command's response is sent after the ONU has gone offline)
+        if self._is_server and not message.type_ak and \
+                not self._database.is_online(message.onu_id):
+            logger.debug('ONU id %d is offline (rebooting); message dropped'
+                         % message.onu_id)
+            return
         address = address or self._server_address
         buffer = message.encode(tr451=self._tr451)
         self._sock.sendto(buffer, address)
@@ -172,6 +186,10 @@ class Endpoint:
         if mibs.get(me_class) == None:
             logger.error("Can't send the message. MIB is need to be created")
             return None
+        if not self._database.is_online(message.onu_id):
+            logger.debug('ONU id %d is offline (rebooting); message dropped'
+                         % message.onu_id)
+            return None
         self._sock.sendto(buffer, address)
         logger.debug('sent %r bytes to %r' % (len(buffer), address))
         self._dump_buffer(buffer)
@@ -0,0 +1,282 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Idle-ONU hibernation.
+
+Most simulated ONUs are idle most of the time. A `Hibernator` serializes and
+compresses the MIB instances of ONUs that haven't been accessed for a while,
+and discards their in-memory instances and index. A hibernating ONU is woken
+up transparently (by `Database`) the next time it's accessed via OMCI or
+REST.
+
+Hibernation is triggered by `Hibernator.sweep`, which should be called
+periodically (e.g. by a `Scheduler`). It hibernates:
+
+* ONUs that have been idle for longer than ``idle_time``, and
+* if there are more than ``high_water`` awake ONUs, the least recently used
+  ones, until there are only ``low_water`` awake ONUs.
+
+The number of awake ONUs is used as a proxy for memory usage, because their
+actual memory usage can't be measured cheaply. Alarm state (which is already
+compact) stays in the `AlarmStore`; sessions are discarded. Saving a
+checkpoint doesn't wake hibernating ONUs up (see `Hibernator.records`).
+
+ONUs whose instances are all still shared with the compiled specs (e.g. ones
+that have just been reset) cost nothing to keep awake, so they're only marked
+as hibernating; no data is stored for them.
+
+Example::
+
+    hibernator = Hibernator(database, idle_time=600, high_water=5000,
+                            scheduler=scheduler)
+    ...
+    hibernator.stats()  # {'awake': ..., 'hibernating': ..., ...}
+"""
+
+import collections
+import io
+import logging
+import lzma
+import threading
+import time
+import zlib
+
+from typing import Any, Callable, Dict, Optional
+
+from .checkpoint import _Reader, _Writer, _read_instance, _write_instance
+from .database import Database
+from .pmap import PMap
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+#: Valid compression methods.
+COMPRESSIONS = ('zlib', 'lzma')
+
+# hibernated data for ONUs whose instances are the template
+_TEMPLATE = b''
+
+
+class Hibernator:
+    """Hibernator class.
+    """
+
+    def __init__(self, database: Database, *, idle_time: float = 600.0,
+                 high_water: Optional[int] = None,
+                 low_water: Optional[int] = None,
+                 compression: str = 'zlib', scheduler=None,
+                 sweep_interval: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """Hibernator constructor.
+
+        Args:
+            database: the `Database`; the hibernator is attached to it.
+
+            idle_time: idle time (in seconds) after which an ONU is
+                hibernated.
+
+            high_water: maximum number of awake ONUs; if ``None``, there's
+                no limit.
+
+            low_water: number of awake ONUs to which to reduce when the
+                maximum is exceeded; defaults to 90% of ``high_water``.
+
+            compression: compression method (``'zlib'`` or ``'lzma'``).
+
+            scheduler: the `Scheduler` (if any) on which to run `sweep`
+                periodically.
+
+            sweep_interval: sweep interval in seconds (if a scheduler is
+                specified).
+
+            clock: clock function; defaults to ``time.monotonic``.
+        """
+        assert compression in COMPRESSIONS, 'invalid compression %r' % \
+                                            compression
+        assert database._hibernator is None, 'database already has a ' \
+                                             'hibernator'
+        self._database = database
+        self._idle_time = idle_time
+        self._high_water = high_water
+        self._low_water = low_water if low_water is not None else \
+            high_water * 9 // 10 if high_water is not None else None
+        self._compression = compression
+        self._clock = clock
+
+        # awake ONUs in least recently used order, with last access times
+        now = clock()
+        self._awake: 'collections.OrderedDict[int, float]' = \
+            collections.OrderedDict((onu_id, now) for onu_id in
+                                    database.onu_ids)
+        self._hibernating: Dict[int, bytes] = {}
+        self._template_records: Optional[bytes] = None
+        self._lock = threading.Lock()
+
+        #: Counters: ``hits`` (accesses to awake ONUs), ``misses`` (accesses
+        #: to hibernating ONUs, which wake them up) and ``hibernated``.
+        self.metrics = collections.Counter()
+
+        database._hibernator = self
+        self._task = None if scheduler is None else \
+            scheduler.call_every(sweep_interval, self.sweep)
+        self._scheduler = scheduler
+
+    def touch(self, onu_id: int) -> None:
+        """Note that an ONU has been accessed, waking it up if necessary.
+
+        This is called by `Database`, with the ONU's lock held.
+        """
+        with self._lock:
+            data = self._hibernating.pop(onu_id, None)
+            awake = onu_id in self._awake
+            if awake or data is not None:
+                self._awake[onu_id] = self._clock()
+                self._awake.move_to_end(onu_id)
+        if awake:
+            self.metrics['hits'] += 1
+        elif data is not None:
+            self.metrics['misses'] += 1
+            self._database._attach(onu_id, self._decode(data))
+            logger.info('ONU %d woken up' % onu_id)
+
+    def is_hibernating(self, onu_id: int) -> bool:
+        """Whether an ONU is hibernating (this doesn't wake it up)."""
+        with self._lock:
+            return onu_id in self._hibernating
+
+    def sweep(self) -> int:
+        """Hibernate idle ONUs, and least recently used ONUs if there are too
+        many awake ONUs.
+
+        Returns:
+            Number of ONUs that were hibernated.
+        """
+        now = self._clock()
+        with self._lock:
+            candidates = [onu_id for onu_id, last in self._awake.items() if
+                          now - last >= self._idle_time]
+            excess = len(self._awake) - len(candidates) - self._low_water \
+                if self._high_water is not None and \
+                len(self._awake) > self._high_water else 0
+            if excess > 0:
+                idle = set(candidates)
+                candidates += [onu_id for onu_id in self._awake if onu_id not
+                               in idle][:excess]
+
+        count = sum(self.hibernate(onu_id) for onu_id in candidates)
+        if count:
+            logger.info('hibernated %d ONUs; %d awake, %d hibernating' % (
+                count, len(self._awake), len(self._hibernating)))
+        return count
+
+    def hibernate(self, onu_id: int) -> bool:
+        """Hibernate an ONU.
+
+        Returns:
+            Whether the ONU was hibernated (it might already be hibernating).
+        """
+        with self._database.locks(onu_id):
+            with self._lock:
+                if onu_id not in self._awake:
+                    return False
+                del self._awake[onu_id]
+            data = self._encode(self._database._detach(onu_id))
+            with self._lock:
+                self._hibernating[onu_id] = data
+            self.metrics['hibernated'] += 1
+            return True
+
+    def records(self, onu_id: int) -> Optional[bytes]:
+        """Return a hibernating ONU's serialized instances without waking it
+        up.
+
+        The data is in the checkpoint format, i.e. the number of instances
+        followed by their records, so `checkpoint.save <save>` can write it
+        as it is. This should be called with the ONU's lock held.
+
+        Returns:
+            The serialized instances, or ``None`` if the ONU isn't
+            hibernating.
+        """
+        with self._lock:
+            data = self._hibernating.get(onu_id, None)
+        if data is None:
+            return None
+        if data == _TEMPLATE:
+            if self._template_records is None:
+                self._template_records = self._serialize(
+                        self._database._template())
+            return self._template_records
+        return self._decompress(data)
+
+    def _serialize(self, instances: PMap) -> bytes:
+        template = self._database._template()
+        buffer = io.BytesIO()
+        writer = _Writer(buffer)
+        writer.uint(len(instances))
+        for (me_class, me_inst), instance in instances.items():
+            _write_instance(writer, me_class, me_inst, instance, template)
+        writer.flush()
+        return buffer.getvalue()
+
+    def _decompress(self, data: bytes) -> bytes:
+        return lzma.decompress(data) if self._compression == 'lzma' else \
+            zlib.decompress(data)
+
+    def _encode(self, instances: PMap) -> bytes:
+        if instances is self._database._template():
+            return _TEMPLATE
+        data = self._serialize(instances)
+        return lzma.compress(data) if self._compression == 'lzma' else \
+            zlib.compress(data)
+
+    def _decode(self, data: bytes) -> PMap:
+        template = self._database._template()
+        if data == _TEMPLATE:
+            return template
+        reader = _Reader(io.BytesIO(self._decompress(data)))
+        return PMap(_read_instance(reader, template) for _ in
+                    range(reader.uint()))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hibernation statistics.
+
+        Returns:
+            Dictionary with ``awake``, ``hibernating``, ``hibernated_bytes``
+            (total compressed size), ``hits``, ``misses`` and ``hibernated``
+            items.
+        """
+        with self._lock:
+            stats = {'awake': len(self._awake),
+                     'hibernating': len(self._hibernating),
+                     'hibernated_bytes': sum(len(d) for d in
+                                             self._hibernating.values())}
+        stats.update({name: self.metrics[name] for name in (
+            'hits', 'misses', 'hibernated')})
+        return stats
+
+    def close(self) -> None:
+        """Wake up all hibernating ONUs and detach from the database."""
+        if self._task is not None:
+            self._scheduler.cancel(self._task)
+        for onu_id in list(self._hibernating.keys()):
+            with self._database.locks(onu_id):
+                self.touch(onu_id)
+        self._database._hibernator = None
+
+    def __str__(self):
+        return '%s(idle_time=%r, high_water=%r, awake=%d, hibernating=%d)' \
+               % (self.__class__.__name__, self._idle_time, self._high_water,
+                  len(self._awake), len(self._hibernating))
+
+    __repr__ = __str__
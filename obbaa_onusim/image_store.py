@@ -0,0 +1,144 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Content-addressed software image store.
+
+When many ONUs download the same software image, only one copy of it is
+kept. The `ImageStore` holds images keyed by their MD5 hashes (which are
+also the software image instances' ``image_hash`` values), either in memory
+or as files in a directory.
+
+Images are reference-counted. The `Database` counts a reference for each
+software image instance whose ``image_hash`` is the image's hash, and a
+completed download holds a temporary reference until the instances have
+been updated. An image is discarded when its last reference is released.
+
+Example::
+
+    images = ImageStore()
+    images.add(digest, data)  # the caller now holds a reference
+    images.acquire(digest)
+    images.release(digest)
+    images.release(digest)    # the image is discarded
+"""
+
+import collections
+import logging
+import os
+import threading
+
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+
+class ImageStore:
+    """Image store class.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        """Image store constructor.
+
+        Args:
+            directory: directory in which to store the images (as files named
+                by their hex hashes); if ``None``, they're stored in memory.
+        """
+        self._directory = directory
+        self._refs: Dict[bytes, int] = collections.Counter()
+        self._images: Dict[bytes, Any] = {}
+        self._lock = threading.Lock()
+
+        #: Counters: ``added``, ``deduplicated`` and ``discarded``.
+        self.metrics = collections.Counter()
+
+    def add(self, digest: bytes, data: Any) -> bool:
+        """Add an image (if it isn't already present) and acquire a reference
+        to it.
+
+        Args:
+            digest: the image's MD5 hash.
+            data: the image (a bytes-like object; in-memory stores keep a
+                reference to it, so it mustn't be modified).
+
+        Returns:
+            Whether the image was added, i.e. wasn't already present.
+        """
+        with self._lock:
+            self._refs[digest] += 1
+            if digest in self._images:
+                self.metrics['deduplicated'] += 1
+                return False
+            if self._directory is None:
+                self._images[digest] = data
+            else:
+                path = os.path.join(self._directory, digest.hex())
+                with open(path, 'wb') as fd:
+                    fd.write(data)
+                self._images[digest] = path
+            self.metrics['added'] += 1
+        logger.info('added image %s (%d bytes)' % (digest.hex(), len(data)))
+        return True
+
+    def acquire(self, digest: bytes) -> None:
+        """Acquire a reference to an image.
+
+        The image needn't be present (its references are counted anyway).
+        """
+        with self._lock:
+            self._refs[digest] += 1
+
+    def release(self, digest: bytes) -> None:
+        """Release a reference to an image, discarding it if it was the last
+        reference."""
+        with self._lock:
+            self._refs[digest] -= 1
+            if self._refs[digest] > 0:
+                return
+            del self._refs[digest]
+            image = self._images.pop(digest, None)
+        if image is not None:
+            if self._directory is not None:
+                os.remove(image)
+            self.metrics['discarded'] += 1
+            logger.info('discarded image %s' % digest.hex())
+
+    def get(self, digest: bytes) -> Optional[bytes]:
+        """Get an image.
+
+        Returns:
+            The image, or ``None`` if it isn't present.
+        """
+        with self._lock:
+            image = self._images.get(digest, None)
+        if image is None or self._directory is None:
+            return image
+        with open(image, 'rb') as fd:
+            return fd.read()
+
+    def refs(self, digest: bytes) -> int:
+        """Return the number of references to an image."""
+        with self._lock:
+            return self._refs.get(digest, 0)
+
+    def __contains__(self, digest: bytes) -> bool:
+        return digest in self._images
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def __str__(self):
+        return '%s(directory=%r, images=%d)' % (
+            self.__class__.__name__, self._directory, len(self._images))
+
+    __repr__ = __str__
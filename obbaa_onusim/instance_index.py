@@ -0,0 +1,82 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Secondary indexes over an ONU's MIB instances.
+
+The `Database` keeps one `InstanceIndex` per ONU and updates it incrementally
+as instances are created, deleted and reset. Queries therefore cost work
+proportional to the size of the result, not to the size of the MIB.
+
+Note:
+    Alarmed instances are tracked by the `AlarmStore`.
+"""
+
+import logging
+
+from typing import Dict, Iterable, List, Set, Tuple
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+Key = Tuple[int, int]
+
+
+class InstanceIndex:
+    """Per-ONU instance index.
+    """
+
+    def __init__(self, keys: Iterable[Key] = ()):
+        """Instance index constructor.
+
+        Args:
+            keys: initial ``(me_class, me_inst)`` keys.
+        """
+        self._by_class: Dict[int, Set[int]] = {}
+        for me_class, me_inst in keys:
+            self.add(me_class, me_inst)
+
+    def copy(self) -> 'InstanceIndex':
+        """Return a copy of this index."""
+        index = InstanceIndex()
+        index._by_class = {me_class: set(insts) for me_class, insts in
+                           self._by_class.items()}
+        return index
+
+    def add(self, me_class: int, me_inst: int) -> None:
+        """Add an instance."""
+        self._by_class.setdefault(me_class, set()).add(me_inst)
+
+    def remove(self, me_class: int, me_inst: int) -> None:
+        """Remove an instance (it's OK if it's not present)."""
+        insts = self._by_class.get(me_class, None)
+        if insts is not None:
+            insts.discard(me_inst)
+            if not insts:
+                del self._by_class[me_class]
+
+    def instances(self, me_class: int) -> List[int]:
+        """Return a sorted list of a class's instances."""
+        return sorted(self._by_class.get(me_class, ()))
+
+    def __contains__(self, key: Key) -> bool:
+        me_class, me_inst = key
+        return me_inst in self._by_class.get(me_class, ())
+
+    def __len__(self) -> int:
+        return sum(len(insts) for insts in self._by_class.values())
+
+    def __str__(self):
+        return '%s(classes=%d, instances=%d)' % (
+            self.__class__.__name__, len(self._by_class), len(self))
+
+    __repr__ = __str__
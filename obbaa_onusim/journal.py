@@ -0,0 +1,423 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Database change journal.
+
+A `Journal` is a `DatabaseListener` that appends a binary record to a file
+for every change to the database, i.e. every instance creation, update and
+deletion, every MIB reset (or rollback) and every alarm change. The records
+describe the effects (e.g. the new instance), not the requests, so applying
+them is idempotent. Each record has a sequence number and a timestamp, so
+the journal is also an audit trail.
+
+Records are queued by the listener methods (which are called on the OMCI and
+REST paths, with the ONU's lock held) and are encoded and written by a
+background thread, which writes all the records that are queued at once
+("group commit"). The file is fsync'ed after each batch (``fsync='batch'``)
+or at most every ``interval`` seconds (``fsync='periodic'``).
+
+`replay` rebuilds the database from a checkpoint (if any) plus the journal
+records that are newer than the checkpoint.
+
+Example::
+
+    journal = Journal(server.database, 'onusim.journal')
+    ...
+    checkpoint.save(server.database, 'onusim.ckpt', journal=journal)
+    ...
+    journal.close()
+
+File format: ``MAGIC``, then the format version as a 2-byte big-endian
+integer, then the records. Each record is its length (LEB128 varint), then
+the record itself, then its CRC-32 (4-byte big-endian integer). A record is
+the sequence number, the time in milliseconds since the epoch, the record
+kind and the ONU id (all varints), then kind-specific data that uses the
+`checkpoint` encoding. A torn record at the end of the file (e.g. after a
+crash) is discarded.
+"""
+
+import collections
+import io
+import logging
+import os
+import threading
+import time
+import zlib
+
+from typing import Any, Dict, Iterator, NamedTuple, Optional
+
+from . import checkpoint
+from .checkpoint import _Reader, _Writer, _read_instance, _write_instance
+from .database import Database, DatabaseListener, Instance
+from .pmap import PMap
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+MAGIC = b'ONUSIMJL'
+
+#: Journal format version.
+VERSION = 1
+
+#: Valid ``fsync`` policies.
+FSYNC_POLICIES = ('batch', 'periodic')
+
+# record kinds
+_PUT = 1
+_DELETE = 2
+_RELOAD = 3
+_ALARM = 4
+
+_kind_names = {_PUT: 'put', _DELETE: 'delete', _RELOAD: 'reload',
+               _ALARM: 'alarm'}
+
+
+class JournalRecord(NamedTuple):
+    """Journal record (as returned by `read`)."""
+
+    #: Sequence number.
+    seq: int
+
+    #: Time (seconds since the epoch).
+    time: float
+
+    #: Kind: ``'put'``, ``'delete'``, ``'reload'`` or ``'alarm'``.
+    kind: str
+
+    #: ONU id.
+    onu_id: int
+
+    #: MIB class (``None`` for ``'reload'``).
+    me_class: Optional[int]
+
+    #: MIB instance (``None`` for ``'reload'``).
+    me_inst: Optional[int]
+
+    #: Instance (``'put'``), instances (``'reload'``), alarm bitmap
+    #: (``'alarm'``) or ``None`` (``'delete'``).
+    value: Any
+
+
+class Journal(DatabaseListener):
+    """Journal class.
+    """
+
+    def __init__(self, database: Database, path: str, *,
+                 fsync: str = 'batch', interval: float = 1.0):
+        """Journal constructor.
+
+        Opens (or creates) the journal file for appending, starts the
+        background writer thread and adds the journal as a database listener.
+
+        Args:
+            database: the `Database`.
+            path: journal file path.
+            fsync: ``'batch'`` (fsync after each batch of records) or
+                ``'periodic'`` (fsync at most every ``interval`` seconds).
+            interval: fsync interval in seconds (``fsync='periodic'``).
+
+        Raises:
+            ValueError: The file exists but isn't a journal.
+        """
+        assert fsync in FSYNC_POLICIES, 'invalid fsync policy %r' % fsync
+        self._database = database
+        self._template = database._template()
+        self._path = path
+        self._fsync = fsync
+        self._interval = interval
+
+        self._seq = self._recover(path, self._template)
+        self._written_seq = self._seq
+        self._fd = open(path, 'ab')
+        if self._fd.tell() == 0:
+            self._fd.write(MAGIC + VERSION.to_bytes(2, 'big'))
+            self._fd.flush()
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+
+        self._pending = collections.deque()
+        self._cond = threading.Condition()
+        self._closing = False
+
+        #: Counters: ``records``, ``batches``, ``bytes`` and ``fsyncs``.
+        self.metrics = collections.Counter()
+
+        self._thread = threading.Thread(target=self._run, name='journal',
+                                        daemon=True)
+        self._thread.start()
+        database.add_listener(self)
+        logger.info('journal %s opened at seq %d' % (path, self._seq))
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the most recent record (0 if there are none).
+        """
+        return self._seq
+
+    @staticmethod
+    def _recover(path: str, template: PMap) -> int:
+        # find the last valid record's sequence number, truncating any torn
+        # record at the end of the file
+        if not os.path.isfile(path) or os.path.getsize(path) == 0:
+            return 0
+        seq, end = 0, len(MAGIC) + 2
+        for record, end in _records(path, template):
+            seq = record.seq
+        size = os.path.getsize(path)
+        if end < size:
+            logger.warning('journal %s: discarding %d bytes of torn record' %
+                           (path, size - end))
+            with open(path, 'r+b') as fd:
+                fd.truncate(end)
+        return seq
+
+    # listener methods (called with the ONU's lock held)
+
+    def instance_changed(self, onu_id: int, me_class: int, me_inst: int,
+                         instance: Optional[Instance]) -> None:
+        if instance is None:
+            self._append(_DELETE, onu_id, me_class, me_inst, None)
+        else:
+            self._append(_PUT, onu_id, me_class, me_inst, instance)
+
+    def onu_reloaded(self, onu_id: int, instances: PMap) -> None:
+        self._append(_RELOAD, onu_id, None, None, instances)
+
+    def alarm_changed(self, onu_id: int, me_class: int, me_inst: int,
+                      bitmap: int) -> None:
+        self._append(_ALARM, onu_id, me_class, me_inst, bitmap)
+
+    def _append(self, kind: int, onu_id: int, me_class: Optional[int],
+                me_inst: Optional[int], value: Any) -> None:
+        # the values are immutable, so encoding can be deferred
+        with self._cond:
+            if self._closing:
+                logger.error('journal %s is closed; record lost' % self._path)
+                return
+            self._seq += 1
+            self._pending.append((self._seq, time.time(), kind, onu_id,
+                                  me_class, me_inst, value))
+            self._cond.notify()
+
+    def _encode(self, record: tuple) -> bytes:
+        seq, time_, kind, onu_id, me_class, me_inst, value = record
+        body = io.BytesIO()
+        writer = _Writer(body)
+        writer.uint(seq)
+        writer.uint(int(time_ * 1000))
+        writer.uint(kind)
+        writer.uint(onu_id)
+        if kind == _PUT:
+            _write_instance(writer, me_class, me_inst, value, self._template)
+        elif kind == _DELETE:
+            writer.uint(me_class)
+            writer.uint(me_inst)
+        elif kind == _RELOAD:
+            writer.uint(len(value))
+            for (me_class_, me_inst_), instance in value.items():
+                _write_instance(writer, me_class_, me_inst_, instance,
+                                self._template)
+        elif kind == _ALARM:
+            writer.uint(me_class)
+            writer.uint(me_inst)
+            writer.uint(value)
+        writer.flush()
+        body = body.getvalue()
+
+        frame = io.BytesIO()
+        writer = _Writer(frame)
+        writer.blob(body)
+        writer.bytes(zlib.crc32(body).to_bytes(4, 'big'))
+        writer.flush()
+        return frame.getvalue()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    timeout = self._interval if self._fsync == 'periodic' \
+                        and self._unsynced else None
+                    if not self._cond.wait(timeout):
+                        break
+                batch = list(self._pending)
+                self._pending.clear()
+                closing = self._closing
+
+            try:
+                if batch:
+                    data = b''.join(self._encode(r) for r in batch)
+                    self._fd.write(data)
+                    self._fd.flush()
+                    self._unsynced = True
+                    self.metrics['records'] += len(batch)
+                    self.metrics['batches'] += 1
+                    self.metrics['bytes'] += len(data)
+                now = time.monotonic()
+                if self._unsynced and (
+                        closing or self._fsync == 'batch' or
+                        now - self._last_fsync >= self._interval):
+                    os.fsync(self._fd.fileno())
+                    self._unsynced = False
+                    self._last_fsync = now
+                    self.metrics['fsyncs'] += 1
+            except OSError as e:
+                logger.error('journal %s write failed: %s' % (self._path, e))
+
+            with self._cond:
+                if batch:
+                    self._written_seq = batch[-1][0]
+                self._cond.notify_all()
+                if closing and not self._pending:
+                    return
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until all the records queued so far have been written.
+
+        Returns:
+            Whether they were written before the timeout.
+        """
+        with self._cond:
+            seq = self._seq
+            return self._cond.wait_for(lambda: self._written_seq >= seq,
+                                       timeout)
+
+    def close(self) -> None:
+        """Remove the journal as a database listener, write (and fsync) all
+        queued records, and close the file."""
+        self._database.remove_listener(self)
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._fd.close()
+        logger.info('journal %s closed at seq %d' % (self._path, self._seq))
+
+    def __str__(self):
+        return '%s(path=%r, fsync=%r, seq=%d, pending=%d)' % (
+            self.__class__.__name__, self._path, self._fsync, self._seq,
+            len(self._pending))
+
+    __repr__ = __str__
+
+
+def _records(path: str, template: PMap) -> Iterator[tuple]:
+    # yields (record, end-offset) tuples; stops at a torn or corrupt record
+    with open(path, 'rb') as fd:
+        reader = _Reader(fd)
+        try:
+            magic = reader.bytes(len(MAGIC))
+            version = int.from_bytes(reader.bytes(2), 'big')
+        except ValueError:
+            magic, version = None, None
+        if magic != MAGIC:
+            raise ValueError('%s is not a journal' % path)
+        if version != VERSION:
+            raise ValueError('%s has unsupported journal version %d' % (
+                path, version))
+        end = reader.tell()
+        while not reader.at_end():
+            try:
+                body = reader.blob()
+                crc = int.from_bytes(reader.bytes(4), 'big')
+            except ValueError:
+                break
+            if zlib.crc32(body) != crc:
+                logger.warning('journal %s: CRC mismatch at offset %d' % (
+                    path, end))
+                break
+            yield _decode(body, template), reader.tell()
+            end = reader.tell()
+
+
+def _decode(body: bytes, template: PMap) -> JournalRecord:
+    reader = _Reader(io.BytesIO(body))
+    seq = reader.uint()
+    time_ = reader.uint() / 1000.0
+    kind = reader.uint()
+    onu_id = reader.uint()
+    me_class, me_inst, value = None, None, None
+    if kind == _PUT:
+        (me_class, me_inst), value = _read_instance(reader, template)
+    elif kind == _DELETE:
+        me_class, me_inst = reader.uint(), reader.uint()
+    elif kind == _RELOAD:
+        value = PMap(_read_instance(reader, template) for _ in
+                     range(reader.uint()))
+    elif kind == _ALARM:
+        me_class, me_inst, value = reader.uint(), reader.uint(), \
+                                   reader.uint()
+    else:
+        raise ValueError('invalid journal record kind %d' % kind)
+    return JournalRecord(seq, time_, _kind_names[kind], onu_id, me_class,
+                         me_inst, value)
+
+
+def read(path: str, template: PMap) -> Iterator[JournalRecord]:
+    """Read a journal's records.
+
+    Args:
+        path: journal file path.
+        template: compiled MIB instance template.
+
+    Returns:
+        Iterator over the records, in order.
+
+    Raises:
+        ValueError: The file isn't a journal.
+    """
+    return (record for record, _ in _records(path, template))
+
+
+def replay(database: Database, path: Optional[str], *,
+           checkpoint_path: Optional[str] = None) -> int:
+    """Rebuild a database from a checkpoint plus a journal.
+
+    This must be done before a `Journal` is attached to the database
+    (otherwise the replayed changes would be journaled again).
+
+    Args:
+        database: the `Database`.
+        path: journal file path (it's OK if it doesn't exist).
+        checkpoint_path: checkpoint file path (it's OK if it doesn't exist).
+
+    Returns:
+        Number of journal records that were applied; records for unknown ONU
+        ids, and records that are already included in the checkpoint, are
+        skipped.
+    """
+    seqs: Dict[int, int] = {}
+    if checkpoint_path and os.path.isfile(checkpoint_path):
+        seqs = checkpoint.load(database, checkpoint_path)
+    if not path or not os.path.isfile(path) or os.path.getsize(path) == 0:
+        return 0
+
+    known = set(database.onu_ids)
+    count = 0
+    for record in read(path, database._template()):
+        onu_id = record.onu_id
+        if onu_id not in known or record.seq <= seqs.get(onu_id, 0):
+            continue
+        if record.kind == 'put':
+            database.restore_instance(onu_id, record.me_class,
+                                      record.me_inst, record.value)
+        elif record.kind == 'delete':
+            database.restore_instance(onu_id, record.me_class,
+                                      record.me_inst, None)
+        elif record.kind == 'reload':
+            database.rollback(onu_id, record.value)
+        elif record.kind == 'alarm':
+            database.restore_alarm(onu_id, record.me_class, record.me_inst,
+                                   record.value)
+        count += 1
+    logger.info('replayed %d records from journal %s' % (count, path))
+    return count
@@ -0,0 +1,114 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-key (typically per-ONU) locking.
+
+The `Database` is accessed both by the OMCI thread and by the REST API
+handlers. Each ONU has its own (re-entrant) lock, so operations on one ONU
+see a consistent view of its MIB, while operations on different ONUs don't
+block each other.
+
+Example::
+
+    locks = KeyedLocks()
+    with locks(onu_id):
+        ...  # access this ONU's data
+    print(locks.metrics())
+"""
+
+import contextlib
+import logging
+import threading
+import time
+
+from typing import Any, Dict, Hashable, Iterator
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+
+class _Entry:
+    __slots__ = ('lock', 'acquisitions', 'contended', 'wait_time',
+                 'max_wait_time')
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+
+class KeyedLocks:
+    """Table of re-entrant locks, one per key.
+
+    Locks are created on first use and are never discarded, which is
+    appropriate when there's a bounded set of keys such as ONU ids. Callers
+    must validate keys that come from outside (e.g. ONU ids in messages)
+    before locking them.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._guard = threading.Lock()
+
+    def _entry(self, key: Hashable) -> _Entry:
+        entry = self._entries.get(key, None)
+        if entry is None:
+            with self._guard:
+                entry = self._entries.setdefault(key, _Entry())
+        return entry
+
+    @contextlib.contextmanager
+    def __call__(self, key: Hashable) -> Iterator[None]:
+        """Hold the lock for the specified key (use as a context manager).
+        """
+        entry = self._entry(key)
+        if entry.lock.acquire(blocking=False):
+            wait_time = None
+        else:
+            start = time.perf_counter()
+            entry.lock.acquire()
+            wait_time = time.perf_counter() - start
+
+        # statistics are only updated while the lock is held
+        try:
+            entry.acquisitions += 1
+            if wait_time is not None:
+                entry.contended += 1
+                entry.wait_time += wait_time
+                entry.max_wait_time = max(entry.max_wait_time, wait_time)
+            yield
+        finally:
+            entry.lock.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return lock statistics, aggregated over all keys.
+
+        Returns:
+            Dictionary with ``locks``, ``acquisitions``, ``contended``,
+            ``wait_time`` (total seconds spent waiting) and ``max_wait_time``
+            items.
+        """
+        entries = list(self._entries.values())
+        return {'locks': len(entries),
+                'acquisitions': sum(e.acquisitions for e in entries),
+                'contended': sum(e.contended for e in entries),
+                'wait_time': sum(e.wait_time for e in entries),
+                'max_wait_time': max((e.max_wait_time for e in entries),
+                                     default=0.0)}
+
+    def __str__(self):
+        return '%s(locks=%d)' % (self.__class__.__name__, len(self._entries))
+
+    __repr__ = __str__
@@ -16,7 +16,8 @@
 Entity), is defined via a `MIB` instance.
 
 A MIB definition describes its `Attrs <Attr>` (attributes), `Actions <Action>`,
-`Notifications <Notification>`, `Changes <Change>` and `Alarms <Alarm>`.
+`Notifications <Notification>`, `Changes <Change>`, `Alarms <Alarm>` and
+`Refs <Ref>` (references to other MIB instances).
 
 Example::
 
@@ -37,7 +38,7 @@ from typing import Dict, Optional, Set, Tuple, Union
 
 from .action import Action
 from .types import AttrData, AttrDataValues, Datum, Name, NumberName, \
-    AutoGetter
+    AutoGetter, Table
 
 logger = logging.getLogger(__name__.replace('obbaa_', ''))
 
@@ -54,7 +55,8 @@ class MIB(NumberName, AutoGetter):
                  actions: Tuple[Action, ...] = None,
                  notifications: Tuple['Notification', ...] = None,
                  changes: Tuple['Change', ...] = None,
-                 alarms: Tuple['Alarm', ...] = None):
+                 alarms: Tuple['Alarm', ...] = None,
+                 refs: Tuple['Ref', ...] = None):
         """MIB class constructor.
 
         The constructor adds new MIB instances to the `mibs` dictionary.
@@ -77,6 +79,8 @@ class MIB(NumberName, AutoGetter):
             changes: Changes generated by this MIB.
 
             alarms: Alarms generated by this MIB.
+
+            refs: Attributes that reference other MIB instances.
         """
         assert number not in mibs
         super().__init__(number, name, description)
@@ -85,6 +89,7 @@ class MIB(NumberName, AutoGetter):
         self._notifications = notifications and tuple(notifications) or ()
         self._changes = changes and tuple(changes) or ()
         self._alarms = alarms and tuple(alarms) or ()
+        self._refs = refs and tuple(refs) or ()
 
         # XXX should check that changes reference defined attributes
 
@@ -196,7 +201,7 @@ class Attr(NumberName, AutoGetter):
             returned.
         """
         buffer = bytearray()
-        if values:
+        if values is not None:
             values_ = values if isinstance(values, tuple) else (values,)
             assert len(values_) == len(self._data)
             for i, datum in enumerate(self._data):
@@ -219,7 +224,7 @@ class Attr(NumberName, AutoGetter):
             returned.
         """
         results = None
-        if values:
+        if values is not None:
             values_ = values if isinstance(values, tuple) else (values,)
             #assert len(values_) == len(self._data)
             results_ = tuple(v() if callable(v) else v for v in values_)
@@ -240,6 +245,12 @@ class Attr(NumberName, AutoGetter):
         shift = 16 - self._number  # 15, ..., 0
         return 1 << shift
 
+    @property
+    def is_table(self) -> bool:
+        """Whether this attribute is a table, i.e. is read via `Get` (which
+        returns its size) and subsequent `Get_Next` operations."""
+        return isinstance(self._data[0], Table)
+
     @property 
     def size(self):
         """Get this attribute's value size in bytes."""
@@ -282,30 +293,88 @@ test_result_notification = Notification('test_result')
 
 # XXX changes are AVC (Attribute Value Change) notifications
 # XXX they would be better indicated via an Attr avc property
-class Change(NumberName):
+class Change(NumberName, AutoGetter):
     """Attribute change class.
     """
     pass
 
 
-class Alarm(NumberName):
+# XXX alarm state isn't held here, because it's per ONU and per instance; see
+#     AlarmStore
+class Alarm(NumberName, AutoGetter):
+    """Alarm class.
+
+    The alarm number is the bit number in the G.988 alarm bitmap.
+    """
+
     def __init__(self, number: int, name: str, resource: str,  description: Optional[str] = None, *, names: Optional[Set[str]] = None):
         super().__init__(number, name,description, names=names)
-        self.state = False
         self.resource = resource
 
-    def resource(self):
-        return self.resource
 
-    def get_state(self):
-        return self.state
+#: Null pointer value.
+NULL_POINTER = 0xffff
+
+
+class Ref(NumberName, AutoGetter):
+    """Reference (pointer) attribute class.
+
+    A reference attribute's value is the instance number of another MIB
+    instance. The referenced MIB class is either fixed, or is selected by the
+    value of another attribute (e.g. a TP type). Attribute 0 (``me_inst``)
+    can be a reference too, for MIBs that are implicitly linked to the
+    instance with the same instance number.
+
+    Example::
+
+        Ref(4, 'tp_ptr', {1: 11, 3: 130, 5: 266}, selector='tp_type')
+    """
+
+    def __init__(self, number: int, name: str,
+                 target: Union[int, Dict[int, int]], *,
+                 selector: Optional[str] = None, description: str = None):
+        """Reference attribute constructor.
+
+        Args:
+            number: attribute number.
+
+            name: attribute name.
+
+            target: referenced MIB class, or (if ``selector`` is specified)
+                referenced MIB classes, keyed by selector value; references
+                are ignored if the selector value isn't present.
+
+            selector: name of the attribute that selects the referenced MIB
+                class.
 
-    def get_state_as_int(self):
-        return int(self.state)
+            description: reference description; used only for documentation
+                purposes.
+        """
+        assert isinstance(target, int) or selector is not None
+        super().__init__(number, name, description)
+        self._target = target
+        self._selector = selector
 
-    def set_state(self,state: bool):
-        self.state = state
+    def resolve(self, instance: Dict[str, AttrDataValues]) -> \
+            Optional[Tuple[int, int]]:
+        """Return the key of the MIB instance that an instance references.
 
-    def __repr__(self) -> str:
-        return super().__repr__()+"\x08, state=%r)" % self.state
+        Args:
+            instance: the referencing instance.
 
+        Returns:
+            Referenced ``(me_class, me_inst)``, or ``None`` if the pointer is
+            null (`NULL_POINTER`) or the selector value isn't known.
+        """
+        me_inst = _scalar(instance.get(self._name, None))
+        if me_inst is None or me_inst == NULL_POINTER:
+            return None
+        if self._selector is None:
+            return self._target, me_inst
+        me_class = self._target.get(_scalar(instance.get(self._selector,
+                                                         None)), None)
+        return None if me_class is None else (me_class, me_inst)
+
+
+def _scalar(value: AttrDataValues):
+    return value[0] if isinstance(value, tuple) and value else value
@@ -17,7 +17,9 @@
 
 from ..actions.get import get_action
 from ..actions.set import set_action
-from ..mib import MIB, Alarm, Attr, Change, M, O, R, RW, Notification
+from ..actions.test import test_action
+from ..mib import MIB, Alarm, Attr, Change, M, O, R, RW, Notification, \
+    test_result_notification
 from ..types import Enum, Number
 
 #: Instantiated `MIB`.
@@ -40,9 +42,10 @@ ani_g_mib = MIB(263,'ANI_G', 'Represents a physical PON interface', attrs = (
         Attr(15, 'lower_transmit_power_threshold', '', RW, O, Number(1)),
         Attr(16, 'upper_transmit_power_threshold', '', RW, O, Number(1)),
     )
-    ,actions = (get_action, set_action
+    ,actions = (get_action, set_action, test_action
 ), notifications=(
     Notification(8,  'Alarm-reporting control cancellation'),
+    test_result_notification,
 
 ), alarms=(
             Alarm(0,'bbf-hardware-transceiver-alarm-types:rx-power-low','Low receive (RX) input power'),
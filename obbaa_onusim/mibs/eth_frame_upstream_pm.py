@@ -18,7 +18,8 @@ from ..actions.create import create_action
 from ..actions.set import set_action
 from ..actions.get import get_action
 from ..actions.delete import delete_action
-from ..mib import MIB, Attr, M, R, RWC
+from ..actions.get_current_data import get_current_data_action
+from ..mib import MIB, Alarm, Attr, M, R, RWC, Ref
 from ..types import Number, Bytes, Bool
  
 #: Instantiated `MIB`.
@@ -41,7 +42,17 @@ eth_frame_upstream_pm_mib = MIB(322, 'ETH_FRAME_UPSTREAM_PM', 'Ethernet Frame Pe
     Attr(15, 'packets_512_to_1023_octets', 'Packets 512 to 1023 octets', R, M, Number(4)),
     Attr(16, 'packets_1024_to_1518_octets', 'Packets 1024 to 1518 octets', R, M, Number(4))
 ), actions=(
-    get_action, set_action, create_action, delete_action
+    get_action, set_action, create_action, delete_action,
+    get_current_data_action
 ), alarms=(
-
-))
\ No newline at end of file
+    # threshold crossing alerts (TCAs); see obbaa_onusim.pm
+    Alarm(0, 'drop-events', 'Drop events TCA (threshold value 1)'),
+    Alarm(1, 'crc-errored-packets',
+          'CRC errored packets TCA (threshold value 2)'),
+    Alarm(2, 'undersize-packets', 'Undersize packets TCA (threshold value 3)'),
+    Alarm(3, 'oversize-packets', 'Oversize packets TCA (threshold value 4)')
+), refs=(
+    # implicitly linked to the MAC bridge port configuration data instance
+    Ref(0, 'me_inst', 47),
+    Ref(2, 'threshold_data_1_2_ID', 273)
+))
@@ -16,9 +16,10 @@
 """
 from ..actions.create import create_action
 from ..actions.set import set_action
+from ..actions.set_table import set_table_action
 from ..actions.get import get_action, get_next_action
 from ..actions.delete import delete_action
-from ..mib import MIB, Attr, M, RWC, RW, R, O
+from ..mib import MIB, Attr, M, RWC, RW, R, O, Ref
 from ..types import Enum, Number, Bytes, Table
  
 #: Instantiated `MIB`.
@@ -31,7 +32,7 @@ extended_vlan_tag_op_conf_data_mib = MIB(171, 'EXT_VLAN_TAG_OP_CONF_DATA', 'Exte
     Attr(4, 'output_tpid', 'Output TPID', RW, M, Number(2)),
     Attr(5, 'downstream_mode', 'Downstream Mode', RW, M, Number(1)),
     Attr(6, 'received_frame_vlan_tag_op_table', 'Received Frame VLAN Tagging Operation Table', 
-    	RW, M, Table(16)),
+    	RW, M, Table(16, key_size=8)),
     Attr(7, 'associated_me_ptr', 'Associated ME Pointer', RWC, M, Number(2)),
     Attr(8, 'dscp_pbit_mapping', 'DSCP to Pbit Mapping', RW, O, Bytes(24)),
     Attr(9, 'enhanced_mode', 'Enhanced Mode', RWC, O, 
@@ -39,6 +40,12 @@ extended_vlan_tag_op_conf_data_mib = MIB(171, 'EXT_VLAN_TAG_OP_CONF_DATA', 'Exte
     Attr(10, 'enhanced_received_classification_processing_table', 'Enhanced Received Classification and Operation Table', 
     	RW, M, Bytes(16))
 ), actions=(
-    get_action, set_action, create_action, delete_action, get_next_action
+    get_action, set_action, create_action, delete_action, get_next_action,
+    set_table_action
+), refs=(
+    # association types: 0 MAC bridge port configuration data, 1 802.1p
+    # mapper, 2 PPTP Ethernet UNI, 5 GEM interworking TP
+    Ref(7, 'associated_me_ptr', {0: 47, 1: 130, 2: 11, 5: 266},
+        selector='association_type'),
 ))
 
@@ -18,7 +18,7 @@ from ..actions.create import create_action
 from ..actions.set import set_action
 from ..actions.get import get_action
 from ..actions.delete import delete_action
-from ..mib import MIB, Alarm, Attr, Change, M, R, RWC, RW, O
+from ..mib import MIB, Alarm, Attr, Change, M, R, RWC, RW, O, Ref
 from ..types import Enum,Number
  
 #: Instantiated `MIB`.
@@ -41,4 +41,9 @@ gem_iw_tp_mib = MIB(266, 'GEM_INT_TER_POINT', 'GEM Interworking Termination Poin
     Change(6,'op_state','operational state change'),
 ),alarms=(
     Alarm(0,'Deprecated','Deprecated'),
+), refs=(
+    Ref(1, 'gem_port_net_ctp_conn_ptr', 268),
+    # interworking option 1 is MAC bridged LAN and 5 is 802.1p mapper
+    Ref(3, 'svc_prof_ptr', {1: 45, 5: 130}, selector='iw_opt'),
+    Ref(7, 'gal_prof_ptr', 272)
 ))
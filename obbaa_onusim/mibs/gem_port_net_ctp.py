@@ -18,7 +18,7 @@ from ..actions.create import create_action
 from ..actions.set import set_action
 from ..actions.get import get_action
 from ..actions.delete import delete_action
-from ..mib import MIB, Alarm, Attr,Change, M, R, RWC, O
+from ..mib import MIB, Alarm, Attr,Change, M, R, RWC, O, Ref
 from ..types import Enum,Number
  
 #: Instantiated `MIB`.
@@ -45,4 +45,10 @@ gem_port_net_ctp_mib = MIB(268, 'GEM_PORT_NET_CTP', 'GEM Port Network CTP ', att
 ),alarms=(
     Alarm(5,'end-to-end_loss_of_continuity',
     'Loss of continuity can be detected when the GEM port network CTP supports a GEM interworking termination point'),
+), refs=(
+    Ref(2, 'tcont_ptr', 262),
+    # the ONU-G traffic management option is priority-controlled, so this
+    # points to a priority queue (it would be a T-CONT if rate-controlled)
+    Ref(4, 'traffic_mgmt_ptr_us', 277),
+    Ref(7, 'pri_queue_ptr_ds', 277)
 ))
@@ -18,7 +18,7 @@ from ..actions.create import create_action
 from ..actions.set import set_action
 from ..actions.get import get_action
 from ..actions.delete import delete_action
-from ..mib import MIB, Attr, M, R, RWC, RW, O
+from ..mib import MIB, Attr, M, R, RWC, RW, O, Ref
 from ..types import Enum, Number, Bytes
  
 #: Instantiated `MIB`.
@@ -41,4 +41,7 @@ ieee_8021p_mapper_svc_prof_mib = MIB(130, 'IEEE_802_1P_MAPPER', 'IEEE 802.1p Map
     Attr(13, 'tp_type', 'TP Type', RWC, O, Number(1))
     ), actions=(
     get_action, set_action, create_action, delete_action
-))
+), refs=(
+    # TP type 1 is PPTP Ethernet UNI (0 is bridging-mapping, i.e. null)
+    Ref(1, 'tp_ptr', {1: 11}, selector='tp_type'),
+) + tuple(Ref(2 + pbit, 'iw_tp_ptr_pbit%d' % pbit, 266) for pbit in range(8)))
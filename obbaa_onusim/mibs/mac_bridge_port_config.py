@@ -18,7 +18,7 @@ from ..actions.create import create_action
 from ..actions.set import set_action
 from ..actions.get import get_action
 from ..actions.delete import delete_action
-from ..mib import MIB, Alarm, Attr, M, R, RWC, RW, O
+from ..mib import MIB, Alarm, Attr, M, R, RWC, RW, O, Ref
 from ..types import Number, Bytes, Bool
  
 #: Instantiated `MIB`.
@@ -42,4 +42,8 @@ mac_bridge_port_conf_mib = MIB(47, 'MAC_BRIDGE_PORT_CONF', 'MAC Bridge Port Conf
     get_action, set_action, create_action, delete_action
 ), alarms=(
 
+), refs=(
+    Ref(1, 'bridge_id_ptr', 45),
+    # TP types: 1 PPTP Ethernet UNI, 3 802.1p mapper, 5 GEM interworking TP
+    Ref(4, 'tp_ptr', {1: 11, 3: 130, 5: 266}, selector='tp_type')
 ))
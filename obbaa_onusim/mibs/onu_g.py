@@ -16,8 +16,10 @@
 """
 
 from ..actions.get import get_action
+from ..actions.reboot import reboot_action
 from ..actions.set import set_action
-from ..actions.other import reboot_action, test_action, sync_time_action
+from ..actions.sync_time import sync_time_action
+from ..actions.test import test_action
 from ..mib import MIB, Alarm, Attr, Change, M, O, R, RW, \
     test_result_notification
 from ..types import Bits, Bool, Enum, Number, String
@@ -40,9 +40,9 @@ priority_queue_mib = MIB(277, 'PRIORITY_QUEUE', 'Priority Queue', attrs=(
     Attr(12, 'back_pressure_clear_queue_threshold', 'Back Pressure Clear Queue Threshold', 
     	RW, M, Number(2)),
     Attr(13, 'packet_drop_queue_threshold', 'Packet Drop Queue Threshold', RW, O, Bytes(8)),
-    Attr(13, 'packet_drop_max_p', 'Packet Drop Max_p', RW, O, Number(2)),
-    Attr(14, 'queue_drop_w_q', 'Queue Drop w_p', RW, O, Number(1)),
-    Attr(15, 'drop_precedence_colour_marking', 'Drop President Colour Marking', RW, O, 
+    Attr(14, 'packet_drop_max_p', 'Packet Drop Max_p', RW, O, Number(2)),
+    Attr(15, 'queue_drop_w_q', 'Queue Drop w_p', RW, O, Number(1)),
+    Attr(16, 'drop_precedence_colour_marking', 'Drop President Colour Marking', RW, O, 
     	Enum(1, ('no_marking',
     		 'internal_marking',
     		 'dei',
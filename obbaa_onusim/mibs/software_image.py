@@ -15,9 +15,10 @@
 """Software image MIB (G.988 9.1.4).
 """
 
+from ..actions.download import start_download_action, \
+    download_section_action, end_download_action, activate_image_action, \
+    commit_image_action
 from ..actions.get import get_action
-from ..actions.other import start_download_action, download_section_action, \
-    end_download_action, activate_image_action, commit_image_action
 from ..mib import MIB, Attr, Change, M, O, R
 from ..types import Bool, Bytes, Number, String
 
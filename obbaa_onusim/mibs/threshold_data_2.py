@@ -0,0 +1,43 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Threshold data 2 MIB (G.988 9.12.17).
+
+Threshold data 2 and 1 instances with the same instance number together
+hold the 14 threshold values that are referenced by PM history data instances'
+``threshold_data_1_2_ID`` attributes.
+"""
+
+from ..actions.create import create_action
+from ..actions.delete import delete_action
+from ..actions.get import get_action
+from ..actions.set import set_action
+from ..mib import MIB, Attr, M, R, RWC
+from ..types import Number
+
+#: Instantiated `MIB`.
+threshold_data_2_mib = MIB(274, 'Threshold data 2',
+                           'Threshold values for performance monitoring',
+                           attrs=(
+    Attr(0, 'me_inst', 'Managed entity instance', R, M, Number(2)),
+    Attr(1, 'threshold_value_8', 'Threshold value 8', RWC, M, Number(4)),
+    Attr(2, 'threshold_value_9', 'Threshold value 9', RWC, M, Number(4)),
+    Attr(3, 'threshold_value_10', 'Threshold value 10', RWC, M, Number(4)),
+    Attr(4, 'threshold_value_11', 'Threshold value 11', RWC, M, Number(4)),
+    Attr(5, 'threshold_value_12', 'Threshold value 12', RWC, M, Number(4)),
+    Attr(6, 'threshold_value_13', 'Threshold value 13', RWC, M, Number(4)),
+    Attr(7, 'threshold_value_14', 'Threshold value 14', RWC, M, Number(4))
+), actions=(
+    get_action, set_action, create_action, delete_action
+))
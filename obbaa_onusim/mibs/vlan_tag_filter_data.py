@@ -18,7 +18,7 @@ from ..actions.create import create_action
 from ..actions.set import set_action
 from ..actions.get import get_action
 from ..actions.delete import delete_action
-from ..mib import MIB, Attr, M, R, RWC
+from ..mib import MIB, Attr, M, R, RWC, Ref
 from ..types import Number, Bytes
  
 #: Instantiated `MIB`.
@@ -29,4 +29,7 @@ vlan_tag_filter_data_mib = MIB(84, 'VLAN_TAG_FILTER_DATA', 'VLAN Tagging Filter
     Attr(3, 'number_of_entries', 'Number of Entries', RWC, M, Number(1))
 ), actions=(
     get_action, set_action, create_action, delete_action
+), refs=(
+    # implicitly linked to the MAC bridge port configuration data instance
+    Ref(0, 'me_inst', 47),
 ))
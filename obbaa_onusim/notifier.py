@@ -0,0 +1,430 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Autonomous notifications: Attribute Value Change (AVC) and alarm
+notifications.
+
+The `AvcEngine` is a `DatabaseListener` that's notified of autonomous changes
+to attributes that generate AVCs (see `Database.set`). It marks each changed
+instance as dirty and, after a short coalescing window, sends a single AVC
+containing the current values of all the instance's dirty attributes.
+
+AVCs are paced by `TokenBucket` instances, one per ONU and one per
+destination, so a bulk change across many ONUs can't flood the receiver. While
+an AVC is waiting for tokens, further changes to the same instance are merged
+into it, so the backlog can never exceed one AVC per instance.
+
+The `AlarmNotifier` sends alarm notifications, with per-ONU alarm sequence
+numbers, for alarms that are raised (or cleared) by the simulator itself,
+e.g. threshold crossing alerts. They're paced by a per-destination
+`TokenBucket`; notifications that exceed its rate are dropped, but they still
+consume sequence numbers, so (as with a real ONU) the receiver sees the gap
+and can resynchronize via `get all alarms <get_all_alarms_action>`.
+
+Examples::
+
+    engine = AvcEngine(database, scheduler, endpoint.send,
+                       cterm_name='cterm', destination=lambda: address,
+                       window=0.1, onu_rate=10.0, rate=1000.0)
+    database.set(onu_id, 256, 0, mask, {'oper_state': 1}, avc=True)
+
+    notifier = AlarmNotifier(endpoint.send, cterm_name='cterm',
+                             destination=lambda: address, rate=100.0)
+    notifier.notify(onu_id, me_class, me_inst, bitmap)
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, \
+    Tuple
+
+from .actions.alarm import Alarm
+from .actions.avc import AttributeValueChange, BASELINE_VALUES_SIZE
+from .alarm_store import ALARM_BITMAP_SIZE
+from .database import Database, DatabaseListener
+from .message import Message
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+
+class TokenBucket:
+    """Token bucket rate limiter.
+
+    The bucket holds up to ``burst`` tokens and is refilled at ``rate``
+    tokens per second. It isn't thread-safe.
+    """
+
+    __slots__ = ('rate', 'burst', 'tokens', 'last')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        """Token bucket constructor (the bucket starts full).
+
+        Args:
+            rate: refill rate in tokens per second.
+            burst: bucket size.
+            now: current time.
+        """
+        assert rate > 0 and burst >= 1
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = now
+
+    def ready(self, now: float) -> bool:
+        """Return whether a token is available (without taking it)."""
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        return self.tokens >= 1
+
+    def take(self, now: float) -> bool:
+        """Take a token, if one is available.
+
+        Returns:
+            Whether a token was taken.
+        """
+        if not self.ready(now):
+            return False
+        self.tokens -= 1
+        return True
+
+    def delay(self, now: float) -> float:
+        """Return the time until a token will be available."""
+        tokens = self.tokens + (now - self.last) * self.rate
+        return max(0.0, (1 - tokens) / self.rate)
+
+    def __repr__(self):
+        return '%s(rate=%r, burst=%r, tokens=%.1f)' % (
+            self.__class__.__name__, self.rate, self.burst, self.tokens)
+
+
+class AvcEngine(DatabaseListener):
+    """AVC engine class.
+    """
+
+    def __init__(self, database: Database, scheduler,
+                 send: Callable[[Message, Any], None], *, cterm_name: str,
+                 destination: Callable[[], Optional[Hashable]] = None,
+                 window: float = 0.1, onu_rate: float = 10.0,
+                 onu_burst: float = 10, rate: float = 1000.0,
+                 burst: float = 100, extended: bool = False,
+                 clock: Callable[[], float] = time.monotonic):
+        """AVC engine constructor.
+
+        Args:
+            database: the `Database`; the engine adds itself as a listener.
+
+            scheduler: the `Scheduler` that runs the coalescing windows and
+                pacing.
+
+            send: function that sends a message to a destination, e.g.
+                `Endpoint.send`.
+
+            cterm_name: channel termination name for the messages.
+
+            destination: function that returns the current destination
+                (``None`` if it isn't yet known, in which case AVCs are
+                dropped); defaults to always ``None``, i.e. the ``send``
+                function's default.
+
+            window: coalescing window in seconds.
+
+            onu_rate, onu_burst: per-ONU rate (AVCs per second) and burst.
+
+            rate, burst: per-destination rate (AVCs per second) and burst.
+
+            extended: whether to send extended messages; if not, AVCs whose
+                values don't fit in a baseline message are split.
+
+            clock: clock function; defaults to ``time.monotonic``.
+        """
+        self._database = database
+        self._scheduler = scheduler
+        self._send = send
+        self._cterm_name = cterm_name
+        self._destination = destination
+        self._window = window
+        self._onu_rate = onu_rate
+        self._onu_burst = onu_burst
+        self._rate = rate
+        self._burst = burst
+        self._extended = extended
+        self._clock = clock
+
+        # dirty attribute masks, keyed by (onu_id, me_class, me_inst); keys are
+        # added to the ready queue when their windows have expired
+        self._pending: Dict[Tuple[int, int, int], int] = {}
+        self._ready = collections.deque()
+        self._onu_buckets: Dict[int, TokenBucket] = {}
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._drain_timer = None
+        self._destination_throttled = False
+        self._lock = threading.Lock()
+
+        #: Counters: ``changes`` (instances marked as dirty), ``coalesced``
+        #: (changes merged into a pending AVC), ``sent``, ``throttled``
+        #: (times AVCs were deferred by per-ONU pacing) and ``dropped``.
+        self.metrics = collections.Counter()
+
+        database.add_listener(self)
+
+    def close(self) -> None:
+        """Stop listening for changes (pending AVCs aren't sent)."""
+        self._database.remove_listener(self)
+        with self._lock:
+            self._scheduler.cancel(self._drain_timer)
+            self._drain_timer = None
+            self._pending.clear()
+            self._ready.clear()
+
+    def attributes_changed(self, onu_id: int, me_class: int, me_inst: int,
+                           attr_mask: int) -> None:
+        key = (onu_id, me_class, me_inst)
+        with self._lock:
+            mask = self._pending.get(key, None)
+            if mask is None:
+                self._pending[key] = attr_mask
+                self._scheduler.call_later(self._window, self._expire, key)
+                self.metrics['changes'] += 1
+            else:
+                self._pending[key] = mask | attr_mask
+                self.metrics['coalesced'] += 1
+
+    def _expire(self, key: Tuple[int, int, int]) -> None:
+        with self._lock:
+            if key not in self._pending:
+                return
+            self._ready.append(key)
+            # if the destination is being throttled, a drain is already
+            # scheduled
+            if self._destination_throttled:
+                return
+        self._drain()
+
+    def _drain(self) -> None:
+        destination = self._destination() if self._destination else None
+        now = self._clock()
+        sends = []
+        with self._lock:
+            self._scheduler.cancel(self._drain_timer)
+            self._drain_timer = None
+            self._destination_throttled = False
+            bucket = self._buckets.get(destination, None)
+            if bucket is None:
+                bucket = self._buckets[destination] = TokenBucket(
+                        self._rate, self._burst, now)
+
+            # keys for throttled ONUs keep their place in the queue
+            blocked = []
+            wait = None
+            while self._ready:
+                if not bucket.ready(now):
+                    delay = bucket.delay(now)
+                    wait = delay if wait is None else min(wait, delay)
+                    self._destination_throttled = True
+                    break
+                key = self._ready.popleft()
+                onu_bucket = self._onu_buckets.get(key[0], None)
+                if onu_bucket is None:
+                    onu_bucket = self._onu_buckets[key[0]] = TokenBucket(
+                            self._onu_rate, self._onu_burst, now)
+                if not onu_bucket.take(now):
+                    blocked.append(key)
+                    delay = onu_bucket.delay(now)
+                    wait = delay if wait is None else min(wait, delay)
+                    continue
+                bucket.take(now)
+                sends.append((key, self._pending.pop(key)))
+            self._ready.extendleft(reversed(blocked))
+            self.metrics['throttled'] += len(blocked)
+            if wait is not None:
+                self._drain_timer = self._scheduler.call_later(wait,
+                                                               self._drain)
+
+        for key, attr_mask in sends:
+            self._notify(key, attr_mask, destination)
+
+    def _notify(self, key: Tuple[int, int, int], attr_mask: int,
+                destination: Optional[Hashable]) -> None:
+        onu_id, me_class, me_inst = key
+        if self._destination and destination is None:
+            logger.debug('no destination; AVC for ONU %d MIB %d #%d dropped'
+                         % key)
+            self.metrics['dropped'] += 1
+            return
+
+        # the values are fetched now, so they're the latest ones
+        results = self._database.get(onu_id, me_class, me_inst, attr_mask,
+                                     extended=True)
+        if results.reason != 0b0000 or not results.attrs:
+            logger.debug('ONU %d MIB %d #%d not found; AVC dropped' % key)
+            self.metrics['dropped'] += 1
+            return
+
+        # baseline AVCs have limited space, so they might need to be split
+        groups = [[]]
+        size = 0
+        for attr, value in results.attrs:
+            if not self._extended and groups[-1] and \
+                    size + attr.size > BASELINE_VALUES_SIZE:
+                groups.append([])
+                size = 0
+            groups[-1].append((attr, value))
+            size += attr.size
+
+        for group in groups:
+            message = AttributeValueChange(
+                    cterm_name=self._cterm_name, onu_id=onu_id,
+                    extended=self._extended, me_class=me_class,
+                    me_inst=me_inst,
+                    attr_mask=sum(attr.mask for attr, _ in group),
+                    values={attr.name: value for attr, value in group})
+            logger.info('sending AVC %r' % message)
+            try:
+                if destination is None:
+                    self._send(message)
+                else:
+                    self._send(message, destination)
+                self.metrics['sent'] += 1
+            except OSError as e:
+                logger.error('failed to send AVC %r: %s' % (message, e))
+                self.metrics['dropped'] += 1
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __str__(self):
+        return '%s(window=%r, onu_rate=%r, rate=%r, pending=%d)' % (
+            self.__class__.__name__, self._window, self._onu_rate,
+            self._rate, len(self._pending))
+
+    __repr__ = __str__
+
+
+class AlarmNotifier:
+    """Alarm notifier class.
+    """
+
+    def __init__(self, send: Callable[[Message, Any], None], *,
+                 cterm_name: str,
+                 destination: Callable[[], Optional[Hashable]] = None,
+                 rate: float = 100.0, burst: float = 100,
+                 clock: Callable[[], float] = time.monotonic):
+        """Alarm notifier constructor.
+
+        Args:
+            send: function that sends a message to a destination, e.g.
+                `Endpoint.send`.
+
+            cterm_name: channel termination name for the messages.
+
+            destination: function that returns the current destination, as
+                for `AvcEngine`.
+
+            rate, burst: per-destination rate (notifications per second) and
+                burst.
+
+            clock: clock function; defaults to ``time.monotonic``.
+        """
+        self._send = send
+        self._cterm_name = cterm_name
+        self._destination = destination
+        self._rate = rate
+        self._burst = burst
+        self._clock = clock
+        self._seq_nums: Dict[int, int] = {}
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+        #: Counters: ``sent`` and ``dropped``.
+        self.metrics = collections.Counter()
+
+    def notify(self, onu_id: int, me_class: int, me_inst: int,
+               bitmap: int) -> bool:
+        """Send an alarm notification.
+
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class.
+            me_inst: MIB instance.
+            bitmap: the instance's alarm bitmap.
+
+        Returns:
+            Whether the notification was sent.
+        """
+        return self.notify_all(((onu_id, me_class, me_inst, bitmap),)) == 1
+
+    def notify_all(self, notifications: Iterable[Tuple[int, int, int, int]]) \
+            -> int:
+        """Send a batch of alarm notifications.
+
+        Sequence numbers and tokens are allocated for the whole batch under a
+        single lock, and the messages are then sent back to back.
+
+        Args:
+            notifications: ``(onu_id, me_class, me_inst, bitmap)`` tuples, as
+                for `notify`.
+
+        Returns:
+            Number of notifications that were sent.
+        """
+        destination = self._destination() if self._destination else None
+        now = self._clock()
+        batch = []
+        with self._lock:
+            bucket = self._buckets.get(destination, None)
+            if bucket is None:
+                bucket = self._buckets[destination] = TokenBucket(
+                        self._rate, self._burst, now)
+            for onu_id, me_class, me_inst, bitmap in notifications:
+                # sequence numbers run from 1 to 255 (0 is reserved)
+                seq_num = self._seq_nums.get(onu_id, 0) % 255 + 1
+                self._seq_nums[onu_id] = seq_num
+                batch.append((onu_id, me_class, me_inst, bitmap, seq_num,
+                              bucket.take(now)))
+
+        sent = 0
+        for onu_id, me_class, me_inst, bitmap, seq_num, allowed in batch:
+            if not allowed or (self._destination and destination is None):
+                logger.debug('alarm notification for ONU %d MIB %d #%d '
+                             'dropped' % (onu_id, me_class, me_inst))
+                self.metrics['dropped'] += 1
+                continue
+
+            message = Alarm(cterm_name=self._cterm_name, onu_id=onu_id,
+                            type_ar=False, me_class=me_class,
+                            me_inst=me_inst, bitmap=bitmap.to_bytes(
+                                ALARM_BITMAP_SIZE, 'big'), seqNum=seq_num)
+            logger.info('sending alarm %r' % message)
+            try:
+                if destination is None:
+                    self._send(message)
+                else:
+                    self._send(message, destination)
+            except OSError as e:
+                logger.error('failed to send alarm %r: %s' % (message, e))
+                self.metrics['dropped'] += 1
+                continue
+            self.metrics['sent'] += 1
+            sent += 1
+        return sent
+
+    def __str__(self):
+        return '%s(rate=%r, burst=%r)' % (self.__class__.__name__,
+                                          self._rate, self._burst)
+
+    __repr__ = __str__
@@ -0,0 +1,638 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Performance monitoring (PM) counter simulation.
+
+The `PmEngine` is a `DatabaseListener` that tracks all the PM history data
+instances (e.g. `eth_frame_upstream_pm_mib`) on all ONUs. Their counters are
+driven by per-ONU `TrafficProfile` rates, scaled per instance so that
+instances differ.
+
+Counters aren't incremented periodically. Instead, each MIB's counters are
+held column-wise in arrays (one array per counter, indexed by instance row),
+together with per-row rates and the time at which each row's counts were
+last folded. A counter's current value is then its count plus its rate
+multiplied by the elapsed time, so the cost of advancing the counters is
+zero, and evaluating them (e.g. for `get_current_data` or at the end of an
+interval) is a column-wise pass.
+
+At the end of each 15-minute interval (aligned to the clock), each
+instance's counts for the completed interval are stored as its attribute
+values (the history data), its ``interval_end_time`` is incremented, and its
+counts restart from zero. Like the ONU's, counters saturate at their maximum
+values. Synchronizing an ONU's time (see `PmEngine.synchronize`) discards its
+current counts and restarts its ``interval_end_time`` numbering. Hibernating
+ONUs (see `Hibernator`) aren't woken up at the end of an interval; their
+latest history data is stored when they're next woken up.
+
+As in G.988, the counters are the attributes that follow the
+``threshold_data_1_2_ID`` attribute.
+
+Threshold crossing alerts (TCAs) are evaluated periodically, and at the end
+of each interval, by comparing each TCA's counter column with a column of
+threshold values (taken from the threshold data 1 and 2 instances referenced
+by ``threshold_data_1_2_ID``; a zero threshold disables the TCA). A TCA is
+raised, and notified, only when its counter crosses its threshold, and at
+most once per interval. TCAs are cleared at the end of the interval without
+notification.
+
+Example::
+
+    engine = PmEngine(database, scheduler, profile='residential',
+                      notify=alarm_notifier.notify)
+    engine.set_profile(onu_id, 'business')
+    database.get_current_data(onu_id, 322, me_inst, attr_mask)
+"""
+
+import array
+import collections
+import logging
+import math
+import random
+import threading
+import time
+
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, \
+    Set, Tuple
+
+from .alarm_store import ALARM_BITMAP_SIZE, alarm_mask
+from .database import Database, DatabaseListener, Instance
+from .mib import Attr, MIB
+from .mibs.eth_frame_downstream_pm import eth_frame_downstream_pm_mib
+from .mibs.eth_frame_upstream_pm import eth_frame_upstream_pm_mib
+from .mibs.threshold_data_1 import threshold_data_1_mib
+from .mibs.threshold_data_2 import threshold_data_2_mib
+from .pmap import PMap
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+#: PM interval in seconds (15 minutes).
+PM_INTERVAL = 900.0
+
+#: PM history data MIBs maintained by the engine.
+pm_mibs = (eth_frame_downstream_pm_mib, eth_frame_upstream_pm_mib)
+
+#: Threshold data MIBs; their instances with the same instance number hold
+#: threshold values 1-7 and 8-14 respectively.
+threshold_mibs = (threshold_data_1_mib, threshold_data_2_mib)
+
+#: TCAs, keyed by PM MIB class: tuples of alarm number, counter attribute name
+#: and threshold value number (1-14).
+tcas: Dict[int, Tuple[Tuple[int, str, int], ...]] = {
+    mib.number: ((0, 'drop_events', 1), (1, 'crc_errored_packets', 2),
+                 (2, 'undersize_packets', 3), (3, 'oversize_packets', 4))
+    for mib in pm_mibs}
+
+# number of threshold values per threshold data MIB
+_THRESHOLDS_PER_MIB = 7
+
+
+def _value(values) -> int:
+    # instance values are usually tuples, but created ones might be raw
+    values = values[0] if isinstance(values, tuple) else values
+    return values or 0
+
+
+class TrafficProfile(NamedTuple):
+    """Traffic profile: per-second rates, keyed by counter attribute name.
+
+    Counters that aren't listed don't change.
+    """
+    name: str
+    rates: Dict[str, float]
+
+
+def _ethernet_profile(name: str, packets: float) -> TrafficProfile:
+    # typical Ethernet frame mix; octets are consistent with the packet sizes
+    sizes = (('packets_64_octets', 0.35, 64),
+             ('packets_65_to_127_octets', 0.15, 96),
+             ('packets_128_to_255_octets', 0.05, 192),
+             ('packets_256_to_511_octets', 0.05, 384),
+             ('packets_512_to_1023_octets', 0.05, 768),
+             ('packets_1024_to_1518_octets', 0.35, 1518))
+    rates = {size_name: packets * fraction for size_name, fraction, _ in
+             sizes}
+    rates.update({
+        'packets': packets,
+        'octets': sum(packets * fraction * size for _, fraction, size in
+                      sizes),
+        'broadcast_packets': packets * 0.001,
+        'multicast_packets': packets * 0.01,
+        'drop_events': packets * 1e-6,
+        'crc_errored_packets': packets * 1e-7,
+        'undersize_packets': packets * 1e-7,
+        'oversize_packets': packets * 1e-7})
+    return TrafficProfile(name, rates)
+
+
+#: Traffic profiles, keyed by name.
+profiles: Dict[str, TrafficProfile] = {p.name: p for p in (
+    TrafficProfile('idle', {}),
+    _ethernet_profile('light', 10.0),
+    _ethernet_profile('residential', 500.0),
+    _ethernet_profile('business', 20000.0))}
+
+
+class _PmTable:
+    """One MIB's counters, held column-wise."""
+
+    def __init__(self, mib: MIB):
+        self.mib = mib
+        names = [attr.name for attr in mib.attrs]
+        first = names.index('threshold_data_1_2_ID') + 1
+        self.columns: List[Attr] = list(mib.attrs[first:])
+        self.maxima = [(1 << (8 * attr.size)) - 1 for attr in self.columns]
+        self.mask = sum(attr.mask for attr in self.columns)
+        self.end_time_mask = mib.attr('interval_end_time').mask
+
+        # row -> (onu_id, me_inst) (None if free), and vice versa
+        self.keys: List[Optional[Tuple[int, int]]] = []
+        self.rows: Dict[Tuple[int, int], int] = {}
+        self.free: List[int] = []
+
+        # per-row scale factor and fold time, and per-column rates and counts
+        self.scales = array.array('d')
+        self.since = array.array('d')
+        self.rates = [array.array('d') for _ in self.columns]
+        self.counts = [array.array('d') for _ in self.columns]
+
+        # TCAs: (column, threshold index, alarm mask) and, per TCA, columns
+        # of threshold values and whether the TCA has been reported in this
+        # interval; also per-row threshold data instance numbers
+        names = [attr.name for attr in self.columns]
+        self.tcas = [(names.index(name), threshold - 1, alarm_mask(number))
+                     for number, name, threshold in tcas.get(mib.number, ())]
+        self.tca_mask = sum(mask for _, _, mask in self.tcas)
+        self.limits = [array.array('d') for _ in self.tcas]
+        self.reported = [bytearray() for _ in self.tcas]
+        self.threshold_ids = array.array('l')
+
+    def add(self, key: Tuple[int, int], now: float,
+            profile: TrafficProfile) -> int:
+        row = self.rows.get(key, None)
+        if row is not None:
+            return row
+        # the scale is derived from the key, so it's reproducible
+        scale = random.Random(hash(key)).uniform(0.5, 1.5)
+        if self.free:
+            row = self.free.pop()
+            self.keys[row] = key
+            self.scales[row] = scale
+            self.since[row] = now
+            for counts in self.counts:
+                counts[row] = 0.0
+        else:
+            row = len(self.keys)
+            self.keys.append(key)
+            self.scales.append(scale)
+            self.since.append(now)
+            for rates, counts in zip(self.rates, self.counts):
+                rates.append(0.0)
+                counts.append(0.0)
+            for limits, reported in zip(self.limits, self.reported):
+                limits.append(0.0)
+                reported.append(0)
+            self.threshold_ids.append(-1)
+        self.rows[key] = row
+        self.set_rates(row, profile)
+        return row
+
+    def remove(self, key: Tuple[int, int]) -> None:
+        row = self.rows.pop(key, None)
+        if row is not None:
+            self.keys[row] = None
+            for rates in self.rates:
+                rates[row] = 0.0
+            for limits, reported in zip(self.limits, self.reported):
+                limits[row] = 0.0
+                reported[row] = 0
+            self.threshold_ids[row] = -1
+            self.free.append(row)
+
+    def set_rates(self, row: int, profile: TrafficProfile) -> None:
+        scale = self.scales[row]
+        for attr, rates in zip(self.columns, self.rates):
+            rates[row] = profile.rates.get(attr.name, 0.0) * scale
+
+    def fold(self, row: int, now: float) -> None:
+        elapsed = now - self.since[row]
+        for rates, counts in zip(self.rates, self.counts):
+            counts[row] += rates[row] * elapsed
+        self.since[row] = now
+
+    def row_values(self, row: int, now: float) -> List[int]:
+        elapsed = now - self.since[row]
+        return [min(int(counts[row] + rates[row] * elapsed), maximum) for
+                rates, counts, maximum in zip(self.rates, self.counts,
+                                              self.maxima)]
+
+    def column_values(self, now: float) -> List[List[int]]:
+        elapsed = [now - since for since in self.since]
+        return [[min(int(count + rate * e), maximum) for count, rate, e in
+                 zip(counts, rates, elapsed)] for rates, counts, maximum in
+                zip(self.rates, self.counts, self.maxima)]
+
+    def crossings(self, now: float) -> Dict[int, int]:
+        # returns the alarm masks of newly-crossed thresholds, keyed by row
+        elapsed = [now - since for since in self.since]
+        crossed = {}
+        for (column, _, mask), limits, reported in zip(
+                self.tcas, self.limits, self.reported):
+            rows = [row for row, (limit, done, count, rate, e) in enumerate(
+                    zip(limits, reported, self.counts[column],
+                        self.rates[column], elapsed)) if
+                    limit and not done and count + rate * e > limit]
+            for row in rows:
+                reported[row] = 1
+                crossed[row] = crossed.get(row, 0) | mask
+        return crossed
+
+    def reset(self, row: int, now: float) -> bool:
+        # returns whether the row had reported TCAs
+        self.since[row] = now
+        for counts in self.counts:
+            counts[row] = 0.0
+        done = any(reported[row] for reported in self.reported)
+        for reported in self.reported:
+            reported[row] = 0
+        return done
+
+    def restart(self, now: float) -> List[Tuple[int, int]]:
+        # returns the keys of rows with reported TCAs
+        size = len(self.keys)
+        reported = {row for column in self.reported for row, done in
+                    enumerate(column) if done}
+        self.since = array.array('d', [now]) * size
+        self.counts = [array.array('d', [0.0]) * size for _ in self.columns]
+        self.reported = [bytearray(size) for _ in self.tcas]
+        return [self.keys[row] for row in sorted(reported) if
+                self.keys[row] is not None]
+
+
+class PmEngine(DatabaseListener):
+    """PM engine class.
+    """
+
+    # threshold data MIB classes, mapped to their indices in threshold_mibs
+    _threshold_classes = {mib.number: index for index, mib in
+                          enumerate(threshold_mibs)}
+
+    def __init__(self, database: Database, scheduler, *,
+                 profile: str = 'residential',
+                 interval: float = PM_INTERVAL, tca_interval: float = 10.0,
+                 notify: Callable[[int, int, int, int], None] = None,
+                 clock: Callable[[], float] = time.time):
+        """PM engine constructor.
+
+        Args:
+            database: the `Database`; the engine adds itself as a listener
+                and provides its `Database.get_current_data` values.
+
+            scheduler: the `Scheduler` that runs the interval rollovers and
+                TCA evaluations.
+
+            profile: default traffic profile name (see `profiles`).
+
+            interval: interval in seconds; defaults to 15 minutes.
+
+            tca_interval: TCA evaluation interval in seconds.
+
+            notify: function that's called (with ONU id, MIB class, MIB
+                instance and alarm bitmap) when TCAs are raised, e.g.
+                `AlarmNotifier.notify`.
+
+            clock: clock function; defaults to ``time.time`` (intervals are
+                aligned to it).
+        """
+        assert profile in profiles, 'unknown traffic profile %r' % profile
+        assert database._pm is None, 'database already has a PM engine'
+        self._database = database
+        self._scheduler = scheduler
+        self._profile = profiles[profile]
+        self._interval = interval
+        self._notify = notify
+        self._clock = clock
+
+        self._tables: Dict[int, _PmTable] = {mib.number: _PmTable(mib) for
+                                             mib in pm_mibs}
+        self._onu_profiles: Dict[int, TrafficProfile] = {}
+        self._onu_keys: Dict[int, Set[Tuple[int, int]]] = {}
+
+        # values of intervals at which ONUs' times were synchronized; their
+        # interval_end_time values count from these
+        self._synchronized: Dict[int, int] = {}
+
+        # history data of hibernating ONUs' instances, keyed by ONU id and
+        # (me_class, me_inst), that's stored when they're woken up
+        self._deferred: Dict[int, Dict[Tuple[int, int],
+                                       Tuple[int, Dict[str, int]]]] = {}
+
+        # threshold values 1-14, keyed by (onu_id, threshold data me_inst);
+        # the tables' threshold columns are rebuilt from these when dirty
+        self._thresholds: Dict[Tuple[int, int], List[int]] = {}
+        self._thresholds_dirty = False
+        self._lock = threading.Lock()
+
+        #: Number of completed intervals (modulo 256 this is the
+        #: ``interval_end_time`` value, unless the ONU's time has been
+        #: synchronized).
+        self.intervals = 0
+
+        #: Counters: ``evaluations`` and ``tcas`` (TCAs raised).
+        self.metrics = collections.Counter()
+
+        # add the listener first, so no instances are missed
+        database.add_listener(self)
+        database._pm = self
+        for onu_id in database.onu_ids:
+            with database.locks(onu_id):
+                self.onu_reloaded(onu_id, database.snapshot(onu_id))
+
+        now = clock()
+        self._timer = None
+        self._schedule((math.floor(now / interval) + 1) * interval)
+        self._task = scheduler.call_every(tca_interval, self.evaluate)
+
+    @property
+    def me_classes(self) -> Iterable[int]:
+        """The classes of the PM MIBs maintained by the engine."""
+        return self._tables.keys()
+
+    def close(self) -> None:
+        """Stop maintaining the counters."""
+        self._scheduler.cancel(self._timer)
+        self._scheduler.cancel(self._task)
+        self._database.remove_listener(self)
+        self._database._pm = None
+
+    def set_profile(self, onu_id: int, name: str) -> None:
+        """Set an ONU's traffic profile (the change takes effect now).
+
+        Args:
+            onu_id: ONU id.
+            name: traffic profile name (see `profiles`).
+        """
+        profile = profiles[name]
+        now = self._clock()
+        with self._lock:
+            self._onu_profiles[onu_id] = profile
+            for me_class, me_inst in self._onu_keys.get(onu_id, ()):
+                table = self._tables[me_class]
+                row = table.rows[(onu_id, me_inst)]
+                table.fold(row, now)
+                table.set_rates(row, profile)
+
+    def synchronize(self, onu_id: int) -> int:
+        """Synchronize an ONU's time (see `Database.sync_time`).
+
+        The ONU's counts for the current interval are discarded (as are its
+        TCAs), the ``interval_end_time`` of each of its PM instances is set to
+        0, and its intervals are numbered from there. The intervals remain
+        aligned to the engine's (i.e. the clock's) intervals.
+
+        Returns:
+            Number of PM instances.
+        """
+        now = self._clock()
+        cleared = []
+        with self._lock:
+            self._synchronized[onu_id] = self.intervals
+            keys = sorted(self._onu_keys.get(onu_id, ()))
+            for me_class, me_inst in keys:
+                table = self._tables[me_class]
+                if table.reset(table.rows[(onu_id, me_inst)], now):
+                    cleared.append((me_class, me_inst, table.tca_mask))
+
+        # as at interval ends, this is an autonomous change, so
+        # mib_data_sync isn't updated
+        for me_class, me_inst in keys:
+            self._database.set(onu_id, me_class, me_inst,
+                               self._tables[me_class].end_time_mask,
+                               {'interval_end_time': 0}, check_access=False,
+                               avc=True)
+        for me_class, me_inst, mask in cleared:
+            self._clear(onu_id, me_class, me_inst, mask)
+        logger.info('ONU %d synchronized; %d PM instances restarted' % (
+            onu_id, len(keys)))
+        return len(keys)
+
+    def current(self, onu_id: int, me_class: int, me_inst: int) -> \
+            Optional[Dict[str, tuple]]:
+        """Return an instance's counter values for the current interval.
+
+        Returns:
+            Counter values, keyed by attribute name, or ``None`` if the
+            instance isn't a PM instance.
+        """
+        table = self._tables.get(me_class, None)
+        now = self._clock()
+        with self._lock:
+            row = table.rows.get((onu_id, me_inst), None) if table else None
+            if row is None:
+                return None
+            values = table.row_values(row, now)
+        return {attr.name: (value,) for attr, value in zip(table.columns,
+                                                           values)}
+
+    def evaluate(self) -> int:
+        """Evaluate TCAs, raising (and notifying) any new ones.
+
+        This is called periodically, and at the end of each interval.
+
+        Returns:
+            Number of instances with new TCAs.
+        """
+        now = self._clock()
+        with self._lock:
+            crossed = self._crossings(now)
+        self._raise(crossed)
+        return len(crossed)
+
+    def _crossings(self, now: float) -> List[Tuple[int, int, int, int]]:
+        if self._thresholds_dirty:
+            self._update_limits()
+        crossed = []
+        for me_class, table in self._tables.items():
+            for row, mask in table.crossings(now).items():
+                onu_id, me_inst = table.keys[row]
+                crossed.append((onu_id, me_class, me_inst, mask))
+        self.metrics['evaluations'] += 1
+        return crossed
+
+    def _update_limits(self) -> None:
+        for table in self._tables.values():
+            for row, key in enumerate(table.keys):
+                values = key and self._thresholds.get(
+                        (key[0], table.threshold_ids[row]), None)
+                for (_, index, _), limits in zip(table.tcas, table.limits):
+                    limits[row] = values[index] if values else 0.0
+        self._thresholds_dirty = False
+
+    def _raise(self, crossed: List[Tuple[int, int, int, int]]) -> None:
+        for onu_id, me_class, me_inst, mask in crossed:
+            with self._database.locks(onu_id):
+                bitmap = self._database.alarms.get(onu_id, me_class,
+                                                   me_inst) | mask
+                self._database.set_alarm(me_class, me_inst, bitmap.to_bytes(
+                        ALARM_BITMAP_SIZE, 'big'), onu_id)
+            logger.info('ONU %d MIB %d #%d TCA %#x' % (onu_id, me_class,
+                                                       me_inst, mask))
+            self.metrics['tcas'] += 1
+            if self._notify:
+                self._notify(onu_id, me_class, me_inst, bitmap)
+
+    def _clear(self, onu_id: int, me_class: int, me_inst: int,
+               mask: int) -> None:
+        # TCAs are cleared without notification
+        with self._database.locks(onu_id):
+            bitmap = self._database.alarms.get(onu_id, me_class, me_inst)
+            if bitmap & mask:
+                self._database.set_alarm(me_class, me_inst, (
+                        bitmap & ~mask).to_bytes(ALARM_BITMAP_SIZE, 'big'),
+                                         onu_id)
+
+    def instance_changed(self, onu_id: int, me_class: int, me_inst: int,
+                         instance: Optional[Instance]) -> None:
+        if me_class in self._tables:
+            if instance is None:
+                self._remove(onu_id, me_class, me_inst)
+            else:
+                self._add(onu_id, me_class, me_inst, instance)
+        elif me_class in self._threshold_classes:
+            with self._lock:
+                self._set_thresholds(onu_id, me_class, me_inst, instance)
+
+    def onu_reloaded(self, onu_id: int, instances: PMap) -> None:
+        for me_class, me_inst in list(self._onu_keys.get(onu_id, ())):
+            self._remove(onu_id, me_class, me_inst)
+        with self._lock:
+            self._synchronized.pop(onu_id, None)
+            self._deferred.pop(onu_id, None)
+            for key in [key for key in self._thresholds if key[0] == onu_id]:
+                del self._thresholds[key]
+                self._thresholds_dirty = True
+        for (me_class, me_inst), instance in instances.items():
+            if me_class in self._tables:
+                self._add(onu_id, me_class, me_inst, instance)
+            elif me_class in self._threshold_classes:
+                with self._lock:
+                    self._set_thresholds(onu_id, me_class, me_inst, instance)
+
+    def onu_woken(self, onu_id: int) -> None:
+        with self._lock:
+            deferred = self._deferred.pop(onu_id, {})
+        for (me_class, me_inst), (mask, values) in deferred.items():
+            self._store_history(onu_id, me_class, me_inst, mask, values)
+
+    def _set_thresholds(self, onu_id: int, me_class: int, me_inst: int,
+                        instance: Optional[Instance]) -> None:
+        key = (onu_id, me_inst)
+        first = self._threshold_classes[me_class] * _THRESHOLDS_PER_MIB
+        values = self._thresholds.get(key, None)
+        if values is None:
+            values = self._thresholds[key] = [0] * (
+                    _THRESHOLDS_PER_MIB * len(threshold_mibs))
+        for index in range(_THRESHOLDS_PER_MIB):
+            values[first + index] = _value(instance.get(
+                    'threshold_value_%d' % (first + index + 1), None)) if \
+                instance else 0
+        if not any(values):
+            del self._thresholds[key]
+        self._thresholds_dirty = True
+
+    def _add(self, onu_id: int, me_class: int, me_inst: int,
+             instance: Instance) -> None:
+        now = self._clock()
+        with self._lock:
+            profile = self._onu_profiles.get(onu_id, self._profile)
+            table = self._tables[me_class]
+            row = table.add((onu_id, me_inst), now, profile)
+            threshold_id = _value(instance.get('threshold_data_1_2_ID', None))
+            if table.threshold_ids[row] != threshold_id:
+                table.threshold_ids[row] = threshold_id
+                self._thresholds_dirty = True
+            self._onu_keys.setdefault(onu_id, set()).add((me_class, me_inst))
+
+    def _remove(self, onu_id: int, me_class: int, me_inst: int) -> None:
+        with self._lock:
+            self._tables[me_class].remove((onu_id, me_inst))
+            self._onu_keys.get(onu_id, set()).discard((me_class, me_inst))
+
+    def _schedule(self, end: float) -> None:
+        self._timer = self._scheduler.call_later(end - self._clock(),
+                                                 self._rollover, end)
+
+    def _rollover(self, end: float) -> None:
+        # the counts are captured under the engine lock, but the history is
+        # stored without it, because the database calls take ONU locks (and
+        # listener calls take the engine lock with an ONU lock held)
+        self._schedule(end + self._interval)
+        with self._lock:
+            crossed = self._crossings(end)
+            self.intervals += 1
+            intervals = self.intervals
+            synchronized = dict(self._synchronized)
+            history = []
+            cleared = []
+            for me_class, table in self._tables.items():
+                columns = table.column_values(end)
+                for row, key in enumerate(table.keys):
+                    if key is not None:
+                        history.append((key[0], me_class, key[1], table, [
+                            column[row] for column in columns]))
+                cleared += [(onu_id, me_class, me_inst, table.tca_mask) for
+                            onu_id, me_inst in table.restart(end)]
+
+        self._raise(crossed)
+        database = self._database
+        hibernator = database._hibernator
+        deferred = 0
+        for onu_id, me_class, me_inst, table, values in history:
+            values = {attr.name: value for attr, value in zip(table.columns,
+                                                              values)}
+            values['interval_end_time'] = (intervals - synchronized.get(
+                    onu_id, 0)) % 256
+            mask = table.mask | table.end_time_mask
+            # hibernating ONUs aren't woken up (which would keep ONUs with
+            # PM instances awake); their history is stored (replacing any
+            # earlier history) when they're next woken up
+            with database.locks(onu_id):
+                if hibernator is not None and \
+                        hibernator.is_hibernating(onu_id):
+                    with self._lock:
+                        self._deferred.setdefault(onu_id, {})[
+                            (me_class, me_inst)] = (mask, values)
+                    deferred += 1
+                else:
+                    self._store_history(onu_id, me_class, me_inst, mask,
+                                        values)
+        for onu_id, me_class, me_inst, mask in cleared:
+            self._clear(onu_id, me_class, me_inst, mask)
+        logger.info('PM interval %d ended; %d instances updated (%d '
+                    'deferred), %d TCAs cleared' % (
+                        intervals % 256, len(history), deferred,
+                        len(cleared)))
+
+    def _store_history(self, onu_id: int, me_class: int, me_inst: int,
+                       mask: int, values: Dict[str, int]) -> None:
+        # this is an autonomous change, so mib_data_sync isn't updated
+        self._database.set(onu_id, me_class, me_inst, mask, values,
+                           check_access=False, avc=True)
+
+    def __str__(self):
+        return '%s(profile=%r, interval=%r, instances=%d)' % (
+            self.__class__.__name__, self._profile.name, self._interval,
+            sum(len(t.rows) for t in self._tables.values()))
+
+    __repr__ = __str__
@@ -0,0 +1,306 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Persistent (immutable) maps.
+
+A `PMap` is a read-only mapping. "Modifying" it returns a new map that
+shares all but the modified path with the old one, so old versions remain
+valid and unchanged, and keeping one (a snapshot) costs nothing.
+
+The implementation is a hash array mapped trie (HAMT): each node has up to 32
+children, indexed by 5 bits of the key's hash, and stores only the children
+that are present (with a bitmap saying which ones). Lookups, insertions and
+deletions touch at most one node per level, i.e. ``O(log32(n))`` nodes.
+
+Example::
+
+    v1 = PMap({(2, 0): {'mib_data_sync': (0,)}})
+    v2 = v1.set((11, 1), {'admin_state': (1,)})
+    len(v1), len(v2)  # 1, 2
+"""
+
+import collections.abc
+import logging
+
+from typing import Any, Hashable, Iterable, Iterator, Mapping, Optional, \
+    Tuple, Union
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+_BITS = 5
+_MASK = (1 << _BITS) - 1
+_HASH_MASK = (1 << 64) - 1
+
+# a leaf is a (hash, key, value) tuple
+_Leaf = Tuple[int, Hashable, Any]
+
+
+def _popcount(value: int) -> int:
+    return bin(value).count('1')
+
+
+def _hash(key: Hashable) -> int:
+    return hash(key) & _HASH_MASK
+
+
+class _Node:
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap: int, entries: tuple):
+        self.bitmap = bitmap
+        self.entries = entries
+
+
+class _Collision:
+    __slots__ = ('hash', 'entries')
+
+    def __init__(self, hash_: int, entries: Tuple[Tuple[Hashable, Any], ...]):
+        self.hash = hash_
+        self.entries = entries
+
+
+_Entry = Union[_Node, _Collision, _Leaf]
+
+_EMPTY = _Node(0, ())
+
+_missing = object()
+
+
+def _entry_hash(entry: _Entry) -> int:
+    return entry.hash if isinstance(entry, _Collision) else entry[0]
+
+
+def _merge(shift: int, entry1: _Entry, entry2: _Entry) -> _Node:
+    # the two entries have different hashes
+    index1 = (_entry_hash(entry1) >> shift) & _MASK
+    index2 = (_entry_hash(entry2) >> shift) & _MASK
+    if index1 == index2:
+        return _Node(1 << index1, (_merge(shift + _BITS, entry1, entry2),))
+    elif index1 < index2:
+        return _Node((1 << index1) | (1 << index2), (entry1, entry2))
+    else:
+        return _Node((1 << index1) | (1 << index2), (entry2, entry1))
+
+
+def _get(node: _Node, hash_: int, key: Hashable, default: Any) -> Any:
+    shift = 0
+    while True:
+        bit = 1 << ((hash_ >> shift) & _MASK)
+        if not node.bitmap & bit:
+            return default
+        entry = node.entries[_popcount(node.bitmap & (bit - 1))]
+        if isinstance(entry, _Node):
+            node = entry
+            shift += _BITS
+        elif isinstance(entry, _Collision):
+            if entry.hash == hash_:
+                for key_, value in entry.entries:
+                    if key_ == key:
+                        return value
+            return default
+        elif entry[0] == hash_ and entry[1] == key:
+            return entry[2]
+        else:
+            return default
+
+
+def _set(node: _Node, shift: int, leaf: _Leaf) -> Tuple[_Node, bool]:
+    # returns the new node and whether the key was added (rather than
+    # replaced); the node is returned unchanged if the value is unchanged
+    hash_, key, value = leaf
+    bit = 1 << ((hash_ >> shift) & _MASK)
+    index = _popcount(node.bitmap & (bit - 1))
+    entries = node.entries
+    if not node.bitmap & bit:
+        return _Node(node.bitmap | bit,
+                     entries[:index] + (leaf,) + entries[index:]), True
+
+    entry = entries[index]
+    added = False
+    if isinstance(entry, _Node):
+        new_entry, added = _set(entry, shift + _BITS, leaf)
+        if new_entry is entry:
+            return node, False
+    elif isinstance(entry, _Collision):
+        if entry.hash != hash_:
+            new_entry, added = _merge(shift + _BITS, entry, leaf), True
+        else:
+            items = [kv for kv in entry.entries if kv[0] != key]
+            added = len(items) == len(entry.entries)
+            new_entry = _Collision(hash_, tuple(items) + ((key, value),))
+    elif entry[0] != hash_:
+        new_entry, added = _merge(shift + _BITS, entry, leaf), True
+    elif entry[1] != key:
+        new_entry, added = _Collision(hash_, (entry[1:], (key, value))), True
+    elif entry[2] is value:
+        return node, False
+    else:
+        new_entry = leaf
+    return _Node(node.bitmap, entries[:index] + (new_entry,) +
+                 entries[index + 1:]), added
+
+
+def _delete(node: _Node, shift: int, hash_: int,
+            key: Hashable) -> Optional[_Entry]:
+    # returns the new node (the old one if the key isn't present), or a leaf
+    # (if a non-root node would be left with just this leaf), or None (if a
+    # non-root node would be left empty)
+    bit = 1 << ((hash_ >> shift) & _MASK)
+    if not node.bitmap & bit:
+        return node
+    index = _popcount(node.bitmap & (bit - 1))
+    entries = node.entries
+    entry = entries[index]
+    if isinstance(entry, _Node):
+        new_entry = _delete(entry, shift + _BITS, hash_, key)
+        if new_entry is entry:
+            return node
+    elif isinstance(entry, _Collision):
+        if entry.hash != hash_:
+            return node
+        items = tuple(kv for kv in entry.entries if kv[0] != key)
+        if len(items) == len(entry.entries):
+            return node
+        new_entry = (hash_,) + items[0] if len(items) == 1 else \
+            _Collision(hash_, items)
+    elif entry[0] != hash_ or entry[1] != key:
+        return node
+    else:
+        new_entry = None
+
+    if new_entry is None:
+        bitmap = node.bitmap & ~bit
+        entries = entries[:index] + entries[index + 1:]
+    else:
+        bitmap = node.bitmap
+        entries = entries[:index] + (new_entry,) + entries[index + 1:]
+    if shift > 0 and not entries:
+        return None
+    if shift > 0 and len(entries) == 1 and isinstance(entries[0], tuple):
+        return entries[0]
+    return _Node(bitmap, entries)
+
+
+def _iter(node: _Node) -> Iterator[Tuple[Hashable, Any]]:
+    for entry in node.entries:
+        if isinstance(entry, _Node):
+            yield from _iter(entry)
+        elif isinstance(entry, _Collision):
+            yield from entry.entries
+        else:
+            yield entry[1], entry[2]
+
+
+class PMap(collections.abc.Mapping):
+    """Persistent map class.
+
+    A `PMap` supports the read-only ``Mapping`` interface. The "modifying"
+    methods (`set`, `delete` and `update`) return new maps.
+
+    Note:
+        The map itself is immutable, but its values are whatever they are.
+        Values that are shared between versions mustn't be modified in
+        place.
+    """
+
+    __slots__ = ('_root', '_len')
+
+    def __init__(self, items: Union[Mapping, Iterable[Tuple[Hashable, Any]],
+                                    None] = None):
+        """Persistent map constructor.
+
+        Args:
+            items: initial items (a mapping or an iterable of key-value
+                pairs).
+        """
+        self._root = _EMPTY
+        self._len = 0
+        if items:
+            self._root, self._len = self._updated(items)
+
+    @classmethod
+    def _new(cls, root: _Node, len_: int) -> 'PMap':
+        pmap = cls.__new__(cls)
+        pmap._root = root
+        pmap._len = len_
+        return pmap
+
+    def _updated(self, items: Union[Mapping, Iterable[Tuple[Hashable, Any]]]) \
+            -> Tuple[_Node, int]:
+        if isinstance(items, collections.abc.Mapping):
+            items = items.items()
+        root, len_ = self._root, self._len
+        for key, value in items:
+            root, added = _set(root, 0, (_hash(key), key, value))
+            len_ += added
+        return root, len_
+
+    def set(self, key: Hashable, value: Any) -> 'PMap':
+        """Return a new map in which ``key`` maps to ``value``.
+
+        Returns this map if ``key`` already maps to ``value`` (identity).
+        """
+        root, added = _set(self._root, 0, (_hash(key), key, value))
+        return self if root is self._root else self._new(root,
+                                                         self._len + added)
+
+    def delete(self, key: Hashable) -> 'PMap':
+        """Return a new map without ``key``.
+
+        Returns this map if ``key`` isn't present.
+        """
+        root = _delete(self._root, 0, _hash(key), key)
+        return self if root is self._root else self._new(root, self._len - 1)
+
+    def update(self, items: Union[Mapping, Iterable[Tuple[Hashable, Any]]]) \
+            -> 'PMap':
+        """Return a new map with the specified items added or replaced."""
+        root, len_ = self._updated(items)
+        return self if root is self._root else self._new(root, len_)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        return _get(self._root, _hash(key), key, default)
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = _get(self._root, _hash(key), key, _missing)
+        if value is _missing:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        return _get(self._root, _hash(key), key, _missing) is not _missing
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return (key for key, _ in _iter(self._root))
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        # this is more efficient than the Mapping implementation, but it
+        # returns an iterator rather than a view
+        return _iter(self._root)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, PMap) and other._root is self._root:
+            return True
+        return super().__eq__(other)
+
+    __hash__ = None
+
+    def __str__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(
+                '%r: %r' % item for item in _iter(self._root)))
+
+    __repr__ = __str__
@@ -0,0 +1,188 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""ONU reboot simulation.
+
+When an ONU is rebooted (by a `reboot <reboot_action>` command, or by
+`Database.reboot_all`, e.g. to simulate a mass reboot after a power cut), it
+goes offline for its boot time: the `Endpoint` drops all the messages that it
+would receive or send. When it has booted, its MIB is reset (as if by
+`Database.reset_all`) and it's back online.
+
+The `Rebooter` doesn't use a timer per ONU. Rebooting ONUs are held in a heap,
+ordered by boot completion time, and a single periodic `Scheduler` task runs
+`Rebooter.step`, which brings up all the ONUs that are due. The task only
+runs while ONUs are rebooting. Boot times can be randomized (``jitter``), so
+that the ONUs of a mass reboot don't all come back at the same moment.
+
+Example::
+
+    rebooter = Rebooter(database, scheduler, boot_time=30.0, jitter=10.0)
+    database.reboot_all(range(100))
+    database.is_online(0)   # False until it has booted
+"""
+
+import collections
+import heapq
+import logging
+import random
+import threading
+import time
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .database import Database
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+
+class Rebooter:
+    """Rebooter class.
+    """
+
+    def __init__(self, database: Database, scheduler, *,
+                 boot_time: float = 30.0, jitter: float = 0.0,
+                 step: float = 0.1, seed: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """Rebooter constructor.
+
+        Args:
+            database: the `Database`; the rebooter attaches itself to it, so
+                it handles `Database.reboot` and `Database.reboot_all`.
+
+            scheduler: the `Scheduler` that runs `step`.
+
+            boot_time: default time (in seconds) for which rebooting ONUs are
+                offline.
+
+            jitter: maximum random time (in seconds) that's added to each
+                ONU's boot time.
+
+            step: interval (in seconds) at which `step` is run while ONUs are
+                rebooting.
+
+            seed: random number generator seed, for reproducible boot times.
+
+            clock: clock function; defaults to ``time.monotonic``.
+        """
+        assert database._rebooter is None, 'database already has a rebooter'
+        assert boot_time >= 0.0 and jitter >= 0.0, 'invalid boot time'
+        self._database = database
+        self._scheduler = scheduler
+        self._boot_time = boot_time
+        self._jitter = jitter
+        self._step = step
+        self._random = random.Random(seed)
+        self._clock = clock
+
+        # offline ONUs, mapped to their boot completion times, and a heap of
+        # (time, onu_id) tuples; an ONU that's rebooted again while offline
+        # gets a new heap entry, and its old one is ignored
+        self._offline: Dict[int, float] = {}
+        self._pending: List[Tuple[float, int]] = []
+        self._task = None
+        self._lock = threading.Lock()
+
+        #: Counters: ``reboots`` and ``boots``.
+        self.metrics = collections.Counter()
+
+        database._rebooter = self
+
+    def close(self) -> None:
+        """Stop handling reboots; rebooting ONUs are brought up at once."""
+        with self._lock:
+            self._scheduler.cancel(self._task)
+            self._task = None
+            pending = [(until, onu_id) for onu_id, until in
+                       self._offline.items()]
+        self._boot(pending)
+        self._database._rebooter = None
+
+    def reboot(self, onu_ids: Iterable[int],
+               boot_time: Optional[float] = None) -> int:
+        """Reboot ONUs, i.e. take them offline until they have booted.
+
+        Args:
+            onu_ids: ONU ids (unknown ONU ids are ignored).
+            boot_time: boot time in seconds; defaults to the rebooter's.
+
+        Returns:
+            Number of ONUs that were rebooted.
+        """
+        boot_time = self._boot_time if boot_time is None else boot_time
+        known = set(self._database.onu_ids)
+        now = self._clock()
+        count = 0
+        with self._lock:
+            for onu_id in onu_ids:
+                if onu_id not in known:
+                    continue
+                until = now + boot_time + self._random.uniform(
+                        0.0, self._jitter)
+                self._offline[onu_id] = until
+                heapq.heappush(self._pending, (until, onu_id))
+                count += 1
+            if self._pending and self._task is None:
+                self._task = self._scheduler.call_every(self._step,
+                                                        self.step)
+            self.metrics['reboots'] += count
+        logger.info('rebooting %d ONUs' % count)
+        return count
+
+    def is_offline(self, onu_id: int) -> bool:
+        """Whether an ONU is offline, i.e. is rebooting."""
+        return onu_id in self._offline
+
+    def step(self) -> int:
+        """Bring up the ONUs that have booted.
+
+        Returns:
+            Number of ONUs that were brought up.
+        """
+        now = self._clock()
+        due = []
+        with self._lock:
+            while self._pending and self._pending[0][0] <= now:
+                until, onu_id = heapq.heappop(self._pending)
+                if self._offline.get(onu_id, None) == until:
+                    due.append((until, onu_id))
+            if not self._pending and self._task is not None:
+                self._scheduler.cancel(self._task)
+                self._task = None
+        return self._boot(due)
+
+    def _boot(self, due: List[Tuple[float, int]]) -> int:
+        # the MIBs are reset while the ONUs are still offline, and then the
+        # ONUs are brought online unless they've been rebooted again
+        if not due:
+            return 0
+        self._database.reset_all(onu_id for _, onu_id in due)
+        count = 0
+        with self._lock:
+            for until, onu_id in due:
+                if self._offline.get(onu_id, None) == until:
+                    del self._offline[onu_id]
+                    count += 1
+            self.metrics['boots'] += count
+        logger.info('%d ONUs booted' % count)
+        return count
+
+    def __len__(self) -> int:
+        return len(self._offline)
+
+    def __str__(self):
+        return '%s(boot_time=%r, jitter=%r, offline=%d)' % (
+            self.__class__.__name__, self._boot_time, self._jitter,
+            len(self._offline))
+
+    __repr__ = __str__
@@ -0,0 +1,181 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""MIB instance reference index.
+
+Provisioned MIB instances reference each other, e.g. a GEM interworking TP
+references its GEM port network CTP, which references a T-CONT and priority
+queues. The references are described by the MIBs' `Refs <Ref>`.
+
+The `Database` keeps a `ReferenceIndex` which holds, for each ONU, the
+references made by each instance and (the reverse) the instances that
+reference each instance. It's updated incrementally (via a database
+listener) as instances are created, set, deleted and reset, so:
+
+* checking whether an instance's references are dangling costs one lookup
+  per reference attribute
+* finding the instances that reference an instance (e.g. to refuse, or to
+  cascade, its deletion) costs work proportional to the number of referrers
+
+rather than a scan of the ONU's MIB.
+
+Example::
+
+    index = ReferenceIndex()
+    index.update(onu_id, me_class, me_inst, instance)
+    index.referrers(onu_id, 268, me_inst)  # [(266, 1, 'gem_port_...'), ...]
+"""
+
+import logging
+
+from typing import Any, Collection, Dict, Iterable, List, Optional, Set, \
+    Tuple
+
+from .mib import mibs
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+# an instance: MIB class and MIB instance
+Key = Tuple[int, int]
+
+# a reference: referencing instance and attribute name
+Referrer = Tuple[int, int, str]
+
+# an instance's attribute values, keyed by name
+Instance = Dict[str, Any]
+
+
+def instance_refs(me_class: int, instance: Optional[Instance]) -> \
+        Dict[str, Key]:
+    """Return the (non-null) references made by an instance.
+
+    Args:
+        me_class: MIB class.
+        instance: the instance (or ``None``).
+
+    Returns:
+        Referenced ``(me_class, me_inst)`` keys, keyed by attribute name.
+    """
+    mib = mibs.get(me_class, None)
+    refs = {}
+    if mib is not None and instance is not None:
+        for ref in mib._refs:
+            target = ref.resolve(instance)
+            if target is not None:
+                refs[ref._name] = target
+    return refs
+
+
+class ReferenceIndex:
+    """Reference index class.
+
+    It's updated, and should be queried, with the ONU's lock held.
+    """
+
+    def __init__(self):
+        # per ONU: each instance's references, keyed by attribute name, and
+        # each referenced instance's referrers
+        self._refs: Dict[int, Dict[Key, Dict[str, Key]]] = {}
+        self._referrers: Dict[int, Dict[Key, Set[Referrer]]] = {}
+
+    def references(self, onu_id: int, me_class: int, me_inst: int) -> \
+            Dict[str, Key]:
+        """Return the references made by an instance.
+
+        Returns:
+            Referenced ``(me_class, me_inst)`` keys, keyed by attribute name.
+        """
+        return dict(self._refs.get(onu_id, {}).get((me_class, me_inst), {}))
+
+    def referrers(self, onu_id: int, me_class: int, me_inst: int) -> \
+            List[Referrer]:
+        """Return the references to an instance.
+
+        Returns:
+            Sorted list of ``(me_class, me_inst, attr_name)`` tuples.
+        """
+        return sorted(self._referrers.get(onu_id, {}).get(
+                (me_class, me_inst), ()))
+
+    def dangling(self, onu_id: int, keys: Collection[Key]) -> \
+            List[Tuple[int, int, str, Key]]:
+        """Return an ONU's dangling references.
+
+        Args:
+            onu_id: ONU id.
+            keys: the ONU's ``(me_class, me_inst)`` keys (e.g. an
+                `InstanceIndex`).
+
+        Returns:
+            Sorted list of ``(me_class, me_inst, attr_name, target)`` tuples.
+        """
+        return sorted(referrer + (target,) for target, referrers in
+                      self._referrers.get(onu_id, {}).items() if
+                      target not in keys for referrer in referrers)
+
+    def update(self, onu_id: int, me_class: int, me_inst: int,
+               instance: Optional[Instance]) -> None:
+        """Update an instance's references (``instance`` is ``None`` if it
+        has been deleted)."""
+        # most MIBs have no references, and most changes don't change them
+        refs = instance_refs(me_class, instance)
+        old = self._refs.get(onu_id, {}).get((me_class, me_inst), {})
+        if refs != old:
+            self._update(onu_id, (me_class, me_inst), old, refs)
+
+    def reload(self, onu_id: int,
+               instances: Iterable[Tuple[Key, Instance]] = ()) -> None:
+        """Replace all of an ONU's references.
+
+        Args:
+            onu_id: ONU id.
+            instances: the ONU's ``((me_class, me_inst), instance)`` items.
+        """
+        self._refs.pop(onu_id, None)
+        self._referrers.pop(onu_id, None)
+        for (me_class, me_inst), instance in instances:
+            refs = instance_refs(me_class, instance)
+            if refs:
+                self._update(onu_id, (me_class, me_inst), {}, refs)
+
+    def _update(self, onu_id: int, source: Key, old: Dict[str, Key],
+                new: Dict[str, Key]) -> None:
+        refs = self._refs.setdefault(onu_id, {})
+        referrers = self._referrers.setdefault(onu_id, {})
+        for name, target in old.items():
+            if new.get(name, None) != target:
+                targets = referrers[target]
+                targets.discard(source + (name,))
+                if not targets:
+                    del referrers[target]
+        for name, target in new.items():
+            if old.get(name, None) != target:
+                referrers.setdefault(target, set()).add(source + (name,))
+        if new:
+            refs[source] = new
+        else:
+            del refs[source]
+            if not refs:
+                del self._refs[onu_id]
+        if not referrers:
+            del self._referrers[onu_id]
+
+    def __len__(self) -> int:
+        return sum(len(refs) for onu_refs in self._refs.values() for refs in
+                   onu_refs.values())
+
+    def __str__(self):
+        return '%s(onus=%d, references=%d)' % (
+            self.__class__.__name__, len(self._refs), len(self))
+
+    __repr__ = __str__
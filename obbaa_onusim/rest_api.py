@@ -3,6 +3,7 @@ import json
 from obbaa_onusim.database import Results
 from obbaa_onusim import *
 from obbaa_onusim.mib import mibs
+from obbaa_onusim.service_graph import is_complete
 from obbaa_onusim.util import indices
 import onusim as onusim
 from sanic import Sanic
@@ -65,7 +66,7 @@ def get_me(req, mask):
     return req
 
 def set_me(req, mask, ordred_val):
-    result = ConnectionInfo.get_connection().database.set(req["onu_id"], req["class_id"], req["instance_id"], mask[1], input_values_formating(ordred_val ,req["class_id"]), check_access=False)
+    result = ConnectionInfo.get_connection().database.set(req["onu_id"], req["class_id"], req["instance_id"], mask[1], input_values_formating(ordred_val ,req["class_id"]), check_access=False, avc=True)
     req['status'] = result.reason
     return req
 
@@ -75,7 +76,7 @@ def create_me(req, ordred_val):
     return req
 
 def delete_me(req):
-    result = ConnectionInfo.get_connection().database.delete(req["onu_id"], req["class_id"], req["instance_id"])
+    result = ConnectionInfo.get_connection().database.delete(req["onu_id"], req["class_id"], req["instance_id"], cascade=bool(req.get("cascade", False)))
     req['status'] = result.reason
     return req
 
@@ -88,6 +89,37 @@ def send_alarm(req):
     req['status'] = result.reason
     return req
 
+def reboot_onus(req):
+    # reboots ONUs onu_id through onu_id_last (defaults to onu_id); with no
+    # onu_id, reboots all the ONUs
+    onu_ids = None
+    if req.get("onu_id") is not None:
+        first = int(req["onu_id"])
+        last = int(req.get("onu_id_last", first))
+        onu_ids = range(first, last + 1)
+    count = ConnectionInfo.get_connection().database.reboot_all(
+            onu_ids, req.get("boot_time"))
+    req['count'] = count
+    req['status'] = 0
+    return req
+
+def service_paths(req):
+    # each path lists its MEs from the UNI towards the PON; it's complete if
+    # it reaches a T-CONT
+    database = ConnectionInfo.get_connection().database
+    if req.get("onu_id") not in database.onu_ids:
+        req['paths'] = []
+        req['status'] = 0b0101
+        return req
+    paths = database.service_paths(req["onu_id"])
+    req['paths'] = [{"complete": is_complete(path),
+                     "mes": [{"class_id": me_class, "instance_id": me_inst,
+                              "name": mibs[me_class].name}
+                             for me_class, me_inst in path]}
+                    for path in paths]
+    req['status'] = 0
+    return req
+
 def process_request(requests) -> json:
     result = {"responses": []}
     for req in requests:
@@ -95,6 +127,10 @@ def process_request(requests) -> json:
             response = delete_me(req)
         elif req["action"] == "ALARM":
             response = send_alarm(req)
+        elif req["action"] == "REBOOT":
+            response = reboot_onus(req)
+        elif req["action"] == "SERVICE_PATHS":
+            response = service_paths(req)
         else:
             mask, ordred_val = create_mask(req)
             if req["action"] == "SET":                  
@@ -0,0 +1,205 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Background task scheduler.
+
+A `Scheduler` is a thread that runs a `TimerWheel`, so one-off and periodic
+tasks (e.g. hibernation sweeps) can be scheduled from any thread.
+
+Callbacks are run on the scheduler thread without any scheduler lock held, so
+they can take other locks (e.g. ONU locks) and can schedule further tasks.
+They should be reasonably quick, because they delay other tasks.
+
+Example::
+
+    scheduler = Scheduler(tick=0.1)
+    scheduler.start()
+    scheduler.call_later(5.0, print, 'five seconds later')
+    task = scheduler.call_every(60.0, sweep)
+    ...
+    scheduler.cancel(task)
+    scheduler.stop()
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from typing import Any, Callable, Union
+
+from .timer import Timer, TimerWheel
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+
+class PeriodicTask:
+    """A periodic task (returned by `Scheduler.call_every`).
+    """
+
+    __slots__ = ('interval', 'callback', 'args', 'cancelled', '_timer')
+
+    def __init__(self, interval: float, callback: Callable[..., Any],
+                 args: tuple):
+        #: Interval in seconds.
+        self.interval = interval
+
+        #: Callback (invoked with ``args`` every ``interval`` seconds).
+        self.callback = callback
+
+        #: Callback arguments.
+        self.args = args
+
+        #: Whether the task has been cancelled.
+        self.cancelled = False
+
+        self._timer = None
+
+    def __repr__(self):
+        return '%s(interval=%r, callback=%r, cancelled=%r)' % (
+            self.__class__.__name__, self.interval, self.callback,
+            self.cancelled)
+
+
+class Scheduler:
+    """Scheduler class.
+    """
+
+    def __init__(self, *, tick: float = 0.1, slots: int = 512,
+                 clock: Callable[[], float] = time.monotonic):
+        """Scheduler constructor.
+
+        Args:
+            tick: timer resolution in seconds; tasks run at most one tick
+                late (plus the time taken by earlier tasks).
+            slots: number of timer wheel slots.
+            clock: clock function; defaults to ``time.monotonic``.
+        """
+        self._tick = tick
+        self._wheel = TimerWheel(tick=tick, slots=slots, clock=clock)
+        self._cond = threading.Condition()
+        self._due = collections.deque()
+        self._thread = None
+        self._stopping = False
+
+        #: Counters: ``run`` and ``failed``.
+        self.metrics = collections.Counter()
+
+    def start(self) -> None:
+        """Start the scheduler thread (it's a daemon thread)."""
+        assert self._thread is None, 'scheduler already started'
+        self._thread = threading.Thread(target=self._run, name='scheduler',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the scheduler thread; tasks that are due aren't run."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def now(self) -> float:
+        """Return the current time, per the scheduler's clock."""
+        return self._wheel.now()
+
+    def call_later(self, delay: float, callback: Callable[..., Any],
+                   *args) -> Timer:
+        """Run a task once, after a delay.
+
+        Args:
+            delay: delay in seconds.
+            callback: function to call.
+            *args: arguments to pass to the callback.
+
+        Returns:
+            Timer, which can be passed to `cancel`.
+        """
+        with self._cond:
+            return self._wheel.schedule(delay, self._due.append,
+                                        (callback, args))
+
+    def call_every(self, interval: float, callback: Callable[..., Any],
+                   *args, delay: float = None) -> PeriodicTask:
+        """Run a task periodically.
+
+        Args:
+            interval: interval in seconds.
+            callback: function to call.
+            *args: arguments to pass to the callback.
+            delay: delay before the first run; defaults to ``interval``.
+
+        Returns:
+            Task, which can be passed to `cancel`.
+        """
+        assert interval > 0
+        task = PeriodicTask(interval, callback, args)
+        with self._cond:
+            task._timer = self._wheel.schedule(
+                    interval if delay is None else delay, self._due.append,
+                    (self._periodic, (task,)))
+        return task
+
+    def _periodic(self, task: PeriodicTask) -> None:
+        if not task.cancelled:
+            try:
+                task.callback(*task.args)
+            finally:
+                with self._cond:
+                    if not task.cancelled:
+                        task._timer = self._wheel.schedule(
+                                task.interval, self._due.append,
+                                (self._periodic, (task,)))
+
+    def cancel(self, task: Union[Timer, PeriodicTask, None]) -> None:
+        """Cancel a task (it's OK if it has already run or been cancelled).
+        """
+        with self._cond:
+            if isinstance(task, PeriodicTask):
+                task.cancelled = True
+                self._wheel.cancel(task._timer)
+            else:
+                self._wheel.cancel(task)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                self._wheel.advance()
+                due = list(self._due)
+                self._due.clear()
+                if not due:
+                    self._cond.wait(self._tick)
+                    continue
+
+            for callback, args in due:
+                try:
+                    callback(*args)
+                    self.metrics['run'] += 1
+                except Exception as e:
+                    self.metrics['failed'] += 1
+                    logger.error('task %r failed: %s: %s' % (
+                        callback, e.__class__.__name__, e))
+
+    def __len__(self) -> int:
+        return len(self._wheel)
+
+    def __str__(self):
+        return '%s(tick=%r, tasks=%d)' % (self.__class__.__name__,
+                                          self._tick, len(self._wheel))
+
+    __repr__ = __str__
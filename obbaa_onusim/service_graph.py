@@ -0,0 +1,251 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-ONU service-path graph.
+
+A service path is a chain of provisioned MIB instances that carries a
+service between a UNI and the PON, e.g.::
+
+    PPTP Ethernet UNI -> MAC bridge port -> MAC bridge -> MAC bridge port ->
+    802.1p mapper -> GEM interworking TP -> GEM port network CTP ->
+    T-CONT / priority queue
+
+The `ServiceGraph` holds, for each ONU, the edges between such instances,
+i.e. the links made by their pointer attributes (see `Ref`) in the
+upstream direction. A bridge port's ``tp_type`` determines its direction:
+UNI-side ports link the UNI to their bridge, and ANI-side ports link their
+bridge to their mapper or GEM interworking TP.
+
+The `Database` keeps a `ServiceGraph`, which is updated incrementally (via
+a database listener) as service instances are created, set, deleted and
+reset; other instances are ignored. An ONU's paths are found by following
+the edges from its UNIs, so this costs work proportional to the size of its
+service graph rather than of its MIB, and they're cached until the ONU's
+service instances next change.
+
+Example::
+
+    graph = ServiceGraph()
+    graph.update(onu_id, me_class, me_inst, instance)
+    for path in graph.paths(onu_id, index):
+        print(path, is_complete(path))
+"""
+
+import logging
+
+from typing import Collection, Dict, Iterable, List, Optional, Set, Tuple
+
+from .instance_index import InstanceIndex
+from .mibs.gem_iw_tp import gem_iw_tp_mib
+from .mibs.gem_port_net_ctp import gem_port_net_ctp_mib
+from .mibs.ieee_8021p_mapper_svc_prof import ieee_8021p_mapper_svc_prof_mib
+from .mibs.mac_bridge_port_config import mac_bridge_port_conf_mib
+from .mibs.mac_bridge_svc_prof import mac_bridge_svc_prof_mib
+from .mibs.pptp_eth_uni import pptp_eth_uni_mib
+from .mibs.priority_queue import priority_queue_mib
+from .mibs.tcont import tcont_mib
+from .references import Instance, Key, instance_refs
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+# an edge: upstream instance and downstream instance
+Edge = Tuple[Key, Key]
+
+# a path: instances from a UNI towards the PON
+Path = Tuple[Key, ...]
+
+UNI = pptp_eth_uni_mib.number
+BRIDGE = mac_bridge_svc_prof_mib.number
+BRIDGE_PORT = mac_bridge_port_conf_mib.number
+MAPPER = ieee_8021p_mapper_svc_prof_mib.number
+GEM_IW_TP = gem_iw_tp_mib.number
+GEM_PORT = gem_port_net_ctp_mib.number
+TCONT = tcont_mib.number
+PRIORITY_QUEUE = priority_queue_mib.number
+
+#: MIB classes whose instances can be in service paths.
+SERVICE_CLASSES = frozenset((UNI, BRIDGE, BRIDGE_PORT, MAPPER, GEM_IW_TP,
+                             GEM_PORT, TCONT, PRIORITY_QUEUE))
+
+# MIB classes that end paths (a GEM port's upstream T-CONT and priority
+# queue are both included in its paths)
+_TERMINAL_CLASSES = frozenset((TCONT, PRIORITY_QUEUE))
+
+
+def instance_edges(me_class: int, me_inst: int,
+                   instance: Optional[Instance]) -> Set[Edge]:
+    """Return the service graph edges made by an instance's references.
+
+    Each edge is made by only one instance (one of its ends), so the
+    instance's edges can be replaced when it changes.
+
+    Args:
+        me_class: MIB class.
+        me_inst: MIB instance.
+        instance: the instance (or ``None``).
+
+    Returns:
+        Set of ``(upstream, downstream)`` edges.
+    """
+    edges = set()
+    if me_class not in SERVICE_CLASSES or instance is None:
+        return edges
+    key = (me_class, me_inst)
+    refs = instance_refs(me_class, instance)
+    if me_class == BRIDGE_PORT:
+        bridge = refs.get('bridge_id_ptr', None)
+        tp = refs.get('tp_ptr', None)
+        if tp is not None and tp[0] == UNI:
+            edges.add((tp, key))
+            if bridge is not None:
+                edges.add((key, bridge))
+        elif tp is not None:
+            edges.add((key, tp))
+            if bridge is not None:
+                edges.add((bridge, key))
+    elif me_class == MAPPER:
+        # the mapper's tp_ptr only references a UNI if it's used without a
+        # bridge
+        for name, target in refs.items():
+            edges.add((target, key) if name == 'tp_ptr' else (key, target))
+    elif me_class == GEM_IW_TP:
+        gem_port = refs.get('gem_port_net_ctp_conn_ptr', None)
+        if gem_port is not None:
+            edges.add((key, gem_port))
+    elif me_class == GEM_PORT:
+        for name in ('tcont_ptr', 'traffic_mgmt_ptr_us'):
+            if name in refs:
+                edges.add((key, refs[name]))
+    return edges
+
+
+def is_complete(path: Path) -> bool:
+    """Whether a path reaches a T-CONT."""
+    return any(me_class == TCONT for me_class, _ in path)
+
+
+class ServiceGraph:
+    """Service graph class.
+
+    It's updated, and should be queried, with the ONU's lock held.
+    """
+
+    def __init__(self):
+        # per ONU: each instance's edges, each instance's downstream
+        # instances, and the cached paths
+        self._edges: Dict[int, Dict[Key, Set[Edge]]] = {}
+        self._downstream: Dict[int, Dict[Key, Set[Key]]] = {}
+        self._paths: Dict[int, List[Path]] = {}
+
+    def update(self, onu_id: int, me_class: int, me_inst: int,
+               instance: Optional[Instance]) -> None:
+        """Update an instance's edges (``instance`` is ``None`` if it has
+        been deleted)."""
+        if me_class not in SERVICE_CLASSES:
+            return
+        # the instance's existence might affect the paths even if its edges
+        # haven't changed
+        self._paths.pop(onu_id, None)
+        key = (me_class, me_inst)
+        edges = instance_edges(me_class, me_inst, instance)
+        old = self._edges.get(onu_id, {}).get(key, set())
+        if edges != old:
+            self._update(onu_id, key, old, edges)
+
+    def reload(self, onu_id: int,
+               instances: Iterable[Tuple[Key, Instance]] = ()) -> None:
+        """Replace all of an ONU's edges.
+
+        Args:
+            onu_id: ONU id.
+            instances: the ONU's ``((me_class, me_inst), instance)`` items.
+        """
+        self._edges.pop(onu_id, None)
+        self._downstream.pop(onu_id, None)
+        self._paths.pop(onu_id, None)
+        for (me_class, me_inst), instance in instances:
+            edges = instance_edges(me_class, me_inst, instance)
+            if edges:
+                self._update(onu_id, (me_class, me_inst), set(), edges)
+
+    def paths(self, onu_id: int, index: InstanceIndex) -> List[Path]:
+        """Return an ONU's service paths.
+
+        Each path starts at a UNI and follows the edges between existing
+        instances until it reaches a GEM port (when it ends with the GEM
+        port's T-CONT and priority queue, if they exist) or can't be
+        followed any further. UNIs that aren't linked to anything aren't
+        included.
+
+        Args:
+            onu_id: ONU id.
+            index: the ONU's `InstanceIndex`.
+
+        Returns:
+            Sorted list of paths, each a tuple of ``(me_class, me_inst)``
+            keys.
+        """
+        paths = self._paths.get(onu_id, None)
+        if paths is None:
+            paths = []
+            downstream = self._downstream.get(onu_id, {})
+            for me_inst in index.instances(UNI):
+                if (UNI, me_inst) in downstream:
+                    self._walk(downstream, index, ((UNI, me_inst),), paths)
+            self._paths[onu_id] = paths
+        return list(paths)
+
+    @classmethod
+    def _walk(cls, downstream: Dict[Key, Set[Key]], index: Collection[Key],
+              path: Path, paths: List[Path]) -> None:
+        # the path check guards against (misprovisioned) loops
+        keys = sorted(key for key in downstream.get(path[-1], ()) if
+                      key in index and key not in path)
+        terminals = tuple(key for key in keys if key[0] in _TERMINAL_CLASSES)
+        keys = [key for key in keys if key[0] not in _TERMINAL_CLASSES]
+        if not keys:
+            paths.append(path + terminals)
+        for key in keys:
+            cls._walk(downstream, index, path + (key,), paths)
+
+    def _update(self, onu_id: int, source: Key, old: Set[Edge],
+                new: Set[Edge]) -> None:
+        edges = self._edges.setdefault(onu_id, {})
+        downstream = self._downstream.setdefault(onu_id, {})
+        for upstream, key in old - new:
+            keys = downstream[upstream]
+            keys.discard(key)
+            if not keys:
+                del downstream[upstream]
+        for upstream, key in new - old:
+            downstream.setdefault(upstream, set()).add(key)
+        if new:
+            edges[source] = new
+        else:
+            del edges[source]
+            if not edges:
+                del self._edges[onu_id]
+        if not downstream:
+            del self._downstream[onu_id]
+
+    def __len__(self) -> int:
+        return sum(len(edges) for onu_edges in self._edges.values() for
+                   edges in onu_edges.values())
+
+    def __str__(self):
+        return '%s(onus=%d, edges=%d, cached=%d)' % (
+            self.__class__.__name__, len(self._edges), len(self),
+            len(self._paths))
+
+    __repr__ = __str__
@@ -0,0 +1,223 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Multi-part operation ("next" sequence) sessions.
+
+Several OMCI operations consist of an initial command followed by a sequence
+of "next" commands, e.g. `MIB upload <mib_upload_action>` followed by `MIB
+upload next <mib_upload_next_action>`. The initial command latches some state
+(a snapshot) and the "next" commands retrieve it piece by piece.
+
+This state is held in `Session` instances that are managed by a
+`SessionManager`. Sessions are keyed by ``(onu_id, operation, me_class,
+me_inst)``, so sequences for different ONUs (or different operations) can't
+interfere with each other. Sessions expire after a period of inactivity (via a
+`TimerWheel`) and the total number of sessions is bounded (the least recently
+used session is evicted). The manager is thread-safe.
+
+Example::
+
+    sessions = SessionManager(timeout=60)
+    sessions.open(onu_id, 'mib-upload', 2, 0, bodies, max_seq_num=9)
+    ...
+    session = sessions.get(onu_id, 'mib-upload', 2, 0)
+    if session is None:
+        ...  # never opened, expired or evicted
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .timer import Timer, TimerWheel
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+SessionKey = Tuple[int, str, int, int]
+
+
+class Session:
+    """Session class (created by `SessionManager.open`).
+    """
+
+    __slots__ = ('key', 'data', 'extended', 'max_seq_num', 'created',
+                 '_timer')
+
+    def __init__(self, key: SessionKey, data: Any, *, extended: bool,
+                 max_seq_num: int, created: float):
+        #: Session key, i.e. ``(onu_id, operation, me_class, me_inst)``.
+        self.key = key
+
+        #: Operation-specific data, e.g. the latched MIB upload bodies.
+        self.data = data
+
+        #: Whether the session was opened by an extended message.
+        self.extended = extended
+
+        #: Maximum valid "next" sequence number.
+        self.max_seq_num = max_seq_num
+
+        #: Creation time (per the manager's clock).
+        self.created = created
+
+        self._timer: Optional[Timer] = None
+
+    def __str__(self):
+        return '%s(key=%r, extended=%r, max_seq_num=%d)' % (
+            self.__class__.__name__, self.key, self.extended,
+            self.max_seq_num)
+
+    __repr__ = __str__
+
+
+class SessionManager:
+    """Session manager class.
+    """
+
+    def __init__(self, *, timeout: float = 60.0, max_sessions: int = 10000,
+                 tick: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """Session manager constructor.
+
+        Args:
+            timeout: inactivity timeout in seconds; each successful `get`
+                restarts the timeout.
+
+            max_sessions: maximum number of sessions; when this is reached,
+                opening a session evicts the least recently used one.
+
+            tick: expiry timer resolution in seconds.
+
+            clock: clock function; defaults to ``time.monotonic``.
+        """
+        assert max_sessions > 0
+        self._timeout = timeout
+        self._max_sessions = max_sessions
+        self._wheel = TimerWheel(tick=tick, clock=clock)
+        self._sessions: 'collections.OrderedDict[SessionKey, Session]' = \
+            collections.OrderedDict()
+        self._by_onu_id: Dict[int, set] = {}
+        self._lock = threading.RLock()
+
+        #: Counters: ``opened``, ``replaced``, ``closed``, ``expired``,
+        #: ``evicted``, ``hits`` and ``misses``.
+        self.metrics = collections.Counter()
+
+    def open(self, onu_id: int, operation: str, me_class: int, me_inst: int,
+             data: Any, *, extended: bool = False,
+             max_seq_num: int = 0) -> Session:
+        """Open a session, replacing any existing session with the same key.
+
+        Args:
+            onu_id: ONU id.
+            operation: operation name, e.g. ``'mib-upload'``.
+            me_class: MIB class.
+            me_inst: MIB instance.
+            data: operation-specific data.
+            extended: whether an extended message opened the session.
+            max_seq_num: maximum valid "next" sequence number.
+
+        Returns:
+            The new session.
+        """
+        with self._lock:
+            self._wheel.advance()
+            key = (onu_id, operation, me_class, me_inst)
+            if key in self._sessions:
+                self._remove(key)
+                self.metrics['replaced'] += 1
+            while len(self._sessions) >= self._max_sessions:
+                old_key = next(iter(self._sessions))
+                logger.warning('session %r evicted (too many sessions)' % (
+                    old_key,))
+                self._remove(old_key)
+                self.metrics['evicted'] += 1
+
+            session = Session(key, data, extended=extended,
+                              max_seq_num=max_seq_num,
+                              created=self._wheel.now())
+            session._timer = self._wheel.schedule(self._timeout,
+                                                  self._expire, key)
+            self._sessions[key] = session
+            self._by_onu_id.setdefault(onu_id, set()).add(key)
+            self.metrics['opened'] += 1
+            return session
+
+    def get(self, onu_id: int, operation: str, me_class: int,
+            me_inst: int) -> Optional[Session]:
+        """Get a session, restarting its inactivity timeout.
+
+        Returns:
+            The session, or ``None`` if it was never opened, or has been
+            closed, has expired or has been evicted.
+        """
+        with self._lock:
+            self._wheel.advance()
+            key = (onu_id, operation, me_class, me_inst)
+            session = self._sessions.get(key, None)
+            if session is None:
+                self.metrics['misses'] += 1
+            else:
+                self.metrics['hits'] += 1
+                self._sessions.move_to_end(key)
+                self._wheel.cancel(session._timer)
+                session._timer = self._wheel.schedule(self._timeout,
+                                                      self._expire, key)
+            return session
+
+    def close(self, onu_id: int, operation: str, me_class: int,
+              me_inst: int) -> None:
+        """Close a session (it's OK if it doesn't exist).
+        """
+        with self._lock:
+            key = (onu_id, operation, me_class, me_inst)
+            if key in self._sessions:
+                self._remove(key)
+                self.metrics['closed'] += 1
+
+    def discard(self, onu_id: int) -> None:
+        """Close all of an ONU's sessions, e.g. after a MIB reset.
+        """
+        with self._lock:
+            for key in list(self._by_onu_id.get(onu_id, ())):
+                self._remove(key)
+                self.metrics['closed'] += 1
+
+    def _expire(self, key: SessionKey) -> None:
+        if key in self._sessions:
+            logger.info('session %r timed out' % (key,))
+            self._remove(key)
+            self.metrics['expired'] += 1
+
+    def _remove(self, key: SessionKey) -> None:
+        session = self._sessions.pop(key)
+        self._wheel.cancel(session._timer)
+        keys = self._by_onu_id.get(key[0], None)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_onu_id[key[0]]
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __str__(self):
+        return '%s(timeout=%r, max_sessions=%d, sessions=%d)' % (
+            self.__class__.__name__, self._timeout, self._max_sessions,
+            len(self._sessions))
+
+    __repr__ = __str__
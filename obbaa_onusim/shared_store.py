@@ -0,0 +1,476 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Memory-mapped attribute store that can be shared across processes.
+
+A `SharedStore` mirrors all the ONUs' MIB instances into a memory-mapped file,
+so other processes (e.g. REST workers or inspection tools) can read them with
+a `SharedStoreReader` without going through the simulator. The simulator
+process owns the file and is its only writer; it keeps it up to date via
+the `DatabaseListener` interface.
+
+Each instance is stored as a fixed-size record whose layout depends only on
+its MIB: a 16-byte header followed by each attribute's value, encoded as in
+OMCI messages (so its size is the `Attr` size). Table attributes, and
+attributes with callable values (e.g. ``sys_up_time``), aren't stored.
+Records are found via an open-addressing hash index keyed by ``(onu_id,
+me_class, me_inst)``.
+
+Each record header contains a sequence number that's odd while the record is
+being written ("seqlock"), so readers never need a lock: they retry if the
+number was odd, or changed while they were copying the record.
+
+Example::
+
+    # simulator process
+    store = SharedStore(server.database, '/dev/shm/onusim.store')
+
+    # any other process
+    reader = SharedStoreReader('/dev/shm/onusim.store')
+    reader.get(42, 256, 0)  # {'vendor_id': 'ABCD', ...}
+
+File layout (little-endian):
+
+* Header (`HEADER_SIZE` bytes, see ``_HEADER``).
+* Layout: JSON object mapping MIB class to ``{"size": record_size, "attrs":
+  [[name, number, offset, size], ...]}``.
+* Index: ``slots`` entries of ``onu_id`` (u32), ``me_class`` (u16),
+  ``me_inst`` (u16) and record offset (u64); offset 0 means empty and 1 means
+  deleted.
+* Records: header of ``seq`` (u32), ``onu_id`` (u32), ``me_class`` (u16),
+  ``me_inst`` (u16) and present-attribute mask (u16), then the attributes.
+
+The file is created sparse, so unused capacity costs no memory.
+"""
+
+import json
+import logging
+import mmap
+import struct
+import threading
+import time
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .database import Database, DatabaseListener, Instance
+from .mib import MIB, mibs
+from .pmap import PMap
+from .types import Table
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+MAGIC = b'ONUSIMSH'
+
+#: Shared store format version.
+VERSION = 1
+
+# magic, version, slots, index offset, layout offset, layout size, records
+# offset, records size
+_HEADER = struct.Struct('<8sHxxIQQQQQ')
+HEADER_SIZE = 64
+
+_SLOT = struct.Struct('<IHHQ')
+_RECORD_HEADER = struct.Struct('<IIHHHxx')
+_SEQ = struct.Struct('<I')
+
+_EMPTY = 0
+_DELETED = 1
+
+_ALIGN = 8
+
+
+def _align(value: int) -> int:
+    return (value + _ALIGN - 1) & ~(_ALIGN - 1)
+
+
+def _slot_hash(onu_id: int, me_class: int, me_inst: int, bits: int) -> int:
+    key = (((onu_id << 16) | me_class) << 16) | me_inst
+    return ((key * 0x9e3779b97f4a7c15) & 0xffffffffffffffff) >> (64 - bits)
+
+
+class _Layout:
+    # per-MIB record layout
+    __slots__ = ('size', 'attrs')
+
+    def __init__(self, size: int, attrs: List[Tuple[str, int, int, int]]):
+        self.size = size
+        self.attrs = attrs
+
+    @classmethod
+    def of(cls, mib: MIB) -> '_Layout':
+        attrs = []
+        offset = _RECORD_HEADER.size
+        for attr in sorted(mib.attrs, key=lambda a: a.number):
+            if attr.number > 0 and not any(isinstance(datum, Table) for
+                                           datum in attr.data):
+                size = attr.size
+                attrs.append((attr.name, attr.number, offset, size))
+                offset += size
+        return cls(_align(offset), attrs)
+
+    def to_json(self) -> Any:
+        return {'size': self.size, 'attrs': [list(a) for a in self.attrs]}
+
+    @classmethod
+    def from_json(cls, value: Any) -> '_Layout':
+        return cls(value['size'], [tuple(a) for a in value['attrs']])
+
+
+class SharedStore(DatabaseListener):
+    """Shared store (owner side).
+    """
+
+    def __init__(self, database: Database, path: str, *,
+                 max_instances: int = 1 << 20,
+                 records_size: int = 1 << 30):
+        """Shared store constructor.
+
+        Creates (or re-creates) the file, populates it from the database and
+        adds the store as a database listener.
+
+        Args:
+            database: the `Database`.
+            path: file path; ``/dev/shm/...`` is a good choice on Linux.
+            max_instances: maximum number of instances (across all ONUs);
+                determines the size of the index.
+            records_size: maximum total size of the records in bytes.
+        """
+        self._database = database
+        self._path = path
+        self._layouts = {mib.number: _Layout.of(mib) for mib in
+                         mibs.values()}
+        layout = json.dumps({str(number): layout.to_json() for number, layout
+                             in self._layouts.items()}).encode('utf-8')
+
+        self._bits = max(4, (2 * max_instances - 1).bit_length())
+        self._slots = 1 << self._bits
+        self._max_instances = max_instances
+        self._index_offset = _align(HEADER_SIZE + len(layout))
+        self._records_offset = _align(self._index_offset +
+                                      self._slots * _SLOT.size)
+        self._records_size = records_size
+        self._used = 0
+        self._free: Dict[int, List[int]] = {}
+        self._count = 0
+        self._deleted = 0
+        self._lock = threading.Lock()
+
+        size = self._records_offset + records_size
+        with open(path, 'wb') as fd:
+            fd.truncate(size)
+        self._fd = open(path, 'r+b')
+        self._mmap = mmap.mmap(self._fd.fileno(), size)
+        _HEADER.pack_into(self._mmap, 0, MAGIC, VERSION, self._slots,
+                          self._index_offset, HEADER_SIZE, len(layout),
+                          self._records_offset, records_size)
+        self._mmap[HEADER_SIZE:HEADER_SIZE + len(layout)] = layout
+
+        # the instances that are currently mirrored, per ONU, and the record
+        # offsets
+        self._mirrored: Dict[int, PMap] = {}
+        self._offsets: Dict[Tuple[int, int, int], int] = {}
+
+        # the listener is added first, so no changes can be missed; changes
+        # that happen before an ONU is populated are harmless
+        database.add_listener(self)
+        for onu_id in database.onu_ids:
+            with database.locks(onu_id):
+                self.onu_reloaded(onu_id, database.snapshot(onu_id))
+        logger.info('shared store %s: %d instances' % (path, self._count))
+
+    # listener methods (called with the ONU's lock held, so they can be
+    # called concurrently for different ONUs)
+
+    def instance_changed(self, onu_id: int, me_class: int, me_inst: int,
+                         instance: Optional[Instance]) -> None:
+        with self._lock:
+            mirrored = self._mirrored.get(onu_id, PMap())
+            if instance is None:
+                self._delete(onu_id, me_class, me_inst)
+                self._mirrored[onu_id] = mirrored.delete((me_class, me_inst))
+            else:
+                self._write(onu_id, me_class, me_inst, instance)
+                self._mirrored[onu_id] = mirrored.set((me_class, me_inst),
+                                                      instance)
+
+    def onu_reloaded(self, onu_id: int, instances: PMap) -> None:
+        # only write the instances that have changed (instances are
+        # immutable, so they can be compared by identity)
+        with self._lock:
+            mirrored = self._mirrored.get(onu_id, PMap())
+            for key, instance in instances.items():
+                if mirrored.get(key, None) is not instance:
+                    self._write(onu_id, key[0], key[1], instance)
+            for key in mirrored:
+                if key not in instances:
+                    self._delete(onu_id, *key)
+            self._mirrored[onu_id] = instances
+
+    # record and index management
+
+    def _find(self, onu_id: int, me_class: int, me_inst: int) -> \
+            Tuple[int, int]:
+        # returns (slot, record offset); if not found, the slot is where it
+        # should be inserted and the offset is 0
+        mask = self._slots - 1
+        slot = _slot_hash(onu_id, me_class, me_inst, self._bits)
+        insert = None
+        while True:
+            slot_offset = self._index_offset + slot * _SLOT.size
+            onu_id_, me_class_, me_inst_, offset = _SLOT.unpack_from(
+                    self._mmap, slot_offset)
+            if offset == _EMPTY:
+                return (slot if insert is None else insert), 0
+            elif offset == _DELETED:
+                if insert is None:
+                    insert = slot
+            elif (onu_id_, me_class_, me_inst_) == (onu_id, me_class,
+                                                    me_inst):
+                return slot, offset
+            slot = (slot + 1) & mask
+
+    def _allocate(self, size: int) -> Optional[int]:
+        free = self._free.get(size, None)
+        if free:
+            return free.pop()
+        if self._used + size > self._records_size:
+            return None
+        offset = self._records_offset + self._used
+        self._used += size
+        return offset
+
+    def _write(self, onu_id: int, me_class: int, me_inst: int,
+               instance: Instance) -> None:
+        layout = self._layouts.get(me_class, None)
+        if layout is None:
+            return
+        key = (onu_id, me_class, me_inst)
+        slot, offset = self._find(*key)
+        new = not offset
+        if new:
+            if self._count >= self._max_instances:
+                logger.error('shared store %s is full (%d instances)' % (
+                    self._path, self._count))
+                return
+            offset = self._allocate(layout.size)
+            if offset is None:
+                logger.error('shared store %s is full (%d bytes)' % (
+                    self._path, self._records_size))
+                return
+
+        # encode the values first, so the record is "open" for as short a
+        # time as possible
+        mib = mibs[me_class]
+        values = bytearray(layout.size - _RECORD_HEADER.size)
+        present = 0
+        base = _RECORD_HEADER.size
+        for name, number, attr_offset, size in layout.attrs:
+            value = instance.get(name, None)
+            if value is None or any(callable(v) for v in (
+                    value if isinstance(value, tuple) else (value,))):
+                continue
+            try:
+                data = mib.attr(number).encode(value)
+            except (AssertionError, TypeError, ValueError, struct.error) \
+                    as e:
+                logger.debug('shared store: %s #%d %s not stored: %s' % (
+                    mib, me_inst, name, e))
+                continue
+            if len(data) == size:
+                values[attr_offset - base:attr_offset - base + size] = data
+                present |= 1 << (16 - number)
+
+        seq = 0 if new else _SEQ.unpack_from(self._mmap, offset)[0]
+        _SEQ.pack_into(self._mmap, offset, (seq + 1) & 0xffffffff)
+        self._mmap[offset + base:offset + layout.size] = values
+        _RECORD_HEADER.pack_into(self._mmap, offset, (seq + 1) & 0xffffffff,
+                                 onu_id, me_class, me_inst, present)
+        _SEQ.pack_into(self._mmap, offset, (seq + 2) & 0xffffffff)
+
+        if new:
+            # the slot is published last
+            self._publish(slot, key, offset)
+            self._offsets[key] = offset
+            self._count += 1
+
+    def _publish(self, slot: int, key: Tuple[int, int, int],
+                 offset: int) -> None:
+        slot_offset = self._index_offset + slot * _SLOT.size
+        if _SLOT.unpack_from(self._mmap, slot_offset)[3] == _DELETED:
+            self._deleted -= 1
+        _SLOT.pack_into(self._mmap, slot_offset, *key, offset)
+
+    def _delete(self, onu_id: int, me_class: int, me_inst: int) -> None:
+        slot, offset = self._find(onu_id, me_class, me_inst)
+        if not offset:
+            return
+        _SLOT.pack_into(self._mmap, self._index_offset + slot * _SLOT.size,
+                        0, 0, 0, _DELETED)
+        # bump the sequence number so that readers of the old record notice
+        seq = _SEQ.unpack_from(self._mmap, offset)[0]
+        _SEQ.pack_into(self._mmap, offset, (seq + 2) & 0xffffffff)
+        self._free.setdefault(self._layouts[me_class].size, []).append(offset)
+        self._offsets.pop((onu_id, me_class, me_inst), None)
+        self._count -= 1
+        self._deleted += 1
+        if self._count + self._deleted > 3 * self._slots // 4:
+            self._rebuild_index()
+
+    def _rebuild_index(self) -> None:
+        # discard the deleted-slot markers; readers might briefly fail to
+        # find instances while this is happening
+        logger.info('shared store %s: rebuilding index (%d deleted slots)' %
+                    (self._path, self._deleted))
+        start = self._index_offset
+        self._mmap[start:start + self._slots * _SLOT.size] = \
+            bytes(self._slots * _SLOT.size)
+        self._deleted = 0
+        for key, offset in self._offsets.items():
+            slot, _ = self._find(*key)
+            self._publish(slot, key, offset)
+
+    def close(self) -> None:
+        """Remove the store as a database listener and close the file (it
+        isn't deleted)."""
+        self._database.remove_listener(self)
+        self._mmap.close()
+        self._fd.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __str__(self):
+        return '%s(path=%r, instances=%d, used=%d)' % (
+            self.__class__.__name__, self._path, self._count, self._used)
+
+    __repr__ = __str__
+
+
+class SharedStoreReader:
+    """Shared store reader (any process).
+    """
+
+    def __init__(self, path: str):
+        """Shared store reader constructor.
+
+        Args:
+            path: file path, as passed to `SharedStore`.
+
+        Raises:
+            ValueError: The file isn't a shared store.
+        """
+        self._fd = open(path, 'rb')
+        self._mmap = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._slots, self._index_offset, layout_offset, \
+            layout_size, self._records_offset, _ = _HEADER.unpack_from(
+                    self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a (version %d) shared store' % (
+                path, VERSION))
+        self._bits = self._slots.bit_length() - 1
+        layouts = json.loads(self._mmap[layout_offset:layout_offset +
+                                        layout_size].decode('utf-8'))
+        self._layouts = {int(number): _Layout.from_json(layout) for
+                         number, layout in layouts.items()}
+
+        #: Number of times that a read was retried because the record was
+        #: being written.
+        self.retries = 0
+
+    def _lookup(self, onu_id: int, me_class: int, me_inst: int) -> int:
+        mask = self._slots - 1
+        slot = _slot_hash(onu_id, me_class, me_inst, self._bits)
+        while True:
+            onu_id_, me_class_, me_inst_, offset = _SLOT.unpack_from(
+                    self._mmap, self._index_offset + slot * _SLOT.size)
+            if offset == _EMPTY:
+                return 0
+            elif offset != _DELETED and (onu_id_, me_class_, me_inst_) == \
+                    (onu_id, me_class, me_inst):
+                return offset
+            slot = (slot + 1) & mask
+
+    def _read(self, offset: int, size: int, key: Tuple[int, int, int],
+              max_retries: int) -> Optional[Tuple[int, bytes]]:
+        for _ in range(max_retries):
+            seq = _SEQ.unpack_from(self._mmap, offset)[0]
+            if seq & 1:
+                self.retries += 1
+                time.sleep(0)
+                continue
+            record = self._mmap[offset:offset + size]
+            if _SEQ.unpack_from(self._mmap, offset)[0] != seq:
+                self.retries += 1
+                continue
+            _, onu_id, me_class, me_inst, present = \
+                _RECORD_HEADER.unpack_from(record, 0)
+            if (onu_id, me_class, me_inst) != key:
+                return None  # deleted and re-used
+            return present, record
+        raise TimeoutError('shared store record %r is busy' % (key,))
+
+    def get(self, onu_id: int, me_class: int, me_inst: int, *,
+            raw: bool = False, max_retries: int = 1000) -> \
+            Optional[Dict[str, Any]]:
+        """Get an instance's attribute values.
+
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class.
+            me_inst: MIB instance.
+            raw: whether to return the raw (encoded) values.
+            max_retries: maximum number of retries if the record is being
+                written.
+
+        Returns:
+            Attribute values keyed by name (absent attributes are omitted),
+            or ``None`` if the instance doesn't exist.
+        """
+        layout = self._layouts.get(me_class, None)
+        offset = self._lookup(onu_id, me_class, me_inst) if layout else 0
+        if not offset:
+            return None
+        result = self._read(offset, layout.size, (onu_id, me_class, me_inst),
+                            max_retries)
+        if result is None:
+            return None
+        present, record = result
+        mib = mibs.get(me_class, None)
+        values = {}
+        for name, number, attr_offset, size in layout.attrs:
+            if present & (1 << (16 - number)):
+                data = record[attr_offset:attr_offset + size]
+                values[name] = data if raw or mib is None else \
+                    mib.attr(number).decode(data, 0)[0]
+        return values
+
+    def keys(self) -> Iterator[Tuple[int, int, int]]:
+        """Iterate over the ``(onu_id, me_class, me_inst)`` keys of all the
+        instances (in no particular order)."""
+        for slot in range(self._slots):
+            onu_id, me_class, me_inst, offset = _SLOT.unpack_from(
+                    self._mmap, self._index_offset + slot * _SLOT.size)
+            if offset not in {_EMPTY, _DELETED}:
+                yield onu_id, me_class, me_inst
+
+    def close(self) -> None:
+        """Close the file."""
+        self._mmap.close()
+        self._fd.close()
+
+    def __str__(self):
+        return '%s(slots=%d, retries=%d)' % (
+            self.__class__.__name__, self._slots, self.retries)
+
+    __repr__ = __str__
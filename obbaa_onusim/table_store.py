@@ -0,0 +1,200 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Table attribute store.
+
+A table attribute's value (in its MIB instance) is the table's raw bytes,
+i.e. its rows concatenated. Instances are never modified in place, so each
+change needs a new value, but rebuilding the table for every row would make
+provisioning a table O(n²).
+
+Instead, the `TableStore` holds a `TableRows` for each table that has been
+changed: its rows in a contiguous ``bytearray``, plus (for keyed tables; see
+`Table`) a dict mapping each row key to the row's slot. Adding, replacing and
+deleting a row are O(1) (a deleted row's slot is filled by the last row), and
+after a request's rows have been applied, `TableRows.snapshot` returns the
+new value (one copy of the bytes, however many rows were changed).
+
+A `TableRows` is only used while its instance's value is its latest snapshot.
+If the value has been replaced by other means (e.g. a MIB reset, or loading a
+checkpoint), it's rebuilt from the value.
+
+Example::
+
+    store = TableStore()
+    rows = store.rows(onu_id, me_class, me_inst, attr, instance[attr.name])
+    rows.apply(row)
+    instance = {**instance, attr.name: rows.snapshot()}
+"""
+
+import logging
+import threading
+
+from typing import Dict, Optional, Tuple
+
+from .mib import Attr
+from .types import Table
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+# a table: MIB class, MIB instance and attribute number
+Key = Tuple[int, int, int]
+
+
+class TableRows:
+    """One table attribute's rows.
+    """
+
+    def __init__(self, table: Table, data: bytes = b''):
+        """Table rows constructor.
+
+        Args:
+            table: the table attribute's `Table` datum.
+            data: initial rows (concatenated).
+        """
+        self._table = table
+        self._size = table.elemSize
+        self._key_size = table.key_size
+        self._data = bytearray()
+        self._index: Dict[bytes, int] = {}
+        self._snapshot: Optional[bytes] = None
+        for offset in range(0, len(data) - self._size + 1, self._size):
+            self.apply(bytes(data[offset:offset + self._size]))
+
+    def apply(self, row: bytes) -> bool:
+        """Apply a row, i.e. add, replace or delete it (see `Table`).
+
+        Returns:
+            Whether the table changed.
+        """
+        assert len(row) == self._size
+        if self._key_size is None:
+            self._data += row
+            self._snapshot = None
+            return True
+
+        key = bytes(row[:self._key_size])
+        if self._table.is_delete(row):
+            return self.delete(key)
+
+        slot = self._index.get(key, None)
+        if slot is None:
+            self._index[key] = len(self._data) // self._size
+            self._data += row
+        else:
+            offset = slot * self._size
+            if self._data[offset:offset + self._size] == row:
+                return False
+            self._data[offset:offset + self._size] = row
+        self._snapshot = None
+        return True
+
+    def delete(self, key: bytes) -> bool:
+        """Delete the row with the specified key (keyed tables only).
+
+        Returns:
+            Whether the row was present.
+        """
+        slot = self._index.pop(key, None)
+        if slot is None:
+            return False
+        size = self._size
+        last = len(self._data) // size - 1
+        if slot != last:
+            # fill the hole with the last row
+            offset = slot * size
+            moved = self._data[last * size:]
+            self._data[offset:offset + size] = moved
+            self._index[bytes(moved[:self._key_size])] = slot
+        del self._data[last * size:]
+        self._snapshot = None
+        return True
+
+    def snapshot(self) -> bytes:
+        """Return the rows as (immutable) bytes, suitable for use as the
+        attribute value."""
+        if self._snapshot is None:
+            self._snapshot = bytes(self._data)
+        return self._snapshot
+
+    def is_current(self, value) -> bool:
+        """Whether an attribute value is this table's latest snapshot."""
+        return value is not None and value is self._snapshot
+
+    def __len__(self) -> int:
+        return len(self._data) // self._size
+
+    def __str__(self):
+        return '%s(rows=%d, keyed=%r)' % (
+            self.__class__.__name__, len(self), self._key_size is not None)
+
+    __repr__ = __str__
+
+
+class TableStore:
+    """Per-ONU table attribute rows.
+
+    The store is thread-safe, but a table's `TableRows` should only be used
+    with its ONU's lock held.
+    """
+
+    def __init__(self):
+        self._tables: Dict[int, Dict[Key, TableRows]] = {}
+        self._lock = threading.Lock()
+
+    def rows(self, onu_id: int, me_class: int, me_inst: int, attr: Attr,
+             value) -> TableRows:
+        """Return a table's rows, rebuilding them if the current attribute
+        value isn't their latest snapshot.
+
+        Args:
+            onu_id: ONU id.
+            me_class: MIB class.
+            me_inst: MIB instance.
+            attr: the table attribute.
+            value: the attribute's current value.
+
+        Returns:
+            The table's rows.
+        """
+        key = (me_class, me_inst, attr.number)
+        with self._lock:
+            tables = self._tables.setdefault(onu_id, {})
+            rows = tables.get(key, None)
+            if rows is None or not rows.is_current(value):
+                table = attr._data[0]
+                rows = TableRows(table, table.join(value))
+                tables[key] = rows
+            return rows
+
+    def discard(self, onu_id: int, me_class: int, me_inst: int) -> None:
+        """Discard an instance's tables, e.g. when it's deleted."""
+        with self._lock:
+            tables = self._tables.get(onu_id, {})
+            for key in [k for k in tables if k[:2] == (me_class, me_inst)]:
+                del tables[key]
+
+    def discard_onu(self, onu_id: int) -> None:
+        """Discard all of an ONU's tables, e.g. when it's reset."""
+        with self._lock:
+            self._tables.pop(onu_id, None)
+
+    def __len__(self) -> int:
+        return sum(len(tables) for tables in self._tables.values())
+
+    def __str__(self):
+        return '%s(onus=%d, tables=%d)' % (
+            self.__class__.__name__, len(self._tables), len(self))
+
+    __repr__ = __str__
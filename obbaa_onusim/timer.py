@@ -0,0 +1,195 @@
+# Copyright 2020 Broadband Forum
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Timer support.
+
+Timers are held in a hashed `TimerWheel`. Scheduling and cancelling a timer
+are O(1) operations, and advancing the wheel only visits the slots for the
+ticks that have elapsed, so very large numbers of outstanding timers are
+cheap.
+
+Example::
+
+    wheel = TimerWheel(tick=0.1)
+    timer = wheel.schedule(5.0, print, 'five seconds later')
+    ...
+    wheel.advance()  # fires any timers that are due
+"""
+
+import logging
+import math
+import time
+
+from typing import Any, Callable, List, Optional, Set
+
+logger = logging.getLogger(__name__.replace('obbaa_', ''))
+
+
+class Timer:
+    """A scheduled timer (returned by `TimerWheel.schedule`).
+    """
+
+    __slots__ = ('deadline', 'callback', 'args', 'cancelled', '_slot')
+
+    def __init__(self, deadline: float, callback: Callable[..., Any],
+                 args: tuple):
+        #: Time (per the wheel's clock) at which the timer is due.
+        self.deadline = deadline
+
+        #: Callback (invoked with ``args`` when the timer fires).
+        self.callback = callback
+
+        #: Callback arguments.
+        self.args = args
+
+        #: Whether the timer has been cancelled.
+        self.cancelled = False
+
+        self._slot: Optional[Set['Timer']] = None
+
+    def __repr__(self):
+        return '%s(deadline=%r, callback=%r, cancelled=%r)' % (
+            self.__class__.__name__, self.deadline, self.callback,
+            self.cancelled)
+
+
+class TimerWheel:
+    """Hashed timer wheel.
+
+    The wheel doesn't run by itself: `advance` has to be called, either
+    lazily (e.g. before looking something up) or periodically from a thread.
+    """
+
+    def __init__(self, *, tick: float = 1.0, slots: int = 512,
+                 clock: Callable[[], float] = time.monotonic):
+        """Timer wheel constructor.
+
+        Args:
+            tick: tick duration in seconds; timers fire at most one tick late.
+
+            slots: number of wheel slots; timers further in the future than
+                ``tick * slots`` simply stay in their slot for extra rounds.
+
+            clock: clock function; defaults to ``time.monotonic``.
+        """
+        assert tick > 0 and slots > 0
+        self._tick = tick
+        self._clock = clock
+        self._slots: List[Set[Timer]] = [set() for _ in range(slots)]
+        self._current = self._ticks(clock())
+        self._count = 0
+
+    def _ticks(self, when: float) -> int:
+        return math.floor(when / self._tick)
+
+    def now(self) -> float:
+        """Return the current time, per the wheel's clock."""
+        return self._clock()
+
+    def schedule(self, delay: float, callback: Callable[..., Any],
+                 *args) -> Timer:
+        """Schedule a timer.
+
+        Args:
+            delay: delay in seconds.
+
+            callback: function to call when the timer fires.
+
+            *args: arguments to pass to the callback.
+
+        Returns:
+            The new timer, which can be passed to `cancel`.
+        """
+        timer = Timer(self._clock() + max(delay, 0.0), callback, args)
+        self._insert(timer)
+        return timer
+
+    def _insert(self, timer: Timer) -> None:
+        # never insert into a slot that has already been visited
+        ticks = max(self._ticks(timer.deadline), self._current + 1)
+        slot = self._slots[ticks % len(self._slots)]
+        slot.add(timer)
+        timer._slot = slot
+        self._count += 1
+
+    def cancel(self, timer: Optional[Timer]) -> None:
+        """Cancel a timer (it's OK if it has already fired or been
+        cancelled).
+        """
+        if timer is not None and not timer.cancelled:
+            timer.cancelled = True
+            if timer._slot is not None:
+                timer._slot.discard(timer)
+                timer._slot = None
+                self._count -= 1
+
+    def advance(self, now: float = None) -> int:
+        """Fire all timers that are due.
+
+        Args:
+            now: current time; defaults to the wheel's clock.
+
+        Returns:
+            Number of timers that fired.
+        """
+        now = self._clock() if now is None else now
+        target = self._ticks(now)
+        if target <= self._current:
+            return 0
+
+        # if more than a full rotation has elapsed, visit each slot only once
+        first = max(self._current + 1, target - len(self._slots) + 1)
+        due = []
+        later = []
+        for ticks in range(first, target + 1):
+            slot = self._slots[ticks % len(self._slots)]
+            if slot:
+                expired = [t for t in slot if t.deadline <= now]
+                # timers that are due later in the current tick have to be
+                # moved, because this slot won't be visited again until the
+                # next rotation
+                if ticks == target:
+                    later = [t for t in slot if t.deadline > now and
+                             self._ticks(t.deadline) <= target]
+                for timer in expired + later:
+                    slot.discard(timer)
+                    timer._slot = None
+                due += expired
+        self._current = target
+        self._count -= len(due) + len(later)
+        for timer in later:
+            self._insert(timer)
+
+        # fire in deadline order; callbacks may schedule further timers
+        fired = 0
+        for timer in sorted(due, key=lambda t: t.deadline):
+            if not timer.cancelled:
+                timer.cancelled = True
+                fired += 1
+                try:
+                    timer.callback(*timer.args)
+                except Exception as e:
+                    logger.error('timer callback %r failed: %s: %s' % (
+                        timer.callback, e.__class__.__name__, e))
+        return fired
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __str__(self):
+        return '%s(tick=%r, slots=%d, timers=%d)' % (
+            self.__class__.__name__, self._tick, len(self._slots),
+            self._count)
+
+    __repr__ = __str__
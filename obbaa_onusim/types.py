@@ -336,9 +336,16 @@ class Bytes(Datum):
 
 class Table(Datum):
 
-    def __init__(self, elemSize: int, default: Tuple[bytes,...] = None, fixed: Tuple[bytes,...] = None):
+    def __init__(self, elemSize: int, default: Tuple[bytes, ...] = None,
+                 fixed: Tuple[bytes, ...] = None, key_size: int = None):
         default = default or []
         self.elemSize = elemSize
+        # rows are keyed by their first key_size bytes; a row whose other
+        # bytes are all 0xff deletes the row with the same key (G.988 uses
+        # this convention for e.g. the extended VLAN tagging operation
+        # table); if None, rows can only be appended
+        assert key_size is None or 0 < key_size < elemSize
+        self.key_size = key_size
         self._struct_format = "!%dc" % elemSize
         super().__init__(elemSize, default=default, fixed=fixed)
 
@@ -355,6 +362,22 @@ class Table(Datum):
            value = struct.unpack_from(self._struct_format, buffer, offset)
            return value, offset + self.elemSize
 
+    # get the whole table's raw bytes, without building per-element lists
+    # (tables are stored as raw bytes, which are returned as is; see
+    # TableStore)
+    def join(self, value: Tuple[bytes, ...] = None) -> bytes:
+        if not value:
+            return b''
+        if isinstance(value, (bytes, bytearray, memoryview)) or \
+                isinstance(value[0], int):
+            return bytes(value)
+        return b''.join(value)
+
+    # whether a row deletes the row with the same key
+    def is_delete(self, row: bytes) -> bool:
+        return self.key_size is not None and \
+            row[self.key_size:] == b'\xff' * (self.elemSize - self.key_size)
+
     #encode the whole table
     def encode(self, value: Tuple[bytes,...] = None) -> bytearray:
         buffer = bytearray(self.elemSize * len(value))
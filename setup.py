@@ -27,7 +27,8 @@ setuptools.setup(name="obbaa-onusim", version="0.0.1",
                  long_description_content_type="text/markdown",
                  url="https://github.com/BroadbandForum/obbaa-polt-simulator"
                      ".git", packages=setuptools.find_packages(),
-                 scripts=["bin/onusim.py", "bin/onucli.py"],
+                 scripts=["bin/onusim.py", "bin/onucli.py",
+                          "bin/onujournal.py"],
                  classifiers=["Programming Language :: Python :: 3",
                               "License :: OSI Approved :: BSD License",
                               "Operating System :: OS Independent", ],